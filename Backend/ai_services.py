@@ -1,10 +1,13 @@
 import asyncio
 import json
 import random
+import time
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Callable, Optional
 import math
 
+from risk_engine import scored_risk_level
+
 # Mock Z-AI SDK implementation (in production, you would use the actual SDK)
 class MockZAIClient:
     def __init__(self):
@@ -188,47 +191,7 @@ class WeatherAIService:
         wind_speed = current_conditions.get("windSpeed", 10)
         precipitation = current_conditions.get("precipitation", 20)
         
-        risk_score = 0
-        
-        # Temperature risk
-        if temp > 35 or temp < 0:
-            risk_score += 3
-        elif temp > 30 or temp < 5:
-            risk_score += 2
-        elif temp > 25 or temp < 10:
-            risk_score += 1
-        
-        # Humidity risk
-        if humidity > 80 or humidity < 20:
-            risk_score += 2
-        elif humidity > 70 or humidity < 30:
-            risk_score += 1
-        
-        # Wind risk
-        if wind_speed > 30:
-            risk_score += 3
-        elif wind_speed > 20:
-            risk_score += 2
-        elif wind_speed > 15:
-            risk_score += 1
-        
-        # Precipitation risk
-        if precipitation > 70:
-            risk_score += 3
-        elif precipitation > 50:
-            risk_score += 2
-        elif precipitation > 30:
-            risk_score += 1
-        
-        # Determine risk level
-        if risk_score >= 8:
-            return "Critical"
-        elif risk_score >= 6:
-            return "High"
-        elif risk_score >= 3:
-            return "Medium"
-        else:
-            return "Low"
+        return scored_risk_level(temp, humidity, wind_speed, precipitation)
     
     def _extract_key_factors(self, request_data: Dict[str, Any]) -> List[str]:
         """Extract key weather factors"""
@@ -447,10 +410,15 @@ class SatelliteImageryService:
 class WeatherPatternsService:
     def __init__(self):
         self.zai_client = MockZAIClient()
+        # Returns the climatology sections (historicalPatterns,
+        # seasonalPatterns, predictions) for (latitude, longitude, date), or
+        # None when no statistics are available for the location
+        self.climatology_source: Optional[Callable[[float, float, str], Optional[Dict[str, Any]]]] = None
     
     async def analyze_weather_patterns(self, request_data: Dict[str, Any]) -> Dict[str, Any]:
         """Analyze weather patterns using AI"""
         
+        started = time.perf_counter()
         try:
             # Create patterns analysis prompt
             prompt = self._create_patterns_prompt(request_data)
@@ -464,7 +432,16 @@ class WeatherPatternsService:
             ai_response = await self.zai_client.chat_completions_create(messages)
             ai_content = ai_response["choices"][0]["message"]["content"]
             
-            # Generate patterns data
+            # Statistics come from the station climatology when one is
+            # available, otherwise from the standard fallback profile
+            climatology = None
+            if self.climatology_source is not None:
+                climatology = self.climatology_source(
+                    request_data.get("latitude"), request_data.get("longitude"), request_data.get("date")
+                )
+            if climatology is None:
+                climatology = self._generate_fallback_patterns_data(request_data)
+            
             patterns_data = {
                 "patternType": request_data.get("patternType", "comprehensive"),
                 "location": {
@@ -472,37 +449,12 @@ class WeatherPatternsService:
                     "longitude": request_data.get("longitude")
                 },
                 "date": request_data.get("date"),
-                "historicalPatterns": {
-                    "temperatureTrend": random.choice(["Warming", "Cooling", "Stable"]),
-                    "precipitationTrend": random.choice(["Increasing", "Decreasing", "Stable"]),
-                    "windPattern": random.choice(["Cyclonic", "Anticyclonic", "Variable"]),
-                    "pressureTrend": random.choice(["Rising", "Falling", "Stable"])
-                },
-                "seasonalPatterns": {
-                    "typicalWeather": random.choice(["Sunny and Dry", "Mixed Conditions", "Rainy Season", "Storm Season"]),
-                    "extremesLikelihood": round(random.uniform(0, 100), 1),
-                    "optimalPeriods": ["Spring", "Fall"] if random.random() > 0.5 else ["Summer", "Winter"],
-                    "historicalAverages": {
-                        "temperature": round(random.uniform(5, 25), 1),
-                        "precipitation": round(random.uniform(20, 80), 1),
-                        "humidity": round(random.uniform(40, 80), 1)
-                    }
-                },
-                "predictions": {
-                    "next7Days": {
-                        "temperatureChange": round(random.uniform(-10, 10), 1),
-                        "precipitationProbability": round(random.uniform(0, 100), 1),
-                        "dominantWeather": random.choice(["Sunny", "Cloudy", "Rainy", "Stormy"])
-                    },
-                    "next30Days": {
-                        "trend": random.choice(["Improving", "Degrading", "Stable"]),
-                        "significantEvents": random.randint(0, 3),
-                        "confidence": round(random.uniform(0.6, 0.9), 2)
-                    }
-                },
+                "historicalPatterns": climatology["historicalPatterns"],
+                "seasonalPatterns": climatology["seasonalPatterns"],
+                "predictions": climatology["predictions"],
                 "aiAnalysis": ai_content,
                 "modelVersion": "z-ai-patterns-v1.0",
-                "processingTime": f"{random.uniform(0.4, 1.5):.2f}s"
+                "processingTime": f"{time.perf_counter() - started:.2f}s"
             }
             
             return patterns_data
@@ -0,0 +1,79 @@
+import base64
+import numpy as np
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from weather_store import WeatherStore
+from spatial_index import SpatialIndex
+
+# Stations whose date ranges are expanded per scan step; scanning stops as
+# soon as a page is full, so huge areas cost about one page of work
+AREA_SCAN_STATIONS = 256
+
+
+def encode_cursor(station: int, day: int, row: int) -> str:
+    """Opaque cursor for the last (station, day, row) returned on a page"""
+    return base64.urlsafe_b64encode(f"{station}:{day}:{row}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[int, int, int]:
+    """Inverse of ``encode_cursor``; raises ValueError on a malformed cursor"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        station, day, row = base64.urlsafe_b64decode(padded.encode()).decode().split(":")
+        return int(station), int(day), int(row)
+    except (UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def query_area(store: WeatherStore, index: SpatialIndex, stations: np.ndarray,
+               start=None, end=None, filters: Optional[Dict[str, Sequence[str]]] = None,
+               cursor: Optional[str] = None, limit: int = 100) -> Tuple[np.ndarray, Optional[str]]:
+    """Page through the records of ``stations`` dated within ``[start, end]``.
+
+    Records are ordered by (station, date, row), which stays stable while
+    rows are appended, so the keyset cursor of the last record returned
+    resumes the scan on a later store version. ``filters`` maps categorical
+    columns to accepted values. Returns the row indices of the page and the
+    cursor of the next page (None on the last page).
+    """
+    stations = np.asarray(stations, dtype=np.int64)
+    after_key = after_row = None
+    if cursor is not None:
+        after_station, after_day, after_row = decode_cursor(cursor)
+        after_key = index._keys(after_station, after_day)
+        stations = stations[stations >= after_station]
+
+    accepted = {
+        name: np.asarray([store.code_of(name, value) for value in values], dtype=np.int32)
+        for name, values in (filters or {}).items()
+    }
+
+    pages: List[np.ndarray] = []
+    found = 0
+    for batch_start in range(0, len(stations), AREA_SCAN_STATIONS):
+        positions = index.positions_in_range(stations[batch_start:batch_start + AREA_SCAN_STATIONS], start, end)
+        if after_key is not None:
+            keys = index.sorted_keys[positions]
+            later = (keys > after_key) | ((keys == after_key) & (index.station_rows[positions] > after_row))
+            positions = positions[later]
+
+        rows = index.station_rows[positions]
+        keep = np.ones(len(rows), dtype=bool)
+        for name, codes in accepted.items():
+            keep &= np.isin(store.codes[name][rows], codes)
+        positions = positions[keep]
+
+        pages.append(positions)
+        found += len(positions)
+        if found > limit:
+            break
+
+    positions = np.concatenate(pages)[:limit + 1] if pages else np.empty(0, dtype=np.int64)
+    next_cursor = None
+    if len(positions) > limit:
+        positions = positions[:limit]
+        last = positions[-1]
+        next_cursor = encode_cursor(
+            int(index.station_of_row[index.station_rows[last]]), int(index.sorted_days[last]), int(index.station_rows[last])
+        )
+    return index.station_rows[positions].astype(np.int64), next_cursor
@@ -0,0 +1,311 @@
+"""Performance benchmarks for the weather backend.
+
+Run from the Backend directory, e.g. ``python benchmarks.py spatial``.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from typing import Callable, Dict, List
+
+from spatial_index import SpatialIndex, haversine_km
+from weather_ingest import load_weather_csv
+from risk_engine import reclassify_risk_levels, risk_level_of
+from data_enhancer import EVENT_TYPES, generate_recommendations, generate_risk_analysis, generate_hourly_forecast
+from serialization import dumps, embed, json_array
+from forecasting import ForecastModel
+from weather_store import WeatherStore
+
+
+def _time_per_call(function: Callable[[], object], repeat: int) -> float:
+    """Average wall time of one call in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def _random_points(rng: np.random.Generator, count: int):
+    latitudes = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    longitudes = rng.uniform(-180, 180, count)
+    return latitudes, longitudes
+
+
+def benchmark_spatial_index(sizes: List[int], queries: int = 200) -> List[Dict[str, float]]:
+    """Compare the old per-request linear scan with the KD-tree lookup"""
+    rng = np.random.default_rng(42)
+    results = []
+
+    for size in sizes:
+        latitudes, longitudes = _random_points(rng, size)
+        query_lats, query_lons = _random_points(rng, queries)
+
+        # Old path: Python loop over a list of dicts with planar distance
+        records = [{"latitude": lat, "longitude": lon} for lat, lon in zip(latitudes.tolist(), longitudes.tolist())]
+
+        def linear_scan(lat: float, lon: float):
+            closest, min_distance = None, float('inf')
+            for data in records:
+                distance = ((data["latitude"] - lat)**2 + (data["longitude"] - lon)**2)**0.5
+                if distance < min_distance:
+                    min_distance, closest = distance, data
+            return closest
+
+        build_start = time.perf_counter()
+        index = SpatialIndex(latitudes, longitudes)
+        build_ms = (time.perf_counter() - build_start) * 1000
+
+        # Correctness check against brute-force haversine
+        for i in range(min(queries, 20)):
+            expected = np.argmin(haversine_km(query_lats[i], query_lons[i], latitudes, longitudes))
+            found, _ = index.nearest_row(query_lats[i], query_lons[i])
+            assert np.isclose(
+                haversine_km(query_lats[i], query_lons[i], latitudes[found], longitudes[found]),
+                haversine_km(query_lats[i], query_lons[i], latitudes[expected], longitudes[expected])
+            )
+
+        points = itertools.cycle(zip(query_lats.tolist(), query_lons.tolist()))
+        scan_repeat = max(1, min(queries, 2_000_000 // size))
+        results.append({
+            "records": size,
+            "build_ms": build_ms,
+            "linear_scan_ms": _time_per_call(lambda: linear_scan(*next(points)), scan_repeat),
+            "kdtree_ms": _time_per_call(lambda: index.nearest_row(*next(points)), queries),
+        })
+        del records
+
+    return results
+
+
+def _write_sample_csv(path: str, rows: int, stations: int = 500):
+    """Write a synthetic weather CSV in the weather_data.csv layout"""
+    rng = np.random.default_rng(7)
+    station = rng.integers(0, stations, rows)
+    latitudes, longitudes = _random_points(rng, stations)
+    pd.DataFrame({
+        "city": np.char.add("City ", station.astype(str)),
+        "country": "USA",
+        "latitude": latitudes[station].round(4),
+        "longitude": longitudes[station].round(4),
+        "date": (np.datetime64("2020-01-01") + rng.integers(0, 1500, rows)).astype(str),
+        "temperature": rng.uniform(-10, 40, rows).round(1),
+        "humidity": rng.uniform(20, 100, rows).round(1),
+        "windSpeed": rng.uniform(0, 50, rows).round(1),
+        "precipitation": rng.uniform(0, 100, rows).round(1),
+        "conditions": rng.choice(["Sunny", "Cloudy", "Rainy", "Stormy", "Snow"], rows),
+        "riskLevel": rng.choice(["Low", "Medium", "High", "Critical"], rows),
+    }).to_csv(path, index=False)
+
+
+def _legacy_ingest(path: str) -> list:
+    """The former iterrows-based startup path, one nested dict per row"""
+    records = []
+    for _, row in pd.read_csv(path).iterrows():
+        event_type = random.choice(EVENT_TYPES)
+        records.append({
+            "city": row['city'],
+            "country": row.get('country', 'USA'),
+            "latitude": row['latitude'],
+            "longitude": row['longitude'],
+            "address": {"city": row['city'], "state": row.get('state', ''), "country": row.get('country', 'USA'), "countryCode": "US"},
+            "date": row['date'],
+            "eventType": event_type,
+            "temperature": row['temperature'],
+            "humidity": row['humidity'],
+            "windSpeed": row['windSpeed'],
+            "precipitation": row['precipitation'],
+            "conditions": row['conditions'],
+            "riskLevel": row['riskLevel'],
+            "recommendations": generate_recommendations(row['conditions'], row['riskLevel'], event_type),
+            "riskAnalysis": generate_risk_analysis(row),
+            "hourlyForecast": generate_hourly_forecast(row['date'], row['temperature'])
+        })
+    return records
+
+
+def benchmark_ingest(sizes: List[int]) -> List[Dict[str, float]]:
+    """Compare the iterrows startup path with the vectorized columnar ingest"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"weather_{size}.csv")
+            _write_sample_csv(path, size)
+
+            start = time.perf_counter()
+            load_weather_csv(path, EVENT_TYPES)
+            vectorized_s = time.perf_counter() - start
+
+            # The legacy path is timed on at most 50k rows and extrapolated
+            legacy_rows = min(size, 50_000)
+            if legacy_rows < size:
+                pd.read_csv(path, nrows=legacy_rows).to_csv(path, index=False)
+            start = time.perf_counter()
+            _legacy_ingest(path)
+            legacy_s = (time.perf_counter() - start) * size / legacy_rows
+
+            results.append({
+                "records": size,
+                "iterrows_s": legacy_s,
+                "vectorized_s": vectorized_s,
+                "speedup": legacy_s / vectorized_s,
+            })
+    return results
+
+
+def benchmark_risk(sizes: List[int]) -> List[Dict[str, float]]:
+    """Compare per-row risk classification with the vectorized rule engine"""
+    rng = np.random.default_rng(11)
+    results = []
+    for size in sizes:
+        floats = {
+            "temperature": rng.uniform(-10, 40, size),
+            "precipitation": rng.uniform(0, 100, size),
+            "windSpeed": rng.uniform(0, 50, size),
+        }
+
+        # The per-row path is timed on at most 100k rows and extrapolated
+        sample_rows = min(size, 100_000)
+        rows = list(zip(*(floats[name][:sample_rows].tolist() for name in ("temperature", "precipitation", "windSpeed"))))
+        start = time.perf_counter()
+        for temperature, precipitation, wind_speed in rows:
+            risk_level_of(temperature, precipitation, wind_speed)
+        per_row_ms = (time.perf_counter() - start) * 1000 * size / sample_rows
+
+        vectorized_ms = _time_per_call(lambda: reclassify_risk_levels(floats), 5)
+        results.append({
+            "records": size,
+            "per_row_ms": per_row_ms,
+            "vectorized_ms": vectorized_ms,
+            "speedup": per_row_ms / vectorized_ms,
+        })
+    return results
+
+
+def _sample_records(rng: random.Random, count: int) -> List[Dict[str, object]]:
+    """Records shaped like /api/weather responses"""
+    records = []
+    for _ in range(count):
+        row = {
+            "temperature": round(rng.uniform(-10, 40), 1),
+            "humidity": round(rng.uniform(20, 100), 1),
+            "windSpeed": round(rng.uniform(0, 50), 1),
+            "precipitation": round(rng.uniform(0, 100), 1),
+        }
+        condition = rng.choice(["Sunny", "Cloudy", "Rainy", "Stormy", "Partly Cloudy"])
+        event_type = rng.choice(EVENT_TYPES)
+        records.append({
+            "city": "Springfield", "country": "USA",
+            "latitude": rng.uniform(25, 49), "longitude": rng.uniform(-124, -67),
+            "address": {"city": "Springfield", "state": "IL", "country": "USA", "countryCode": "US"},
+            "date": "2024-06-01", "eventType": event_type, **row,
+            "conditions": condition, "riskLevel": risk_level_of(row["temperature"], row["precipitation"], row["windSpeed"]),
+            "recommendations": generate_recommendations(condition, "Medium", event_type),
+            "riskAnalysis": generate_risk_analysis(row),
+            "hourlyForecast": generate_hourly_forecast("2024-06-01", row["temperature"]),
+        })
+    return records
+
+
+def benchmark_serialize(sizes: List[int]) -> List[Dict[str, float]]:
+    """Compare FastAPI's default JSON encoding of a response of N records
+    with orjson and with splicing per-record bytes cached earlier"""
+    from fastapi.encoders import jsonable_encoder
+
+    def fastapi_render(content):
+        # What JSONResponse does with an endpoint's return value
+        return json.dumps(
+            jsonable_encoder(content), ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")
+        ).encode("utf-8")
+
+    rng = random.Random(17)
+    results = []
+    for size in sizes:
+        # Encoding is linear in the records, so large responses are timed
+        # on a sample of at most 10k records and extrapolated
+        sample = min(size, 10_000)
+        records = _sample_records(rng, sample)
+        encoded = [dumps(record) for record in records]
+        repeat = max(1, 1000 // sample)
+        assert json.loads(embed({}, "weather_data", json_array(encoded))) == json.loads(fastapi_render({"weather_data": records}))
+
+        scale = size / sample
+        fastapi_ms = _time_per_call(lambda: fastapi_render({"weather_data": records}), repeat) * scale
+        orjson_ms = _time_per_call(lambda: dumps({"weather_data": records}), repeat) * scale
+        cached_ms = _time_per_call(lambda: embed({}, "weather_data", json_array(encoded)), repeat) * scale
+        results.append({
+            "records": size,
+            "fastapi_ms": fastapi_ms,
+            "orjson_ms": orjson_ms,
+            "cached_bytes_ms": cached_ms,
+            "orjson_speedup": fastapi_ms / orjson_ms,
+            "cached_speedup": fastapi_ms / cached_ms,
+        })
+    return results
+
+
+def benchmark_forecast(sizes: List[int]) -> List[Dict[str, float]]:
+    """Time the batch forecast fit, an incremental refresh after a 1%
+    append, and single forecasts, with about 500 records per station"""
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for size in sizes:
+            path = os.path.join(directory, f"weather_{size}.csv")
+            stations = max(1, size // 500)
+            _write_sample_csv(path, size, stations)
+            store, _ = load_weather_csv(path, EVENT_TYPES)
+            index = SpatialIndex.from_store(store)
+
+            start = time.perf_counter()
+            model = ForecastModel.fit(store, index)
+            fit_s = time.perf_counter() - start
+
+            head = size - max(1, size // 100)
+            prefix = WeatherStore.from_arrays(
+                {name: values[:head] for name, values in store.floats.items()},
+                {name: values[:head] for name, values in store.codes.items()},
+                store.categories, store.dates[:head]
+            )
+            partial = ForecastModel.fit(prefix, SpatialIndex.from_store(prefix))
+            start = time.perf_counter()
+            partial.updated(store, index)
+            update_s = time.perf_counter() - start
+
+            date = np.datetime64("2030-06-01")
+            forecast_us = _time_per_call(lambda: model.forecast(size % model.station_count, date), 1000) * 1000
+            results.append({
+                "records": size,
+                "stations": model.station_count,
+                "fit_s": fit_s,
+                "stations_per_s": model.station_count / fit_s,
+                "update_1pct_s": update_s,
+                "forecast_us": forecast_us,
+            })
+    return results
+
+
+def _print_table(rows: List[Dict[str, float]]):
+    headers = list(rows[0].keys())
+    print(" | ".join(f"{header:>16}" for header in headers))
+    for row in rows:
+        print(" | ".join(f"{row[header]:>16.4f}" if isinstance(row[header], float) else f"{row[header]:>16}" for header in headers))
+
+
+BENCHMARKS = {
+    "spatial": lambda args: benchmark_spatial_index(args.sizes),
+    "ingest": lambda args: benchmark_ingest(args.sizes),
+    "risk": lambda args: benchmark_risk(args.sizes),
+    "serialize": lambda args: benchmark_serialize(args.sizes),
+    "forecast": lambda args: benchmark_forecast(args.sizes),
+}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Weather backend benchmarks")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+    _print_table(BENCHMARKS[args.benchmark](args))
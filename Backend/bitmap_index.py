@@ -0,0 +1,242 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from risk_engine import risk_scores
+from weather_store import WeatherStore
+
+# Categorical columns with one bitmap per category
+BITMAP_COLUMNS = ["conditions", "riskLevel", "eventType", "country", "state"]
+
+# Numeric scores a query can rank its matches by; riskScore is the
+# point-scored risk of RISK_SCORE_BANDS
+QUERY_SCORES = ["riskScore", "temperature", "humidity", "windSpeed", "precipitation"]
+
+# Bitmap indexes kept for recently published versions
+BITMAP_VERSIONS = 4
+
+# A date range is checked row by row against the category bitmaps when it
+# holds at most this share of the store, otherwise the bitmaps are unpacked
+DATE_GATHER_FRACTION = 8
+
+WORD_BITS = 64
+
+
+def pack_bits(mask: np.ndarray) -> np.ndarray:
+    """Bitmap of a boolean mask as 64-bit words, bit ``i % 64`` of word
+    ``i // 64`` standing for row ``i``"""
+    padded = np.zeros(-(-len(mask) // WORD_BITS) * WORD_BITS, dtype=bool)
+    padded[:len(mask)] = mask
+    return np.packbits(padded, bitorder="little").view("<u8")
+
+
+def unpack_rows(words: np.ndarray) -> np.ndarray:
+    """Ascending rows whose bits are set; only non-empty words are unpacked"""
+    nonzero = np.flatnonzero(words)
+    bits = np.flatnonzero(np.unpackbits(words[nonzero].view(np.uint8), bitorder="little").view(bool))
+    return nonzero[bits // WORD_BITS] * WORD_BITS + bits % WORD_BITS
+
+
+def test_bits(words: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """Whether each of ``rows`` is set in a bitmap"""
+    shifts = (rows & (WORD_BITS - 1)).astype(np.uint64)
+    return ((words[rows >> 6] >> shifts) & np.uint64(1)).astype(bool)
+
+
+class BitmapIndex:
+    """Bitmaps of the categorical columns and a date order over one store.
+
+    Every category of a ``BITMAP_COLUMNS`` column has a bitmap of the rows
+    holding it, so filters combine with word-wise OR (values of a column)
+    and AND (columns) over ``rows / 64`` words. Rows sorted by date give any
+    date range as one slice. The risk score of every row is kept alongside
+    so ranking needs only a gather.
+    """
+
+    def __init__(self, rows: int, bitmaps: Dict[str, Dict[int, np.ndarray]], rows_by_date: np.ndarray,
+                 sorted_dates: np.ndarray, risk_scores: np.ndarray):
+        self.rows = rows
+        self.bitmaps = bitmaps
+        self.rows_by_date = rows_by_date
+        self.sorted_dates = sorted_dates
+        self.risk_scores = risk_scores
+
+    @staticmethod
+    def _column_bitmaps(codes: np.ndarray) -> Dict[int, np.ndarray]:
+        return {int(code): pack_bits(codes == code) for code in np.unique(codes)}
+
+    @staticmethod
+    def _risk_scores(store: WeatherStore, start: int = 0) -> np.ndarray:
+        floats = store.floats
+        return risk_scores(
+            floats["temperature"][start:], floats["humidity"][start:],
+            floats["windSpeed"][start:], floats["precipitation"][start:]
+        ).astype(np.int8)
+
+    @classmethod
+    def build(cls, store: WeatherStore) -> "BitmapIndex":
+        bitmaps = {name: cls._column_bitmaps(store.codes[name]) for name in BITMAP_COLUMNS}
+        rows_by_date = np.argsort(store.dates, kind="stable")
+        return cls(len(store), bitmaps, rows_by_date, store.dates[rows_by_date], cls._risk_scores(store))
+
+    def extended(self, store: WeatherStore) -> "BitmapIndex":
+        """Index of ``store``, which holds this index's rows followed by
+        appended ones: only the words from the last partial one on are
+        repacked, and the new rows are merged into the date order"""
+        start = self.rows // WORD_BITS * WORD_BITS
+        words = -(-len(store) // WORD_BITS)
+        bitmaps = {}
+        for name in BITMAP_COLUMNS:
+            tail = self._column_bitmaps(store.codes[name][start:])
+            column = {}
+            for code in set(self.bitmaps[name]) | set(tail):
+                bitmap = np.zeros(words, dtype="<u8")
+                previous = self.bitmaps[name].get(code)
+                if previous is not None:
+                    bitmap[:start // WORD_BITS] = previous[:start // WORD_BITS]
+                if code in tail:
+                    bitmap[start // WORD_BITS:] = tail[code]
+                column[code] = bitmap
+            bitmaps[name] = column
+
+        new_rows = np.arange(self.rows, len(store))
+        new_rows = new_rows[np.argsort(store.dates[new_rows], kind="stable")]
+        positions = np.searchsorted(self.sorted_dates, store.dates[new_rows], side="right")
+        rows_by_date = np.insert(self.rows_by_date, positions, new_rows)
+        risk = np.concatenate([self.risk_scores, self._risk_scores(store, self.rows)])
+        return BitmapIndex(len(store), bitmaps, rows_by_date, store.dates[rows_by_date], risk)
+
+    def _filter_bitmap(self, store: WeatherStore, filters: Dict[str, Sequence[str]]) -> Optional[np.ndarray]:
+        combined = None
+        for name, values in filters.items():
+            words = np.zeros(-(-self.rows // WORD_BITS), dtype="<u8")
+            for value in values:
+                bitmap = self.bitmaps[name].get(store.code_of(name, value))
+                if bitmap is not None:
+                    words |= bitmap
+            combined = words if combined is None else combined & words
+        return combined
+
+    def select(self, store: WeatherStore, filters: Optional[Dict[str, Sequence[str]]] = None,
+               start=None, end=None) -> np.ndarray:
+        """Ascending rows matching every filter and dated within
+        ``[start, end]``. ``filters`` maps ``BITMAP_COLUMNS`` to accepted
+        values; unknown values match nothing."""
+        unknown = set(filters or {}) - set(BITMAP_COLUMNS)
+        if unknown:
+            raise ValueError(f"Columns {sorted(unknown)} are not indexed, expected some of {BITMAP_COLUMNS}")
+        bitmap = self._filter_bitmap(store, filters or {})
+        if start is None and end is None:
+            return np.arange(self.rows) if bitmap is None else unpack_rows(bitmap)
+
+        low = 0 if start is None else np.searchsorted(self.sorted_dates, np.datetime64(start, "D"), side="left")
+        high = self.rows if end is None else np.searchsorted(self.sorted_dates, np.datetime64(end, "D"), side="right")
+        if bitmap is None:
+            return np.sort(self.rows_by_date[low:high])
+        if high - low <= self.rows // DATE_GATHER_FRACTION:
+            rows = self.rows_by_date[low:high]
+            return np.sort(rows[test_bits(bitmap, rows)])
+        rows = unpack_rows(bitmap)
+        dates = store.dates[rows]
+        in_range = np.ones(len(rows), dtype=bool)
+        if start is not None:
+            in_range &= dates >= np.datetime64(start, "D")
+        if end is not None:
+            in_range &= dates <= np.datetime64(end, "D")
+        return rows[in_range]
+
+    def scores(self, store: WeatherStore, rows: np.ndarray, score: str) -> np.ndarray:
+        if score not in QUERY_SCORES:
+            raise ValueError(f"Unknown score {score}, expected one of {QUERY_SCORES}")
+        column = self.risk_scores if score == "riskScore" else store.floats[score][:self.rows]
+        # Ascending distinct rows as many as the index holds are all of them
+        return column if len(rows) == self.rows else column[rows]
+
+    def top(self, store: WeatherStore, rows: np.ndarray, score: str, limit: int,
+            descending: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """The ``limit`` best of ascending ``rows`` by a score, best first,
+        ties going to the earlier row. Returns the rows and their scores.
+
+        The cut-off score is found with argpartition (or, for small integer
+        scores, a histogram); every row beating it and the first rows tying
+        it are kept, so the result does not depend on how ties are ordered.
+        """
+        values = self.scores(store, rows, score)
+        keys = -values if descending else values
+        if len(rows) > limit:
+            if keys.dtype.kind == "i":
+                lowest = int(keys.min())
+                cutoff = lowest + int(np.searchsorted(np.cumsum(np.bincount(keys - lowest)), limit))
+            else:
+                cutoff = keys[np.argpartition(keys, limit - 1)[limit - 1]]
+            below = np.flatnonzero(keys < cutoff)
+            ties = np.flatnonzero(keys == cutoff)[:limit - len(below)]
+            chosen = np.concatenate([below, ties])
+        else:
+            chosen = np.arange(len(rows))
+        chosen = chosen[np.lexsort((chosen, keys[chosen]))]
+        return rows[chosen], values[chosen]
+
+    def memory_bytes(self) -> int:
+        bitmaps = sum(bitmap.nbytes for column in self.bitmaps.values() for bitmap in column.values())
+        return bitmaps + self.rows_by_date.nbytes + self.sorted_dates.nbytes + self.risk_scores.nbytes
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "rows": self.rows,
+            "bitmaps": {name: len(column) for name, column in self.bitmaps.items()},
+            "memoryBytes": self.memory_bytes(),
+        }
+
+
+class BitmapIndexer:
+    """Bitmap indexes of recently published versions, keyed by epoch.
+
+    As a publish subscriber it indexes every new version, extending the
+    previous version's index after an append instead of rebuilding it.
+    Readers on a version without an index build it on demand.
+    """
+
+    def __init__(self, versions: int = BITMAP_VERSIONS):
+        self.versions = versions
+        self.indexes: "OrderedDict[int, BitmapIndex]" = OrderedDict()
+        self.builds = 0
+        self.extensions = 0
+        self._lock = threading.Lock()
+
+    def update(self, version):
+        """Publish subscriber: index ``version``"""
+        self.for_version(version)
+
+    def for_version(self, version) -> BitmapIndex:
+        with self._lock:
+            index = self.indexes.get(version.epoch)
+            if index is not None:
+                return index
+            previous = self.indexes.get(version.epoch - 1)
+        if version.base_rows and previous is not None and previous.rows == version.base_rows:
+            index = previous.extended(version.store)
+            extended = True
+        else:
+            index = BitmapIndex.build(version.store)
+            extended = False
+        with self._lock:
+            if extended:
+                self.extensions += 1
+            else:
+                self.builds += 1
+            self.indexes[version.epoch] = index
+            while len(self.indexes) > self.versions:
+                self.indexes.popitem(last=False)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latest = next(reversed(self.indexes.values()), None)
+            return {
+                "builds": self.builds,
+                "extensions": self.extensions,
+                "versions": list(self.indexes),
+                **(latest.stats() if latest is not None else {}),
+            }
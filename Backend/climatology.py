@@ -0,0 +1,346 @@
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from risk_engine import RISK_LEVEL_RULES
+from spatial_index import SpatialIndex
+from weather_history import grouped_percentiles
+from weather_store import WeatherStore
+
+# Measurements summarized per station
+CLIMATOLOGY_COLUMNS = ["temperature", "humidity", "windSpeed", "precipitation"]
+CLIMATOLOGY_PERCENTILES = (10.0, 50.0, 90.0)
+
+# Day-of-year slots (0-365, leap days included) and the half-width of the
+# circular window day-of-year means are smoothed over
+DAYS_OF_YEAR = 366
+SMOOTHING_DAYS = 15
+
+DAYS_PER_DECADE = 3652.5
+
+# Extreme events are records past the "High" overall risk limits, as
+# (event, measurement, above, below)
+_, _HIGH_RAIN, _HIGH_WIND, _HIGH_HEAT, _HIGH_COLD = next(rule for rule in RISK_LEVEL_RULES if rule[0] == "High")
+EXTREME_EVENTS = [
+    ("heavyPrecipitation", "precipitation", _HIGH_RAIN, None),
+    ("strongWind", "windSpeed", _HIGH_WIND, None),
+    ("heat", "temperature", _HIGH_HEAT, None),
+    ("cold", "temperature", None, _HIGH_COLD),
+]
+# Index of the "any extreme event" frequency after the individual events
+ANY_EXTREME = len(EXTREME_EVENTS)
+# Events that make a month a storm season
+STORM_EVENTS = [position for position, event in enumerate(EXTREME_EVENTS) if event[0] in ("heavyPrecipitation", "strongWind")]
+
+# Trend labels as (measurement, response key, per-decade slope that counts
+# as a change, label when rising, label when falling)
+TRENDS = [
+    ("temperature", "temperatureTrend", 0.2, "Warming", "Cooling"),
+    ("precipitation", "precipitationTrend", 2.0, "Increasing", "Decreasing"),
+    ("windSpeed", "windPattern", 1.0, "Strengthening", "Weakening"),
+]
+
+# Typical weather of a month: storm season when storm events are this
+# frequent, rainy season above this median precipitation, sunny and dry
+# below these median precipitation and humidity
+STORM_SEASON_FREQUENCY = 0.25
+RAINY_SEASON_PRECIPITATION = 60.0
+DRY_SEASON_PRECIPITATION = 30.0
+DRY_SEASON_HUMIDITY = 60.0
+
+# Months of each northern-hemisphere season (shifted by six months south
+# of the equator)
+SEASONS = {"Winter": (11, 0, 1), "Spring": (2, 3, 4), "Summer": (5, 6, 7), "Fall": (8, 9, 10)}
+
+
+def circular_window_sum(values: np.ndarray, half_width: int) -> np.ndarray:
+    """Sum over a window of ``2 * half_width + 1`` days around each day of
+    year, wrapping around the year end"""
+    padded = np.concatenate([values[:, -half_width:], values, values[:, :half_width]], axis=1)
+    sums = np.concatenate([np.zeros((len(values), 1)), np.cumsum(padded, axis=1)], axis=1)
+    window = 2 * half_width + 1
+    return sums[:, window:] - sums[:, :-window]
+
+
+def day_of_year(dates) -> np.ndarray:
+    """Zero-based day of year of each date"""
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    return (dates - dates.astype("datetime64[Y]").astype("datetime64[D]")).astype(np.int64)
+
+
+class Climatology:
+    """Per-station climate statistics as compact arrays.
+
+    Built in one vectorized pass over a store version; describing a
+    station and date afterwards is a handful of array lookups. Station ids
+    are those of the index it was built from, which stay valid for newer
+    versions of the same store lineage.
+    """
+
+    def __init__(self, station_latitudes: np.ndarray, counts: np.ndarray, means: np.ndarray,
+                 month_counts: np.ndarray, percentiles: np.ndarray, slopes: np.ndarray,
+                 extremes: np.ndarray, dominant_conditions: np.ndarray, conditions: List[str],
+                 build_seconds: float = 0.0):
+        self.station_latitudes = station_latitudes
+        self.counts = counts  # (stations x days of year) records
+        self.means = means  # (stations x days of year x columns) smoothed means
+        self.month_counts = month_counts  # (stations x 12) records
+        self.percentiles = percentiles  # (stations x 12 x columns x percentiles)
+        self.slopes = slopes  # (stations x columns) trend per decade
+        self.extremes = extremes  # (stations x 12 x events + any) frequencies
+        self.dominant_conditions = dominant_conditions  # (stations x 12) codes into conditions
+        self.conditions = conditions
+        self.build_seconds = build_seconds
+
+    @property
+    def station_count(self) -> int:
+        return len(self.station_latitudes)
+
+    @classmethod
+    def build(cls, store: WeatherStore, index: SpatialIndex) -> "Climatology":
+        start = time.perf_counter()
+        station_count = index.station_count
+        stations = index.station_of_row.astype(np.int64)
+        dates = store.dates
+        day_keys = stations * DAYS_OF_YEAR + day_of_year(dates)
+        month_keys = stations * 12 + dates.astype("datetime64[M]").astype(np.int64) % 12
+
+        counts = np.bincount(day_keys, minlength=station_count * DAYS_OF_YEAR).reshape(station_count, DAYS_OF_YEAR)
+        window_counts = circular_window_sum(counts, SMOOTHING_DAYS)
+        month_counts = np.bincount(month_keys, minlength=station_count * 12)
+        month_starts = np.cumsum(month_counts) - month_counts
+        present = month_counts > 0
+
+        # Least-squares slope of each measurement against the date, per
+        # station, from running sums (x is centred to keep them small)
+        x = (dates.astype(np.int64) - dates.astype(np.int64).mean()) if len(dates) else np.empty(0)
+        n = np.bincount(stations, minlength=station_count)
+        sum_x = np.bincount(stations, weights=x, minlength=station_count)
+        sum_xx = np.bincount(stations, weights=x * x, minlength=station_count)
+        denominator = n * sum_xx - sum_x * sum_x
+
+        means = np.full((station_count, DAYS_OF_YEAR, len(CLIMATOLOGY_COLUMNS)), np.nan, dtype=np.float32)
+        percentiles = np.full(
+            (station_count * 12, len(CLIMATOLOGY_COLUMNS), len(CLIMATOLOGY_PERCENTILES)), np.nan, dtype=np.float32
+        )
+        slopes = np.zeros((station_count, len(CLIMATOLOGY_COLUMNS)), dtype=np.float32)
+        for column, name in enumerate(CLIMATOLOGY_COLUMNS):
+            values = store.floats[name]
+            sums = np.bincount(day_keys, weights=values, minlength=station_count * DAYS_OF_YEAR)
+            window_sums = circular_window_sum(sums.reshape(station_count, DAYS_OF_YEAR), SMOOTHING_DAYS)
+            np.divide(window_sums, window_counts, out=means[:, :, column], where=window_counts > 0)
+
+            sum_y = np.bincount(stations, weights=values, minlength=station_count)
+            sum_xy = np.bincount(stations, weights=x * values, minlength=station_count)
+            slope = np.divide(n * sum_xy - sum_x * sum_y, denominator,
+                              out=np.zeros(station_count), where=denominator > 0)
+            slopes[:, column] = slope * DAYS_PER_DECADE
+
+            ordered = values[np.lexsort((values, month_keys))]
+            percentiles[present, column] = grouped_percentiles(
+                ordered, month_starts[present], month_counts[present], CLIMATOLOGY_PERCENTILES
+            )
+
+        events = []
+        for _, name, above, below in EXTREME_EVENTS:
+            values = store.floats[name]
+            events.append(values > above if above is not None else values < below)
+        events.append(np.logical_or.reduce(events) if events else np.zeros(len(dates), dtype=bool))
+        extremes = np.stack([
+            np.divide(np.bincount(month_keys, weights=mask, minlength=station_count * 12), month_counts,
+                      out=np.zeros(station_count * 12), where=present)
+            for mask in events
+        ], axis=-1).astype(np.float32)
+
+        categories = len(store.categories["conditions"])
+        tallies = np.bincount(
+            month_keys * categories + store.codes["conditions"], minlength=station_count * 12 * categories
+        ).reshape(station_count * 12, categories)
+        dominant = np.where(present, tallies.argmax(axis=1) if categories else -1, -1).astype(np.int32)
+
+        return cls(
+            index.station_latitudes.copy(), counts.astype(np.int32), means,
+            month_counts.reshape(station_count, 12).astype(np.int32),
+            percentiles.reshape(station_count, 12, len(CLIMATOLOGY_COLUMNS), len(CLIMATOLOGY_PERCENTILES)),
+            slopes, extremes.reshape(station_count, 12, len(events)), dominant.reshape(station_count, 12),
+            list(store.categories["conditions"]), round(time.perf_counter() - start, 3)
+        )
+
+    # Lookups
+    def _season_months(self, station: int) -> Dict[str, tuple]:
+        if self.station_latitudes[station] >= 0:
+            return SEASONS
+        return {season: tuple((month + 6) % 12 for month in months) for season, months in SEASONS.items()}
+
+    def _typical_weather(self, extremes: List[float], percentiles: List[List[float]]) -> str:
+        storms = sum(extremes[event] for event in STORM_EVENTS)
+        precipitation = percentiles[CLIMATOLOGY_COLUMNS.index("precipitation")][1]
+        humidity = percentiles[CLIMATOLOGY_COLUMNS.index("humidity")][1]
+        if storms >= STORM_SEASON_FREQUENCY:
+            return "Storm Season"
+        if precipitation >= RAINY_SEASON_PRECIPITATION:
+            return "Rainy Season"
+        if precipitation <= DRY_SEASON_PRECIPITATION and humidity <= DRY_SEASON_HUMIDITY:
+            return "Sunny and Dry"
+        return "Mixed Conditions"
+
+    def describe(self, station: int, date) -> Dict[str, Any]:
+        """Historical, seasonal and climatological outlook sections of a
+        patterns response for a station around a date"""
+        date = np.datetime64(date, "D")
+        day = int(day_of_year(date))
+        month = int(date.astype("datetime64[M]").astype(np.int64) % 12)
+        outlook_month = int((date + 3).astype("datetime64[M]").astype(np.int64) % 12)
+        next_month = (month + 1) % 12
+
+        # Pull this station's rows out as Python lists once; everything
+        # below is plain arithmetic on them
+        column = {name: position for position, name in enumerate(CLIMATOLOGY_COLUMNS)}
+        week = self.means[station, [(day + offset) % DAYS_OF_YEAR for offset in range(8)]].tolist()
+        slopes = self.slopes[station].tolist()
+        month_counts = self.month_counts[station].tolist()
+        extremes = self.extremes[station].tolist()
+        percentiles = self.percentiles[station, month].tolist()
+
+        def rounded(value: float) -> Optional[float]:
+            return None if value != value else round(value, 1)  # NaN where there are no records
+
+        historical = {}
+        for name, key, threshold, rising, falling in TRENDS:
+            slope = slopes[column[name]]
+            historical[key] = rising if slope > threshold else falling if slope < -threshold else "Stable"
+        historical["trendsPerDecade"] = {name: round(slopes[position], 2) for name, position in column.items()}
+
+        # Seasons ranked by how often their records had an extreme event
+        season_rates = {}
+        for season, months in self._season_months(station).items():
+            records = sum(month_counts[m] for m in months)
+            if records:
+                season_rates[season] = sum(extremes[m][ANY_EXTREME] * month_counts[m] for m in months) / records
+        optimal = sorted(season_rates, key=season_rates.get)[:2]
+
+        precipitation = column["precipitation"]
+        upcoming = [values[precipitation] for values in week[1:] if values[precipitation] == values[precipitation]]
+        change = extremes[next_month][ANY_EXTREME] - extremes[month][ANY_EXTREME]
+        dominant = int(self.dominant_conditions[station, outlook_month])
+        records = month_counts[month]
+        return {
+            "station": {
+                "latitude": float(self.station_latitudes[station]),
+                "records": sum(month_counts),
+            },
+            "historicalPatterns": historical,
+            "seasonalPatterns": {
+                "typicalWeather": self._typical_weather(extremes[month], percentiles),
+                "extremesLikelihood": round(extremes[month][ANY_EXTREME] * 100, 1),
+                "optimalPeriods": optimal,
+                "historicalAverages": {
+                    name: rounded(week[0][column[name]]) for name in ("temperature", "precipitation", "humidity")
+                },
+                "percentiles": {
+                    name: {
+                        f"p{percentile:g}": rounded(percentiles[position][rank])
+                        for rank, percentile in enumerate(CLIMATOLOGY_PERCENTILES)
+                    }
+                    for name, position in column.items()
+                },
+                "extremeEventFrequencies": {
+                    event: round(extremes[month][position] * 100, 1)
+                    for position, (event, _, _, _) in enumerate(EXTREME_EVENTS)
+                },
+            },
+            "predictions": {
+                "next7Days": {
+                    "temperatureChange": rounded(week[7][column["temperature"]] - week[0][column["temperature"]]),
+                    "precipitationProbability": rounded(sum(upcoming) / len(upcoming)) if upcoming else None,
+                    "dominantWeather": self.conditions[dominant] if dominant >= 0 else None,
+                },
+                "next30Days": {
+                    "trend": "Degrading" if change > 0.05 else "Improving" if change < -0.05 else "Stable",
+                    "significantEvents": int(round(extremes[next_month][ANY_EXTREME] * 30)),
+                    "confidence": round(records / (records + 30), 2),
+                },
+            },
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        arrays = (self.counts, self.means, self.month_counts, self.percentiles, self.slopes,
+                  self.extremes, self.dominant_conditions)
+        return {
+            "stations": self.station_count,
+            "buildSeconds": self.build_seconds,
+            "memoryMb": round(sum(array.nbytes for array in arrays) / (1024 * 1024), 2),
+        }
+
+
+class ClimatologyBuilder:
+    """Keeps the climatology of the newest published store version,
+    rebuilding it on a background thread after each publish.
+
+    Until a rebuild finishes, the previous climatology keeps serving
+    (station ids stay valid across appends); after a full rebuild it is
+    dropped, and readers wait for the new one. Builds are tagged with
+    their version's epoch, so one still running for a version older than
+    the latest full rebuild is discarded rather than installed.
+    """
+
+    def __init__(self):
+        self.climatology: Optional[Climatology] = None
+        self.builds = 0
+        self.error: Optional[str] = None
+        self._pending = None
+        self._running = False
+        self._rebuild_epoch = 0
+        self._condition = threading.Condition()
+
+    def schedule(self, version):
+        """Publish subscriber: rebuild for ``version`` in the background"""
+        with self._condition:
+            if version.base_rows == 0:
+                self.climatology = None
+                self._rebuild_epoch = version.epoch
+            self._pending = version
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, name="climatology-builder", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                version = self._pending
+                self._pending = None
+                if version is None:
+                    self._running = False
+                    self._condition.notify_all()
+                    return
+            try:
+                climatology = Climatology.build(version.store, version.index)
+                error = None
+            except Exception as e:
+                climatology, error = None, str(e)
+            with self._condition:
+                self.builds += 1
+                self.error = error
+                if climatology is not None and version.epoch >= self._rebuild_epoch:
+                    self.climatology = climatology
+                self._condition.notify_all()
+
+    def covering(self, station: int, timeout: float = 30.0) -> Optional[Climatology]:
+        """The current climatology if it covers ``station``, waiting for a
+        build in progress when it does not (None if none does)"""
+        with self._condition:
+            self._condition.wait_for(
+                lambda: (self.climatology is not None and station < self.climatology.station_count) or not self._running,
+                timeout
+            )
+            climatology = self.climatology
+        return climatology if climatology is not None and station < climatology.station_count else None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "builds": self.builds,
+            "building": self._running,
+            "error": self.error,
+            **(self.climatology.stats() if self.climatology is not None else {}),
+        }
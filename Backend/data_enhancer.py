@@ -1,9 +1,13 @@
+import numpy as np
 import pandas as pd
 import json
 import random
 from datetime import datetime, timedelta
 from typing import Dict, List, Any
 
+from weather_ingest import read_csv_chunks
+from risk_engine import EXTENDED_RISK_ANALYSIS_FACTORS, analyze_risk
+
 # Event types for different activities
 EVENT_TYPES = ["wedding", "outdoor", "concert", "parade", "sports"]
 
@@ -63,73 +67,7 @@ def generate_recommendations(weather_condition: str, risk_level: str, event_type
 
 def generate_risk_analysis(row: pd.Series) -> Dict[str, Dict[str, str]]:
     """Generate detailed risk analysis based on weather data"""
-    
-    temp = row['temperature']
-    precip = row['precipitation']
-    wind = row['windSpeed']
-    
-    # Precipitation risk assessment
-    if precip > 80:
-        precip_level = "Extreme"
-        precip_desc = "Very heavy precipitation expected, severe impact on all outdoor activities"
-    elif precip > 60:
-        precip_level = "High"
-        precip_desc = "Heavy precipitation likely, significant impact on activities"
-    elif precip > 30:
-        precip_level = "Medium"
-        precip_desc = "Moderate precipitation expected, some impact on activities"
-    else:
-        precip_level = "Low"
-        precip_desc = "Minimal precipitation expected, low impact on activities"
-    
-    # Wind impact assessment
-    if wind > 40:
-        wind_level = "Extreme"
-        wind_desc = "Dangerous winds expected, high risk of damage and safety hazards"
-    elif wind > 25:
-        wind_level = "High"
-        wind_desc = "Strong winds expected, high impact on outdoor activities"
-    elif wind > 15:
-        wind_level = "Medium"
-        wind_desc = "Moderate winds, some impact on activities and equipment"
-    else:
-        wind_level = "Low"
-        wind_desc = "Light winds, minimal impact on activities"
-    
-    # Temperature comfort assessment
-    if temp > 35:
-        temp_level = "Extreme"
-        temp_desc = "Extreme heat - high risk of heat exhaustion and dehydration"
-    elif temp < -10:
-        temp_level = "Extreme"
-        temp_desc = "Extreme cold - high risk of hypothermia and frostbite"
-    elif temp > 30:
-        temp_level = "High"
-        temp_desc = "Very hot conditions, heat stress risk for prolonged exposure"
-    elif temp < 0:
-        temp_level = "High"
-        temp_desc = "Freezing conditions, risk of hypothermia and ice hazards"
-    elif 18 <= temp <= 25:
-        temp_level = "Low"
-        temp_desc = "Comfortable temperature range for most activities"
-    else:
-        temp_level = "Medium"
-        temp_desc = "Moderate temperature, some discomfort possible for extended periods"
-    
-    return {
-        "precipitationRisk": {
-            "level": precip_level,
-            "description": precip_desc
-        },
-        "windImpact": {
-            "level": wind_level,
-            "description": wind_desc
-        },
-        "temperatureComfort": {
-            "level": temp_level,
-            "description": temp_desc
-        }
-    }
+    return analyze_risk(row['temperature'], row['precipitation'], row['windSpeed'], EXTENDED_RISK_ANALYSIS_FACTORS)
 
 def generate_hourly_forecast(date_str: str, base_temp: float) -> List[Dict[str, Any]]:
     """Generate hourly forecast data"""
@@ -228,130 +166,144 @@ def generate_address_data(city: str, country: str = "USA") -> Dict[str, str]:
             "countryCode": "US"
         }
 
-def enhance_weather_data(input_file: str, output_file: str):
+def _json_default(value: Any) -> Any:
+    """Keep numpy scalars from the chunked reader as JSON numbers and
+    booleans; anything else is written as text"""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+def enhance_weather_data(input_file: str, output_file: str) -> Dict[str, Any]:
     """Enhance existing weather data with missing columns"""
     
-    print(f"Loading data from {input_file}...")
-    df = pd.read_csv(input_file)
-    
-    print(f"Original data shape: {df.shape}")
-    print(f"Original columns: {list(df.columns)}")
+    print(f"Loading data from {input_file} in chunks...")
     
-    enhanced_data = []
+    record_count = 0
+    sample_record = None
     
-    for index, row in df.iterrows():
-        if index % 100 == 0:
-            print(f"Processing row {index}/{len(df)}...")
-        
-        # Generate event type
-        event_type = random.choice(EVENT_TYPES)
-        
-        # Generate recommendations
-        recommendations = generate_recommendations(
-            row['conditions'], 
-            row['riskLevel'], 
-            event_type
-        )
-        
-        # Generate risk analysis
-        risk_analysis = generate_risk_analysis(row)
-        
-        # Generate hourly forecast
-        hourly_forecast = generate_hourly_forecast(row['date'], row['temperature'])
-        
-        # Generate address data
-        address = generate_address_data(row['city'], row.get('country', 'USA'))
-        
-        # Create enhanced record
-        enhanced_record = {
-            # Original columns
-            "city": row['city'],
-            "country": row.get('country', 'USA'),
-            "latitude": row['latitude'],
-            "longitude": row['longitude'],
-            "date": row['date'],
-            "temperature": row['temperature'],
-            "humidity": row['humidity'],
-            "windSpeed": row['windSpeed'],
-            "precipitation": row['precipitation'],
-            "conditions": row['conditions'],
-            "riskLevel": row['riskLevel'],
-            
-            # New columns
-            "eventType": event_type,
-            "address": address,
-            "recommendations": recommendations,
-            "riskAnalysis": risk_analysis,
-            "hourlyForecast": hourly_forecast,
-            
-            # Additional original columns if they exist
-            "feels_like_celsius": row.get('feels_like_celsius', row['temperature']),
-            "pressure_hpa": row.get('pressure_hpa', 1013.25),
-            "visibility_km": row.get('visibility_km', 10.0),
-            "uv_index": row.get('uv_index', 5.0),
-            "wind_direction": row.get('wind_direction', 'N')
-        }
-        
-        enhanced_data.append(enhanced_record)
-    
-    print(f"Enhanced {len(enhanced_data)} records")
-    
-    # Save enhanced data
+    # Records are streamed to the JSON array as each chunk is processed, so
+    # memory stays bounded by the chunk size rather than the file size
     print(f"Saving enhanced data to {output_file}...")
     with open(output_file, 'w') as f:
-        json.dump(enhanced_data, f, indent=2)
-    
+        f.write("[")
+        for chunk in read_csv_chunks(input_file):
+            for _, row in chunk.iterrows():
+                if record_count % 100 == 0:
+                    print(f"Processing row {record_count}...")
+                
+                enhanced_record = enhance_weather_row(row)
+                f.write(",\n" if record_count else "\n")
+                f.write(json.dumps(enhanced_record, indent=2, default=_json_default))
+                
+                if sample_record is None:
+                    sample_record = enhanced_record
+                record_count += 1
+        f.write("\n]\n")
+    
+    print(f"Enhanced {record_count} records")
     print("Data enhancement completed!")
     
-    return enhanced_data
+    return {"records": record_count, "sample": sample_record}
 
-def create_enhanced_csv(input_file: str, output_file: str):
-    """Create enhanced CSV file with new columns"""
+def enhance_weather_row(row: pd.Series) -> Dict[str, Any]:
+    """Build one enhanced record from a weather CSV row"""
     
-    print(f"Loading data from {input_file}...")
-    df = pd.read_csv(input_file)
+    # Generate event type
+    event_type = random.choice(EVENT_TYPES)
     
-    print(f"Original data shape: {df.shape}")
+    # Generate recommendations
+    recommendations = generate_recommendations(
+        row['conditions'], 
+        row['riskLevel'], 
+        event_type
+    )
     
-    # Add new columns
-    enhanced_rows = []
+    # Generate risk analysis
+    risk_analysis = generate_risk_analysis(row)
     
-    for index, row in df.iterrows():
-        if index % 100 == 0:
-            print(f"Processing row {index}/{len(df)}...")
-        
-        # Generate new data
-        event_type = random.choice(EVENT_TYPES)
-        recommendations = generate_recommendations(
-            row['conditions'], 
-            row['riskLevel'], 
-            event_type
-        )
-        risk_analysis = generate_risk_analysis(row)
-        hourly_forecast = generate_hourly_forecast(row['date'], row['temperature'])
-        address = generate_address_data(row['city'], row.get('country', 'USA'))
+    # Generate hourly forecast
+    hourly_forecast = generate_hourly_forecast(row['date'], row['temperature'])
+    
+    # Generate address data
+    address = generate_address_data(row['city'], row.get('country', 'USA'))
+    
+    # Create enhanced record
+    return {
+        # Original columns
+        "city": row['city'],
+        "country": row.get('country', 'USA'),
+        "latitude": row['latitude'],
+        "longitude": row['longitude'],
+        "date": row['date'],
+        "temperature": row['temperature'],
+        "humidity": row['humidity'],
+        "windSpeed": row['windSpeed'],
+        "precipitation": row['precipitation'],
+        "conditions": row['conditions'],
+        "riskLevel": row['riskLevel'],
         
-        # Create enhanced row
-        enhanced_row = row.copy()
-        enhanced_row['eventType'] = event_type
-        enhanced_row['address_json'] = json.dumps(address)
-        enhanced_row['recommendations_json'] = json.dumps(recommendations)
-        enhanced_row['riskAnalysis_json'] = json.dumps(risk_analysis)
-        enhanced_row['hourlyForecast_json'] = json.dumps(hourly_forecast)
-        enhanced_row['city'] = row['city']  # Ensure consistency
+        # New columns
+        "eventType": event_type,
+        "address": address,
+        "recommendations": recommendations,
+        "riskAnalysis": risk_analysis,
+        "hourlyForecast": hourly_forecast,
         
-        enhanced_rows.append(enhanced_row)
+        # Additional original columns if they exist
+        "feels_like_celsius": row.get('feels_like_celsius', row['temperature']),
+        "pressure_hpa": row.get('pressure_hpa', 1013.25),
+        "visibility_km": row.get('visibility_km', 10.0),
+        "uv_index": row.get('uv_index', 5.0),
+        "wind_direction": row.get('wind_direction', 'N')
+    }
+
+def create_enhanced_csv(input_file: str, output_file: str) -> int:
+    """Create enhanced CSV file with new columns"""
     
-    # Create new DataFrame
-    enhanced_df = pd.DataFrame(enhanced_rows)
+    print(f"Loading data from {input_file} in chunks...")
     
-    # Save to CSV
+    row_count = 0
+    
+    # Each chunk is enhanced and appended to the output before the next one
+    # is read; the header is written with the first chunk only
     print(f"Saving enhanced CSV to {output_file}...")
-    enhanced_df.to_csv(output_file, index=False)
+    for chunk_number, chunk in enumerate(read_csv_chunks(input_file)):
+        enhanced_rows = []
+        
+        for _, row in chunk.iterrows():
+            if row_count % 100 == 0:
+                print(f"Processing row {row_count}...")
+            
+            # Generate new data
+            event_type = random.choice(EVENT_TYPES)
+            recommendations = generate_recommendations(
+                row['conditions'], 
+                row['riskLevel'], 
+                event_type
+            )
+            risk_analysis = generate_risk_analysis(row)
+            hourly_forecast = generate_hourly_forecast(row['date'], row['temperature'])
+            address = generate_address_data(row['city'], row.get('country', 'USA'))
+            
+            # Create enhanced row
+            enhanced_row = row.copy()
+            enhanced_row['eventType'] = event_type
+            enhanced_row['address_json'] = json.dumps(address)
+            enhanced_row['recommendations_json'] = json.dumps(recommendations)
+            enhanced_row['riskAnalysis_json'] = json.dumps(risk_analysis)
+            enhanced_row['hourlyForecast_json'] = json.dumps(hourly_forecast)
+            enhanced_row['city'] = row['city']  # Ensure consistency
+            
+            enhanced_rows.append(enhanced_row)
+            row_count += 1
+        
+        pd.DataFrame(enhanced_rows).to_csv(
+            output_file, index=False, mode='w' if chunk_number == 0 else 'a', header=chunk_number == 0
+        )
     
     print("CSV enhancement completed!")
     
-    return enhanced_df
+    return row_count
 
 if __name__ == "__main__":
     # Enhance the existing weather data
@@ -360,23 +312,23 @@ if __name__ == "__main__":
     output_csv = "weather_data_enhanced.csv"
     
     # Create enhanced JSON file
-    enhanced_data = enhance_weather_data(input_csv, output_json)
+    summary = enhance_weather_data(input_csv, output_json)
     
     # Create enhanced CSV file
-    enhanced_df = create_enhanced_csv(input_csv, output_csv)
+    enhanced_rows = create_enhanced_csv(input_csv, output_csv)
     
     print(f"\nEnhancement complete!")
     print(f"- Enhanced JSON: {output_json}")
     print(f"- Enhanced CSV: {output_csv}")
-    print(f"- Total records processed: {len(enhanced_data)}")
+    print(f"- Total records processed: {summary['records']}")
     
     # Show sample of enhanced data
     print(f"\nSample enhanced record:")
-    sample = enhanced_data[0]
+    sample = summary['sample'] or {}
     for key, value in sample.items():
         if key in ['recommendations', 'riskAnalysis', 'address']:
             print(f"  {key}: {json.dumps(value, indent=4)}")
         elif key == 'hourlyForecast':
             print(f"  {key}: {len(value)} hourly entries")
         else:
-            print(f"  {key}: {value}")
\ No newline at end of file
+            print(f"  {key}: {value}")
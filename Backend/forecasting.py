@@ -0,0 +1,340 @@
+import threading
+import time
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from spatial_index import SpatialIndex
+from weather_store import WeatherStore
+
+# Measurements forecast for dates without a record
+FORECAST_COLUMNS = ["temperature", "humidity", "windSpeed", "precipitation"]
+
+# Annual harmonics of the seasonal regression; the features of a day are
+# [1, cos(2πkt), sin(2πkt) for k = 1..HARMONICS] with t in years
+HARMONICS = 2
+FEATURES = 1 + 2 * HARMONICS
+YEAR_DAYS = 365.2425
+
+# Weight of the latitude prior in every station's fit, in records: the fit
+# is a ridge regression shrunk towards the prior's coefficients, so short
+# histories (less than a season) stay plausible and long ones ignore it
+PRIOR_RECORDS = 14.0
+
+# Exponential smoothing of each station's residuals: the weight of a
+# residual decays by this factor per day, and so does the smoothed level
+# as a forecast moves away from the last record. Residuals older than the
+# memory no longer count (0.8^60 is about 1e-6).
+RESIDUAL_DECAY = 0.8
+RESIDUAL_MEMORY_DAYS = 60
+
+# Physical range of each measurement (None is unbounded)
+FORECAST_BOUNDS = {
+    "temperature": (None, None),
+    "humidity": (0.0, 100.0),
+    "windSpeed": (0.0, None),
+    "precipitation": (0.0, 100.0),
+}
+
+# Latitude prior: mean temperature falls and its seasonal swing grows away
+# from the equator, peaking in late July (late January in the south)
+PRIOR_EQUATOR_TEMPERATURE = 28.0
+PRIOR_TEMPERATURE_PER_DEGREE = -0.38
+PRIOR_AMPLITUDE_PER_DEGREE = 0.3
+PRIOR_WARMEST_DAY = 200
+PRIOR_MEANS = {"humidity": 65.0, "windSpeed": 12.0, "precipitation": 30.0}
+
+# Conditions of a forecast as (conditions, precipitation above, wind above,
+# temperature below); the first matching rule wins, otherwise Sunny
+FORECAST_CONDITION_RULES = [
+    ("Stormy", 70, 30, None),
+    ("Snow", 50, None, 0),
+    ("Rainy", 50, None, None),
+    ("Cloudy", 30, None, None),
+]
+DEFAULT_FORECAST_CONDITIONS = "Sunny"
+
+
+def epoch_days(dates) -> np.ndarray:
+    """Days since 1970-01-01 of each date"""
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+def design(days: np.ndarray) -> np.ndarray:
+    """``(len(days) x FEATURES)`` harmonic features of days since the epoch"""
+    angles = (2 * np.pi / YEAR_DAYS) * np.asarray(days, dtype=np.float64)
+    columns = [np.ones_like(angles)]
+    for harmonic in range(1, HARMONICS + 1):
+        columns.append(np.cos(harmonic * angles))
+        columns.append(np.sin(harmonic * angles))
+    return np.stack(columns, axis=-1)
+
+
+def prior_coefficients(latitudes: np.ndarray) -> np.ndarray:
+    """``(len(latitudes) x FEATURES x columns)`` coefficients of the
+    latitude prior"""
+    latitudes = np.atleast_1d(np.asarray(latitudes, dtype=np.float64))
+    coefficients = np.zeros((len(latitudes), FEATURES, len(FORECAST_COLUMNS)))
+    distance = np.abs(latitudes)
+    temperature = FORECAST_COLUMNS.index("temperature")
+    coefficients[:, 0, temperature] = PRIOR_EQUATOR_TEMPERATURE + PRIOR_TEMPERATURE_PER_DEGREE * distance
+    warmest = np.where(latitudes >= 0, PRIOR_WARMEST_DAY, PRIOR_WARMEST_DAY - YEAR_DAYS / 2)
+    phase = 2 * np.pi * warmest / YEAR_DAYS
+    coefficients[:, 1, temperature] = PRIOR_AMPLITUDE_PER_DEGREE * distance * np.cos(phase)
+    coefficients[:, 2, temperature] = PRIOR_AMPLITUDE_PER_DEGREE * distance * np.sin(phase)
+    for name, mean in PRIOR_MEANS.items():
+        coefficients[:, 0, FORECAST_COLUMNS.index(name)] = mean
+    return coefficients
+
+
+def _bounded(values: np.ndarray) -> np.ndarray:
+    for column, name in enumerate(FORECAST_COLUMNS):
+        low, high = FORECAST_BOUNDS[name]
+        values[..., column] = np.clip(values[..., column], low, high)
+    return values
+
+
+def forecast_conditions(temperature, precipitation, wind_speed) -> np.ndarray:
+    """Conditions of whole arrays of forecast measurements"""
+    temperature = np.atleast_1d(np.asarray(temperature, dtype=np.float64))
+    precipitation = np.atleast_1d(np.asarray(precipitation, dtype=np.float64))
+    wind_speed = np.atleast_1d(np.asarray(wind_speed, dtype=np.float64))
+    conditions = []
+    for _, rain, wind, cold in FORECAST_CONDITION_RULES:
+        matched = precipitation > rain
+        if wind is not None:
+            matched &= wind_speed > wind
+        if cold is not None:
+            matched &= temperature < cold
+        conditions.append(matched)
+    names = np.array([rule[0] for rule in FORECAST_CONDITION_RULES] + [DEFAULT_FORECAST_CONDITIONS])
+    return names[np.select(conditions, np.arange(len(FORECAST_CONDITION_RULES)), len(FORECAST_CONDITION_RULES))]
+
+
+def prior_forecast(latitudes, dates) -> Dict[str, np.ndarray]:
+    """Forecast of the latitude prior alone, for points without history;
+    scalar latitudes or dates apply to every point"""
+    coefficients = prior_coefficients(latitudes)
+    days = np.broadcast_to(np.atleast_1d(epoch_days(dates)), len(coefficients))
+    values = np.einsum("nf,nfc->nc", design(days), coefficients)
+    values = _bounded(values)
+    return {name: values[:, column] for column, name in enumerate(FORECAST_COLUMNS)}
+
+
+class ForecastModel:
+    """Per-station harmonic regression plus smoothed residuals.
+
+    Each station keeps the sufficient statistics of its regression
+    (``XᵀX`` and ``Xᵀy``), so new records are folded in by adding their
+    contributions and re-solving only the stations they touch. A model is
+    never modified once built: ``updated`` returns a new one, so readers
+    need no lock. A forecast is one dot product of the day's features
+    with the station's coefficients, plus the decayed residual level.
+    """
+
+    def __init__(self, station_latitudes: np.ndarray, xtx: np.ndarray, xty: np.ndarray, counts: np.ndarray,
+                 coefficients: np.ndarray, last_days: np.ndarray, residual_sums: np.ndarray,
+                 residual_weights: np.ndarray, rows: int):
+        self.station_latitudes = station_latitudes
+        self.xtx = xtx  # (stations x features x features)
+        self.xty = xty  # (stations x features x columns)
+        self.counts = counts  # (stations) records fitted
+        self.coefficients = coefficients  # (stations x features x columns)
+        self.last_days = last_days  # (stations) day of the latest record
+        self.residual_sums = residual_sums  # (stations x columns) decayed residual sums
+        self.residual_weights = residual_weights  # (stations) decayed weights
+        self.rows = rows  # leading store rows folded into the model
+
+    @property
+    def station_count(self) -> int:
+        return len(self.station_latitudes)
+
+    @classmethod
+    def empty(cls) -> "ForecastModel":
+        return cls(
+            np.empty(0), np.empty((0, FEATURES, FEATURES)), np.empty((0, FEATURES, len(FORECAST_COLUMNS))),
+            np.empty(0, dtype=np.int64), np.empty((0, FEATURES, len(FORECAST_COLUMNS))),
+            np.empty(0, dtype=np.int64), np.empty((0, len(FORECAST_COLUMNS))), np.empty(0), 0
+        )
+
+    @classmethod
+    def fit(cls, store: WeatherStore, index: SpatialIndex) -> "ForecastModel":
+        """Fit every station of a store at once"""
+        return cls.empty().updated(store, index)
+
+    def _grown(self, station_latitudes: np.ndarray) -> List[np.ndarray]:
+        """Copies of the per-station arrays with rows for new stations"""
+        extra = len(station_latitudes) - self.station_count
+
+        def grow(values: np.ndarray, fill=0) -> np.ndarray:
+            padding = np.full((extra,) + values.shape[1:], fill, dtype=values.dtype)
+            return np.concatenate([values, padding])
+
+        return [
+            grow(self.xtx), grow(self.xty), grow(self.counts),
+            np.concatenate([self.coefficients, prior_coefficients(station_latitudes[self.station_count:])]),
+            grow(self.last_days, np.iinfo(np.int64).min // 2), grow(self.residual_sums), grow(self.residual_weights),
+        ]
+
+    def updated(self, store: WeatherStore, index: SpatialIndex) -> "ForecastModel":
+        """Model with the store's rows after ``self.rows`` folded in.
+
+        Only the new rows are read. Their outer products are added to the
+        touched stations' sums with one ``bincount`` per matrix entry, those
+        stations are re-solved as one batched ridge system, and the residual
+        levels are decayed to each station's latest day before the new
+        rows' residuals are added. Older residuals keep the coefficients
+        they were computed with.
+        """
+        station_latitudes = np.asarray(index.station_latitudes, dtype=np.float64)
+        xtx, xty, counts, coefficients, last_days, residual_sums, residual_weights = self._grown(station_latitudes)
+        station_count = len(station_latitudes)
+        rows = np.arange(self.rows, len(store))
+        if not len(rows):
+            return ForecastModel(station_latitudes, xtx, xty, counts, coefficients, last_days,
+                                 residual_sums, residual_weights, len(store))
+
+        stations = index.station_of_row[rows].astype(np.int64)
+        days = epoch_days(store.dates[rows])
+        features = design(days)
+        targets = np.stack([store.floats[name][rows] for name in FORECAST_COLUMNS], axis=-1)
+        for i in range(FEATURES):
+            for j in range(i, FEATURES):
+                sums = np.bincount(stations, weights=features[:, i] * features[:, j], minlength=station_count)
+                xtx[:, i, j] += sums
+                if i != j:
+                    xtx[:, j, i] += sums
+            for column in range(len(FORECAST_COLUMNS)):
+                xty[:, i, column] += np.bincount(
+                    stations, weights=features[:, i] * targets[:, column], minlength=station_count
+                )
+        counts += np.bincount(stations, minlength=station_count)
+
+        touched = np.unique(stations)
+        prior = prior_coefficients(station_latitudes[touched])
+        penalty = PRIOR_RECORDS * np.eye(FEATURES)
+        coefficients[touched] = np.linalg.solve(xtx[touched] + penalty, xty[touched] + penalty @ prior)
+
+        latest = last_days.copy()
+        np.maximum.at(latest, stations, days)
+        decay = np.power(RESIDUAL_DECAY, (latest[touched] - last_days[touched]).astype(np.float64))
+        residual_sums[touched] *= decay[:, np.newaxis]
+        residual_weights[touched] *= decay
+        last_days = latest
+
+        recent = days >= last_days[stations] - RESIDUAL_MEMORY_DAYS
+        recent_stations = stations[recent]
+        predicted = np.einsum("nf,nfc->nc", features[recent], coefficients[recent_stations])
+        weights = np.power(RESIDUAL_DECAY, (last_days[recent_stations] - days[recent]).astype(np.float64))
+        residuals = targets[recent] - predicted
+        for column in range(len(FORECAST_COLUMNS)):
+            residual_sums[:, column] += np.bincount(
+                recent_stations, weights=weights * residuals[:, column], minlength=station_count
+            )
+        residual_weights += np.bincount(recent_stations, weights=weights, minlength=station_count)
+
+        return ForecastModel(station_latitudes, xtx, xty, counts, coefficients, last_days,
+                             residual_sums, residual_weights, len(store))
+
+    def forecast(self, station: int, date) -> Dict[str, float]:
+        """Forecast measurements of a station on a date"""
+        day = int(epoch_days(date))
+        values = design(np.array([day]))[0] @ self.coefficients[station]
+        weight = self.residual_weights[station]
+        if weight > 0:
+            level = self.residual_sums[station] / weight
+            values = values + level * RESIDUAL_DECAY ** abs(day - int(self.last_days[station]))
+        values = _bounded(values)
+        return {name: float(values[column]) for column, name in enumerate(FORECAST_COLUMNS)}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "stations": self.station_count,
+            "rows": self.rows,
+            "stationsWithHistory": int(np.count_nonzero(self.counts)),
+        }
+
+
+class ForecastBuilder:
+    """Keeps the forecast model of the newest published store version,
+    refreshing it on a background thread after each publish.
+
+    Appends only fold the new rows into the current model; a full rebuild
+    refits every station. Until a refresh finishes, the previous model
+    keeps serving (station ids stay valid across appends); after a full
+    rebuild it is dropped and readers fall back to the latitude prior.
+    Refreshes are tagged with their version's epoch, so one still running
+    for a version older than the latest full rebuild is discarded rather
+    than installed.
+    """
+
+    def __init__(self):
+        self.model: Optional[ForecastModel] = None
+        self.fits = 0
+        self.updates = 0
+        self.error: Optional[str] = None
+        self.last_seconds: Optional[float] = None
+        self.last_stations = 0
+        self._pending = None
+        self._refit = False
+        self._running = False
+        self._rebuild_epoch = 0
+        self._lock = threading.Lock()
+
+    def schedule(self, version):
+        """Publish subscriber: refresh the model for ``version`` in the background"""
+        with self._lock:
+            if version.base_rows == 0:
+                self.model = None
+                self._refit = True
+                self._rebuild_epoch = version.epoch
+            self._pending = version
+            if not self._running:
+                self._running = True
+                threading.Thread(target=self._run, name="forecast-builder", daemon=True).start()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                version = self._pending
+                refit = self._refit or self.model is None
+                self._pending = None
+                self._refit = False
+                if version is None:
+                    self._running = False
+                    return
+                model = self.model
+            start = time.perf_counter()
+            try:
+                if refit:
+                    model = ForecastModel.fit(version.store, version.index)
+                    stations = model.station_count
+                else:
+                    touched = version.index.station_of_row[model.rows:len(version.store)]
+                    stations = len(np.unique(touched))
+                    model = model.updated(version.store, version.index)
+                error = None
+            except Exception as e:
+                model, error = None, str(e)
+            with self._lock:
+                self.error = error
+                if model is not None and version.epoch >= self._rebuild_epoch:
+                    self.model = model
+                    if refit:
+                        self.fits += 1
+                    else:
+                        self.updates += 1
+                    self.last_seconds = time.perf_counter() - start
+                    self.last_stations = stations
+
+    def stats(self) -> Dict[str, Any]:
+        seconds = self.last_seconds
+        return {
+            "fits": self.fits,
+            "updates": self.updates,
+            "building": self._running,
+            "error": self.error,
+            "lastRefreshSeconds": round(seconds, 4) if seconds is not None else None,
+            "lastStationsRefreshed": self.last_stations,
+            "stationsPerSecond": round(self.last_stations / seconds, 1) if seconds else None,
+            **(self.model.stats() if self.model is not None else {}),
+        }
@@ -0,0 +1,61 @@
+import numpy as np
+from typing import Dict, Optional, Tuple
+
+from weather_store import WeatherStore
+from spatial_index import SpatialIndex
+
+# Measurements blended across neighbouring stations
+INTERPOLATED_COLUMNS = ["temperature", "humidity", "windSpeed", "precipitation"]
+
+# Default neighbour count and distance exponent of the IDW weights
+IDW_DEFAULT_K = 4
+IDW_MAX_K = 16
+IDW_POWER = 2.0
+
+# Distances below this (km) count as standing on the station
+IDW_EXACT_KM = 1e-3
+
+
+def idw_weights(distances_km: np.ndarray, valid: np.ndarray, power: float = IDW_POWER) -> np.ndarray:
+    """Normalized inverse-distance weights for an ``(N x k)`` neighbour matrix.
+
+    Invalid neighbours get weight 0. A point that coincides with a valid
+    station takes that station's values exactly. Rows without any valid
+    neighbour are all zero.
+    """
+    distances_km = np.asarray(distances_km, dtype=np.float64)
+    exact = valid & (distances_km < IDW_EXACT_KM)
+    with np.errstate(divide="ignore"):
+        weights = np.where(valid, 1.0 / np.maximum(distances_km, IDW_EXACT_KM) ** power, 0.0)
+    weights = np.where(exact.any(axis=1, keepdims=True), exact.astype(np.float64), weights)
+    totals = weights.sum(axis=1, keepdims=True)
+    return np.divide(weights, totals, out=np.zeros_like(weights), where=totals > 0)
+
+
+def interpolate_idw(store: WeatherStore, index: SpatialIndex, latitudes, longitudes, dates,
+                    k: int = IDW_DEFAULT_K, max_gap_days: Optional[int] = None,
+                    power: float = IDW_POWER, within_range: bool = False) -> Tuple[Dict[str, np.ndarray], np.ndarray, np.ndarray, np.ndarray]:
+    """Blend measurements of the k nearest stations on each point's date.
+
+    One k-NN query and one date search cover all N points. Returns the
+    interpolated columns (NaN where no neighbour has a record), and the
+    ``(N x k)`` neighbour rows (-1 if missing), distances and weights.
+    """
+    latitudes = np.atleast_1d(np.asarray(latitudes, dtype=np.float64))
+    longitudes = np.atleast_1d(np.asarray(longitudes, dtype=np.float64))
+    dates = np.broadcast_to(np.asarray(dates, dtype="datetime64[D]"), latitudes.shape)
+
+    stations, distances = index.nearest(latitudes, longitudes, k=k)
+    neighbours = stations.shape[1]
+    rows, _ = index.lookup_dates(stations.ravel(), np.repeat(dates, neighbours), max_gap_days, within_range)
+    rows = rows.reshape(stations.shape)
+    valid = rows >= 0
+
+    weights = idw_weights(distances, valid, power)
+    safe_rows = np.where(valid, rows, 0)
+    found = weights.sum(axis=1) > 0
+    values = {}
+    for name in INTERPOLATED_COLUMNS:
+        blended = (store.floats[name][safe_rows] * weights).sum(axis=1)
+        values[name] = np.where(found, blended, np.nan)
+    return values, rows, distances, weights
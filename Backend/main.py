@@ -1,22 +1,70 @@
-from fastapi import FastAPI, HTTPException, UploadFile, File, Query
+from fastapi import FastAPI, HTTPException, UploadFile, File, Query, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any, Union
 import pandas as pd
-import json
 import random
 import asyncio
 from datetime import datetime, timedelta
 import os
+import re
+import time
 from dotenv import load_dotenv
-import io
-import csv
+import numpy as np
+from contextlib import asynccontextmanager
+from weather_store import EXPORT_COLUMNS, WeatherStore, derive_hourly_forecast
+from risk_engine import RISK_LEVELS, analyze_risk, classify_risk_levels, risk_level_of, scored_risk_level
+from weather_ingest import complete_size, load_weather_csv, read_appended_rows
+from spatial_index import SpatialIndex, haversine_km
+from lru_cache import LRUCache
+from response_cache import ResponseCache, SQLiteCache, geohash_cell
+from serialization import JSONBytesResponse, dumps, embed, json_array
+from weather_history import DEFAULT_PERCENTILES, HISTORY_FIELDS, rollup as weather_rollup, station_series
+from climatology import ClimatologyBuilder, day_of_year
+from bitmap_index import BitmapIndexer, QUERY_SCORES
+from forecasting import ForecastBuilder, ForecastModel, forecast_conditions, prior_forecast
+from probability import (
+    DEFAULT_WINDOW_DAYS, EXCEEDANCE_EVENTS, MAX_WINDOW_DAYS, event_weights, rank_dates, seasonal_severity, station_probabilities
+)
+from ai_services import patterns_service
+from weather_export import EXPORT_FORMATS, EXPORT_WRITERS, EXPORTABLE_COLUMNS, accepts_gzip, gzip_chunks, select_rows
+from area_query import query_area
+from interpolation import IDW_DEFAULT_K, IDW_MAX_K, interpolate_idw
+from weather_store_manager import WeatherDataVersion, WeatherStoreManager
+from weather_snapshot import open_snapshot, write_snapshot
 
 # Load environment variables
 load_dotenv()
 
-app = FastAPI(title="Weather Prediction API", version="2.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global weather_response_cache
+    # The response cache opens its SQLite tier here rather than on import
+    if WEATHER_CACHE_TTL_SECONDS > 0:
+        weather_response_cache = ResponseCache(
+            LRUCache(WEATHER_CACHE_SIZE, WEATHER_CACHE_TTL_SECONDS),
+            SQLiteCache(WEATHER_CACHE_DB, WEATHER_CACHE_TTL_SECONDS, WEATHER_CACHE_SIZE * 10) if WEATHER_CACHE_DB else None,
+            encode=bytes, decode=bytes
+        )
+    # Build the weather store in the background so importing and starting the
+    # app never blocks; /health reports progress until it is ready
+    warm_up_task = asyncio.create_task(weather_manager.warm_up(build_weather_data))
+    # Follow rows appended to weather_data.csv once the store is ready
+    watch_task = None
+    if WEATHER_RELOAD_INTERVAL_SECONDS > 0:
+        watch_task = asyncio.create_task(
+            weather_manager.watch_source(rebuild_weather_data, EVENT_TYPES, WEATHER_RELOAD_INTERVAL_SECONDS)
+        )
+    yield
+    warm_up_task.cancel()
+    if watch_task is not None:
+        watch_task.cancel()
+    if weather_response_cache is not None:
+        weather_response_cache.close()
+        weather_response_cache = None
+
+app = FastAPI(title="Weather Prediction API", version="2.0.0", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -137,8 +185,38 @@ class WeatherPatternsRequest(BaseModel):
     date: str
     patternType: str
 
+class BestDatesRequest(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    startDate: str
+    endDate: str
+    eventType: str = "outdoor"
+    # Overrides of the event type's weight per exceedance event
+    weights: Optional[Dict[str, float]] = None
+    topK: int = Field(5, ge=1, le=100)
+    windowDays: int = Field(DEFAULT_WINDOW_DAYS, ge=0, le=MAX_WINDOW_DAYS)
+
+class WeatherBatchRequest(BaseModel):
+    # Items are validated one by one so a bad point only fails itself
+    points: List[Any]
+    mode: Optional[str] = None
+    k: Optional[int] = None
+
 # Data storage
-weather_data_store = []
+weather_manager = WeatherStoreManager()
+# Derived views of records, keyed by version source and row
+weather_view_cache = LRUCache(int(os.getenv("WEATHER_VIEW_CACHE_SIZE", "10000")))
+# Rollups of station histories, keyed by station and its record count
+history_rollup_cache = LRUCache(int(os.getenv("WEATHER_HISTORY_CACHE_SIZE", "1024")))
+# Exceedance probabilities, keyed by station, its record count, day of
+# year and window
+probability_cache = LRUCache(int(os.getenv("WEATHER_PROBABILITY_CACHE_SIZE", "4096")))
+# Expected severity per day of year, keyed by station, its record count and
+# window
+severity_cache = LRUCache(int(os.getenv("WEATHER_SEVERITY_CACHE_SIZE", "1024")))
+# Encoded JSON of full records, keyed by version source and row like the
+# view cache
+weather_record_bytes = LRUCache(int(os.getenv("WEATHER_VIEW_CACHE_SIZE", "10000")))
 alerts_store = []
 users_store = []
 locations_store = []
@@ -146,48 +224,122 @@ locations_store = []
 # Event types for different activities
 EVENT_TYPES = ["wedding", "outdoor", "concert", "parade", "sports"]
 
-# Load existing data
-def load_existing_data():
-    global weather_data_store, alerts_store, users_store, locations_store
-    
-    # Load weather data
+# How many days away the nearest available date may be when the requested
+# date has no record at the nearest station; /api/weather forecasts dates
+# further away or outside the station's recorded range
+DATE_FALLBACK_DAYS = int(os.getenv("WEATHER_DATE_FALLBACK_DAYS", "3"))
+
+# Directory of the memory-mapped weather store snapshot (empty disables it)
+WEATHER_SNAPSHOT_DIR = os.getenv("WEATHER_SNAPSHOT_DIR", "weather_store_snapshot")
+
+# Most points accepted by one /api/weather/batch request
+WEATHER_BATCH_MAX_POINTS = int(os.getenv("WEATHER_BATCH_MAX_POINTS", "1000"))
+
+# How /api/weather resolves a point when the request gives no mode:
+# "nearest" (the closest station's record) or "idw" (blend of k stations)
+WEATHER_DEFAULT_MODE = os.getenv("WEATHER_DEFAULT_MODE", "nearest")
+
+# Most records returned by one /api/weather/area page
+WEATHER_AREA_MAX_RESULTS = int(os.getenv("WEATHER_AREA_MAX_RESULTS", "1000"))
+
+# Most records returned by one /api/weather/query request
+WEATHER_QUERY_MAX_RESULTS = int(os.getenv("WEATHER_QUERY_MAX_RESULTS", "1000"))
+
+# Longest date range one /api/weather/best-dates request may sweep, in days
+WEATHER_BEST_DATES_MAX_DAYS = int(os.getenv("WEATHER_BEST_DATES_MAX_DAYS", "3660"))
+
+# Optional nearest-station raster for O(1) point lookups: resolution in
+# degrees (unset disables it) and the directory it is memory-mapped from
+WEATHER_GRID_RESOLUTION = float(os.getenv("WEATHER_GRID_RESOLUTION")) if os.getenv("WEATHER_GRID_RESOLUTION") else None
+WEATHER_GRID_DIR = os.getenv("WEATHER_GRID_DIR", "weather_grid")
+weather_manager.grid_resolution = WEATHER_GRID_RESOLUTION
+weather_manager.grid_directory = WEATHER_GRID_DIR or None
+
+# Weather CSV and how often it is polled for appended rows (0 disables)
+WEATHER_CSV_PATH = "weather_data.csv"
+WEATHER_RELOAD_INTERVAL_SECONDS = float(os.getenv("WEATHER_RELOAD_INTERVAL_SECONDS", "10"))
+
+# Response cache of /api/weather: points are snapped to geohash cells of
+# this precision (7 is about 150 m across) and kept for the TTL in memory and
+# in a SQLite file that survives restarts (an empty path keeps it in memory
+# only; a TTL of 0 disables the cache). It is opened by the lifespan hook.
+WEATHER_CACHE_TTL_SECONDS = float(os.getenv("WEATHER_CACHE_TTL_SECONDS", "300"))
+WEATHER_CACHE_GEOHASH_PRECISION = int(os.getenv("WEATHER_CACHE_GEOHASH_PRECISION", "7"))
+WEATHER_CACHE_SIZE = int(os.getenv("WEATHER_CACHE_SIZE", "10000"))
+WEATHER_CACHE_DB = os.getenv("WEATHER_CACHE_DB", "weather_cache.sqlite3")
+weather_response_cache: Optional[ResponseCache] = None
+
+# Cached views are keyed by source and row, which only stay valid across
+# appends; the keys of a replaced version are never looked up again, so
+# clearing them frees the memory
+def invalidate_weather_views(version: WeatherDataVersion):
+    if version.base_rows == 0:
+        weather_view_cache.clear()
+        weather_record_bytes.clear()
+        history_rollup_cache.clear()
+        probability_cache.clear()
+        severity_cache.clear()
+        # Responses of a replaced version are keyed by its source and never
+        # looked up again; the first version keeps what the disk tier kept
+        # across the restart
+        if weather_response_cache is not None and version.epoch > 1:
+            weather_response_cache.clear()
+
+weather_manager.subscribe(invalidate_weather_views)
+
+# Per-station climatology behind /api/weather/patterns, rebuilt in the
+# background whenever a version is published
+climatology_builder = ClimatologyBuilder()
+weather_manager.subscribe(climatology_builder.schedule)
+
+# Bitmap indexes of the categorical columns for /api/weather/query
+bitmap_indexer = BitmapIndexer()
+weather_manager.subscribe(bitmap_indexer.update)
+
+# Per-station seasonal forecasts for dates without a record
+forecast_builder = ForecastBuilder()
+weather_manager.subscribe(forecast_builder.schedule)
+
+# Load the weather store, memory-mapping a snapshot written from the same CSV
+# when there is one so restarts skip parsing
+def load_weather_store() -> WeatherStore:
+    weather_data_store = WeatherStore()
     try:
-        weather_df = pd.read_csv("weather_data.csv")
-        for _, row in weather_df.iterrows():
-            # Generate additional data needed for the website
-            event_type = random.choice(EVENT_TYPES)
-            recommendations = generate_recommendations(row['conditions'], row['riskLevel'])
-            risk_analysis = generate_risk_analysis(row)
-            hourly_forecast = generate_hourly_forecast(row['date'], row['temperature'])
-            
-            address = Address(
-                city=row.get('city', row['city']),
-                state=row.get('state', ''),
-                country=row.get('country', 'USA'),
-                countryCode=row.get('countryCode', 'US')
+        snapshot = open_snapshot(WEATHER_SNAPSHOT_DIR, WEATHER_CSV_PATH) if WEATHER_SNAPSHOT_DIR else None
+        if snapshot is not None:
+            # Rows appended to the CSV after the snapshot was written are
+            # parsed on their own and added on top of it
+            weather_data_store, offset = snapshot
+            columns, offset = read_appended_rows(WEATHER_CSV_PATH, offset, EVENT_TYPES)
+            if columns is not None:
+                weather_data_store = weather_data_store.appended(columns)
+            weather_manager.source = "snapshot"
+        else:
+            # Whole-column ingest; response dicts are only materialized when served
+            offset = complete_size(WEATHER_CSV_PATH)
+            weather_manager.report_progress("parsing weather_data.csv")
+            weather_data_store, weather_manager.ingest_stats = load_weather_csv(
+                WEATHER_CSV_PATH, EVENT_TYPES,
+                progress=lambda rows: weather_manager.report_progress("parsing weather_data.csv", rows),
+                end=offset
             )
-            
-            weather_data = {
-                "city": row['city'],
-                "country": row.get('country', 'USA'),
-                "latitude": row['latitude'],
-                "longitude": row['longitude'],
-                "address": address.dict(),
-                "date": row['date'],
-                "eventType": event_type,
-                "temperature": row['temperature'],
-                "humidity": row['humidity'],
-                "windSpeed": row['windSpeed'],
-                "precipitation": row['precipitation'],
-                "conditions": row['conditions'],
-                "riskLevel": row['riskLevel'],
-                "recommendations": recommendations.dict(),
-                "riskAnalysis": risk_analysis.dict(),
-                "hourlyForecast": [hour.dict() for hour in hourly_forecast]
-            }
-            weather_data_store.append(weather_data)
+            weather_manager.source = "csv"
+            if WEATHER_SNAPSHOT_DIR and weather_data_store:
+                weather_manager.report_progress("writing snapshot", len(weather_data_store))
+                try:
+                    write_snapshot(weather_data_store, WEATHER_SNAPSHOT_DIR, WEATHER_CSV_PATH, offset)
+                except OSError as e:
+                    print(f"Could not write weather snapshot: {e}")
+        weather_manager.track_source(WEATHER_CSV_PATH, offset)
     except FileNotFoundError:
         print("weather_data.csv not found, will generate sample data")
+    return weather_data_store
+
+# Load existing data
+def load_existing_data() -> WeatherStore:
+    global alerts_store, users_store, locations_store
+    
+    weather_data_store = load_weather_store()
     
     # Load users
     try:
@@ -226,6 +378,8 @@ def load_existing_data():
             alerts_store.append(alert)
     except FileNotFoundError:
         print("alerts.csv not found, will generate sample alerts")
+    
+    return weather_data_store
 
 # Generate recommendations based on weather conditions
 def generate_recommendations(weather_condition: str, risk_level: str) -> Recommendations:
@@ -267,84 +421,83 @@ def generate_recommendations(weather_condition: str, risk_level: str) -> Recomme
         backupPlans=backup_map.get(risk_level, "Have contingency plans ready.")
     )
 
-# Generate risk analysis
-def generate_risk_analysis(row) -> RiskAnalysis:
-    temp = row['temperature']
-    precip = row['precipitation']
-    wind = row['windSpeed']
-    
-    # Precipitation risk
-    if precip > 70:
-        precip_level = "High"
-        precip_desc = "Heavy precipitation likely, significant impact on activities"
-    elif precip > 40:
-        precip_level = "Medium"
-        precip_desc = "Moderate precipitation expected, some impact on activities"
-    else:
-        precip_level = "Low"
-        precip_desc = "Minimal precipitation expected, low impact on activities"
-    
-    # Wind impact
-    if wind > 30:
-        wind_level = "High"
-        wind_desc = "Strong winds expected, high impact on outdoor activities"
-    elif wind > 15:
-        wind_level = "Medium"
-        wind_desc = "Moderate winds, some impact on activities"
-    else:
-        wind_level = "Low"
-        wind_desc = "Light winds, minimal impact on activities"
-    
-    # Temperature comfort
-    if temp > 30:
-        temp_level = "High"
-        temp_desc = "Very hot conditions, heat stress risk"
-    elif temp < 5:
-        temp_level = "High"
-        temp_desc = "Very cold conditions, hypothermia risk"
-    elif 18 <= temp <= 25:
-        temp_level = "Low"
-        temp_desc = "Comfortable temperature range"
-    else:
-        temp_level = "Medium"
-        temp_desc = "Moderate temperature, some discomfort possible"
-    
-    return RiskAnalysis(
-        precipitationRisk={"level": precip_level, "description": precip_desc},
-        windImpact={"level": wind_level, "description": wind_desc},
-        temperatureComfort={"level": temp_level, "description": temp_desc}
-    )
+# Build the full response dict for one stored record. Recommendations, risk
+# analysis and hourly forecast are derived the first time a record is served
+# and kept in a bounded LRU, so this work scales with traffic, not data size.
+# Bulk readers pass cache=False so a full export does not flush hot entries.
+# Entries are keyed by the version's source as well as the row, so a request
+# still reading a replaced version cannot put its views back after the
+# cache is cleared.
+def build_weather_response(weather: WeatherDataVersion, index: int, cache: bool = True) -> Dict[str, Any]:
+    weather_data_store = weather.store
+    weather_data = weather_data_store.row(index)
+    key = (weather.source, index)
+    derived = weather_view_cache.get(key) if cache else None
+    if derived is None:
+        derived = {
+            "recommendations": generate_recommendations(weather_data["conditions"], weather_data["riskLevel"]).dict(),
+            "riskAnalysis": weather_data_store.risk_analysis(index),
+            "hourlyForecast": weather_data_store.hourly_forecast(index)
+        }
+        if cache:
+            weather_view_cache.put(key, derived)
+    weather_data.update(derived)
+    return weather_data
 
-# Generate hourly forecast
-def generate_hourly_forecast(date_str: str, base_temp: float) -> List[HourlyForecast]:
-    hourly_data = []
-    base_date = datetime.strptime(date_str, "%Y-%m-%d")
-    
-    conditions = ["Clear", "Cloudy", "Partly Cloudy", "Light Rain", "Overcast"]
-    
-    for hour in range(0, 24, 3):  # Every 3 hours
-        time_str = f"{hour:02d}:00"
-        # Temperature variation throughout the day
-        temp_variation = random.uniform(-5, 5)
-        temperature = base_temp + temp_variation
-        precipitation = random.uniform(0, 100)
-        condition = random.choice(conditions)
-        
-        hourly_data.append(HourlyForecast(
-            time=time_str,
-            temperature=round(temperature, 1),
-            precipitation=round(precipitation, 1),
-            conditions=condition
-        ))
-    
-    return hourly_data
+# Encoded JSON of a full record; rows never change once written, so the
+# bytes are reused across appends until a rebuild or reclassification
+# changes the version's source
+def encode_weather_record(weather: WeatherDataVersion, index: int) -> bytes:
+    key = (weather.source, index)
+    encoded = weather_record_bytes.get(key)
+    if encoded is None:
+        encoded = dumps(build_weather_response(weather, index))
+        weather_record_bytes.put(key, encoded)
+    return encoded
+
+# Build the response for a point interpolated from its neighbouring stations.
+# Descriptive fields come from the most heavily weighted station; the
+# measurements and everything derived from them come from the blend.
+def build_interpolated_response(weather_data_store: WeatherStore, latitude: float, longitude: float, date,
+                                values: Dict[str, float], rows: np.ndarray, distances: np.ndarray,
+                                weights: np.ndarray) -> Dict[str, Any]:
+    weather_data = weather_data_store.row(int(rows[np.argmax(weights)]))
+    weather_data.update({name: round(value, 2) for name, value in values.items()})
+    weather_data.update({"latitude": latitude, "longitude": longitude, "date": str(date)})
+    weather_data["riskLevel"] = risk_level_of(values["temperature"], values["precipitation"], values["windSpeed"])
+    weather_data["recommendations"] = generate_recommendations(weather_data["conditions"], weather_data["riskLevel"]).dict()
+    weather_data["riskAnalysis"] = analyze_risk(values["temperature"], values["precipitation"], values["windSpeed"])
+    weather_data["hourlyForecast"] = derive_hourly_forecast(latitude, longitude, date, values["temperature"])
+    weather_data["interpolation"] = {
+        "mode": "idw",
+        "stations": [
+            {
+                "latitude": float(weather_data_store.floats["latitude"][row]),
+                "longitude": float(weather_data_store.floats["longitude"][row]),
+                "date": str(weather_data_store.dates[row]),
+                "distanceKm": round(float(distance), 3),
+                "weight": round(float(weight), 4)
+            }
+            for row, distance, weight in zip(rows.tolist(), distances.tolist(), weights.tolist()) if row >= 0
+        ]
+    }
+    return weather_data
 
-# Initialize data
-load_existing_data()
+# Validate the interpolation mode and neighbour count of a request
+def parse_interpolation(mode: Optional[str], k: Any):
+    mode = mode or WEATHER_DEFAULT_MODE
+    if mode not in ("nearest", "idw"):
+        raise HTTPException(status_code=400, detail="Invalid mode, expected nearest or idw")
+    try:
+        k = IDW_DEFAULT_K if k is None else int(k)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid k, expected an integer")
+    if not 1 <= k <= IDW_MAX_K:
+        raise HTTPException(status_code=400, detail=f"k must be between 1 and {IDW_MAX_K}")
+    return mode, k
 
-# If no data loaded, generate sample data
-if not weather_data_store:
-    # Generate sample weather data
+# Generate sample weather data when no CSV is available
+def generate_sample_weather_data(weather_data_store: WeatherStore):
     locations = [
         {"name": "New York", "lat": 40.7128, "lon": -74.0060, "country": "USA", "state": "NY"},
         {"name": "Los Angeles", "lat": 34.0522, "lon": -118.2437, "country": "USA", "state": "CA"},
@@ -353,67 +506,68 @@ if not weather_data_store:
         {"name": "Phoenix", "lat": 33.4484, "lon": -112.0740, "country": "USA", "state": "AZ"}
     ]
     
-    weather_conditions = ["Sunny", "Cloudy", "Rainy", "Stormy", "Partly Cloudy", "Overcast", "Light Rain", "Snow"]
-    risk_levels = ["Low", "Medium", "High", "Critical"]
-    
     base_date = datetime.now()
+    sample_records = []
     
     for location in locations:
         for i in range(30):  # 30 days of data
             date = (base_date + timedelta(days=i)).strftime("%Y-%m-%d")
-            temperature = random.uniform(-10, 40)
-            humidity = random.uniform(20, 100)
-            precipitation = random.uniform(0, 100)
-            wind_speed = random.uniform(0, 50)
-            condition = random.choice(weather_conditions)
             event_type = random.choice(EVENT_TYPES)
             
-            # Calculate risk level
-            if precipitation > 70 or wind_speed > 30 or temperature > 35 or temperature < -5:
-                risk_level = "Critical"
-            elif precipitation > 50 or wind_speed > 20 or temperature > 30 or temperature < 0:
-                risk_level = "High"
-            elif precipitation > 30 or wind_speed > 15 or temperature > 25 or temperature < 5:
-                risk_level = "Medium"
-            else:
-                risk_level = "Low"
-            
-            address = Address(
-                city=location["name"],
-                state=location["state"],
-                country=location["country"],
-                countryCode="US"
-            )
-            
-            recommendations = generate_recommendations(condition, risk_level)
-            
-            risk_analysis = RiskAnalysis(
-                precipitationRisk={"level": "Medium", "description": "Moderate precipitation risk"},
-                windImpact={"level": "Low", "description": "Minimal wind impact expected"},
-                temperatureComfort={"level": "Medium", "description": "Moderate temperature conditions"}
-            )
-            
-            hourly_forecast = generate_hourly_forecast(date, temperature)
-            
-            weather_data = {
+            sample_records.append({
                 "city": location["name"],
+                "state": location["state"],
                 "country": location["country"],
+                "countryCode": "US",
                 "latitude": location["lat"],
                 "longitude": location["lon"],
-                "address": address.dict(),
                 "date": date,
-                "eventType": event_type,
-                "temperature": temperature,
-                "humidity": humidity,
-                "windSpeed": wind_speed,
-                "precipitation": precipitation,
-                "conditions": condition,
-                "riskLevel": risk_level,
-                "recommendations": recommendations.dict(),
-                "riskAnalysis": risk_analysis.dict(),
-                "hourlyForecast": [hour.dict() for hour in hourly_forecast]
-            }
-            weather_data_store.append(weather_data)
+                "eventType": event_type
+            })
+    
+    # Sample dates lie ahead with no history to fit, so their measurements
+    # are the latitude prior's forecast, computed for every record at once
+    forecast = prior_forecast(
+        [record["latitude"] for record in sample_records], [record["date"] for record in sample_records]
+    )
+    conditions = forecast_conditions(forecast["temperature"], forecast["precipitation"], forecast["windSpeed"])
+    for position, record in enumerate(sample_records):
+        for name, values in forecast.items():
+            record[name] = round(float(values[position]), 1)
+        record["conditions"] = str(conditions[position])
+    
+    # Classify every sample record's risk level in one pass
+    levels = classify_risk_levels(
+        [record["temperature"] for record in sample_records],
+        [record["precipitation"] for record in sample_records],
+        [record["windSpeed"] for record in sample_records]
+    )
+    for record, level in zip(sample_records, levels):
+        record["riskLevel"] = RISK_LEVELS[level]
+    
+    weather_data_store.extend(sample_records)
+
+# Load the weather store and build its index (runs in a worker thread)
+def build_weather_data():
+    weather_manager.report_progress("loading data files")
+    weather_data_store = load_existing_data()
+    
+    # If no data loaded, generate sample data
+    if not weather_data_store:
+        weather_manager.report_progress("generating sample data")
+        weather_manager.source = "sample"
+        weather_manager.track_generated()
+        generate_sample_weather_data(weather_data_store)
+    
+    # Build the nearest-station index once the store is loaded
+    weather_manager.report_progress("building spatial index", len(weather_data_store))
+    weather_index = SpatialIndex.from_store(weather_data_store)
+    return weather_data_store, weather_index
+
+# Rebuild the weather store after weather_data.csv was rewritten
+def rebuild_weather_data():
+    weather_data_store = load_weather_store()
+    return weather_data_store, SpatialIndex.from_store(weather_data_store)
 
 # API Endpoints
 
@@ -423,7 +577,42 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat(), "version": "2.0.0"}
+    return {
+        "status": weather_manager.status,
+        "timestamp": datetime.now().isoformat(),
+        "version": "2.0.0",
+        "weatherData": weather_manager.health()
+    }
+
+@app.get("/metrics")
+async def get_metrics():
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "weatherReload": weather_manager.metrics(),
+        "weatherGrid": weather_manager.grid_metrics(),
+        "viewCache": weather_view_cache.stats(),
+        "recordBytesCache": weather_record_bytes.stats(),
+        "historyCache": history_rollup_cache.stats(),
+        "probabilityCache": probability_cache.stats(),
+        "severityCache": severity_cache.stats(),
+        "climatology": climatology_builder.stats(),
+        "bitmapIndex": bitmap_indexer.stats(),
+        "forecast": forecast_builder.stats(),
+        "responseCache": weather_response_cache.stats() if weather_response_cache is not None else None
+    }
+
+# Recompute the stored riskLevel of every record from the current rule
+# tables, e.g. after the thresholds in risk_engine changed
+@app.post("/api/admin/reclassify-risk")
+async def reclassify_risk(weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
+    start = time.perf_counter()
+    version, changed = await asyncio.to_thread(weather_manager.reclassify_risk)
+    return {
+        "version": version.epoch,
+        "rows": len(version.store),
+        "changedRows": changed,
+        "seconds": round(time.perf_counter() - start, 3)
+    }
 
 # Geocoding endpoint
 @app.get("/api/geocode")
@@ -440,9 +629,116 @@ async def geocode_location(q: str = Query(..., description="Location query")):
     filtered_locations = [loc for loc in locations if q.lower() in loc["name"].lower()]
     return {"locations": filtered_locations}
 
+# Forecast measurements of a point on a date without a record: the nearest
+# station's seasonal model, or the latitude prior while no model covers it
+def forecast_weather(weather: WeatherDataVersion, latitude: float, longitude: float, date,
+                     model: Optional[ForecastModel]):
+    if weather.index.station_count and model is not None:
+        stations, distances = weather.index.nearest(latitude, longitude)
+        station = int(stations[0])
+        if station < model.station_count:
+            return model.forecast(station, date), {
+                "method": "harmonic regression",
+                "records": int(model.counts[station]),
+                "station": {
+                    "latitude": float(weather.index.station_latitudes[station]),
+                    "longitude": float(weather.index.station_longitudes[station]),
+                    "distanceKm": round(float(distances[0]), 3)
+                }
+            }
+    values = prior_forecast(latitude, date)
+    return {name: float(column[0]) for name, column in values.items()}, {"method": "latitude prior", "records": 0}
+
+# Response for a point on a date without a usable record: measurements from
+# forecast_weather and everything derived from them
+def build_forecast_response(weather: WeatherDataVersion, latitude: float, longitude: float, date: str,
+                            requested_date, model: Optional[ForecastModel]) -> Dict[str, Any]:
+    values, forecast = forecast_weather(weather, float(latitude), float(longitude), requested_date, model)
+    temperature = round(values["temperature"], 1)
+    humidity = round(values["humidity"], 1)
+    precipitation = round(values["precipitation"], 1)
+    wind_speed = round(values["windSpeed"], 1)
+    condition = str(forecast_conditions(temperature, precipitation, wind_speed)[0])
+    
+    risk_level = risk_level_of(temperature, precipitation, wind_speed)
+    
+    address = Address(
+        city="Unknown",
+        state="",
+        country="USA",
+        countryCode="US"
+    )
+    
+    recommendations = generate_recommendations(condition, risk_level)
+    risk_analysis = RiskAnalysis(**analyze_risk(temperature, precipitation, wind_speed))
+    hourly_forecast = derive_hourly_forecast(float(latitude), float(longitude), requested_date, temperature)
+    
+    return {
+        "city": "Unknown",
+        "country": "USA",
+        "latitude": latitude,
+        "longitude": longitude,
+        "address": address.dict(),
+        "date": date,
+        "eventType": "outdoor",
+        "temperature": temperature,
+        "humidity": humidity,
+        "windSpeed": wind_speed,
+        "precipitation": precipitation,
+        "conditions": condition,
+        "riskLevel": risk_level,
+        "recommendations": recommendations.dict(),
+        "riskAnalysis": risk_analysis.dict(),
+        "hourlyForecast": hourly_forecast,
+        "forecast": forecast
+    }
+
+# Encoded response for one /api/weather point: the record for the requested
+# date at the closest station, or a blend of the k closest stations' records;
+# dates with no record within DATE_FALLBACK_DAYS inside a station's recorded
+# range are forecast
+def render_weather_point(weather: WeatherDataVersion, latitude: float, longitude: float, date: str,
+                         requested_date, mode: str, k: int, model: Optional[ForecastModel]) -> bytes:
+    closest_data = None
+    
+    if weather.index.station_count and mode == "idw":
+        values, rows, distances, weights = interpolate_idw(
+            weather.store, weather.index, latitude, longitude, requested_date, k, DATE_FALLBACK_DAYS,
+            within_range=True
+        )
+        if weights[0].any():
+            closest_data = build_interpolated_response(
+                weather.store, float(latitude), float(longitude), requested_date,
+                {name: float(column[0]) for name, column in values.items()}, rows[0], distances[0], weights[0]
+            )
+    elif weather.index.station_count:
+        # The raster answers points inside it with two array lookups
+        closest_index = None
+        if weather.grid is not None:
+            closest_index = weather.grid.locate(latitude, longitude, requested_date, DATE_FALLBACK_DAYS, within_range=True)
+        if closest_index is None:
+            closest_index, _, _ = weather.index.locate(latitude, longitude, requested_date, DATE_FALLBACK_DAYS, within_range=True)
+        if closest_index >= 0:
+            return encode_weather_record(weather, closest_index)
+    
+    if not closest_data:
+        # Forecast the point's weather if no record was found
+        closest_data = build_forecast_response(weather, latitude, longitude, date, requested_date, model)
+    
+    return dumps(closest_data)
+
+# Calendar dates are accepted only as YYYY-MM-DD strings; np.datetime64
+# alone would also take integers (days since 1970) and bare years
+DATE_PATTERN = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+def parse_date(value: Any):
+    if not isinstance(value, str) or not DATE_PATTERN.fullmatch(value):
+        raise ValueError("Invalid date, expected YYYY-MM-DD")
+    return np.datetime64(value, "D")
+
 # Main weather endpoint
 @app.post("/api/weather")
-async def get_weather_data(request: dict):
+async def get_weather_data(request: dict, weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
     latitude = request.get("latitude")
     longitude = request.get("longitude")
     date = request.get("date")
@@ -450,79 +746,352 @@ async def get_weather_data(request: dict):
     if not all([latitude, longitude, date]):
         raise HTTPException(status_code=400, detail="Missing required parameters")
     
-    # Find closest weather data
-    closest_data = None
-    min_distance = float('inf')
+    try:
+        requested_date = parse_date(date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    mode, k = parse_interpolation(request.get("mode"), request.get("k"))
     
-    for data in weather_data_store:
-        distance = ((data["latitude"] - latitude)**2 + (data["longitude"] - longitude)**2)**0.5
-        if distance < min_distance:
-            min_distance = distance
-            closest_data = data
+    # Forecasts of this request all come from the model current now
+    model = forecast_builder.model
+    if weather_response_cache is None:
+        return JSONBytesResponse(render_weather_point(weather, latitude, longitude, date, requested_date, mode, k, model))
     
-    if not closest_data:
-        # Generate new weather data if none found
-        temperature = random.uniform(-10, 40)
-        humidity = random.uniform(20, 100)
-        precipitation = random.uniform(0, 100)
-        wind_speed = random.uniform(0, 50)
-        condition = random.choice(["Sunny", "Cloudy", "Rainy", "Stormy", "Partly Cloudy"])
-        
-        if precipitation > 70 or wind_speed > 30 or temperature > 35 or temperature < -5:
-            risk_level = "Critical"
-        elif precipitation > 50 or wind_speed > 20 or temperature > 30 or temperature < 0:
-            risk_level = "High"
-        elif precipitation > 30 or wind_speed > 15 or temperature > 25 or temperature < 5:
-            risk_level = "Medium"
-        else:
-            risk_level = "Low"
-        
-        address = Address(
-            city="Unknown",
-            state="",
-            country="USA",
-            countryCode="US"
+    # Every point of a geohash cell shares the response computed for the
+    # cell centre. The source in the key retires entries computed from a
+    # replaced CSV or before a risk reclassification, the row count those
+    # from before appends, and the forecast state those forecast by an
+    # older model or by the latitude prior before the first fit.
+    geohash, cell_latitude, cell_longitude = geohash_cell(float(latitude), float(longitude), WEATHER_CACHE_GEOHASH_PRECISION)
+    forecast_state = model.rows if model is not None else "prior"
+    key = f"{weather.source}:{len(weather.store)}:{forecast_state}:{geohash}:{requested_date}:{mode}:{k if mode == 'idw' else ''}"
+    return JSONBytesResponse(await weather_response_cache.get_or_compute(
+        key, lambda: render_weather_point(
+            weather, cell_latitude, cell_longitude, str(requested_date), requested_date, mode, k, model
         )
-        
-        recommendations = generate_recommendations(condition, risk_level)
-        risk_analysis = RiskAnalysis(
-            precipitationRisk={"level": "Medium", "description": "Moderate precipitation risk"},
-            windImpact={"level": "Low", "description": "Minimal wind impact expected"},
-            temperatureComfort={"level": "Medium", "description": "Moderate temperature conditions"}
+    ))
+
+# Parse one (latitude, longitude, date) point of a batch request
+def parse_weather_point(point: Any):
+    if not isinstance(point, dict):
+        raise ValueError("Invalid point, expected an object with latitude, longitude and date")
+    try:
+        latitude = float(point["latitude"])
+        longitude = float(point["longitude"])
+        date = parse_date(point["date"])
+    except KeyError as e:
+        raise ValueError(f"Missing required parameter {e.args[0]}")
+    except (TypeError, ValueError):
+        raise ValueError("Invalid point, expected numeric latitude/longitude and a YYYY-MM-DD date")
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        raise ValueError("Latitude or longitude out of range")
+    return latitude, longitude, date
+
+# Batch weather endpoint: many points resolved in one vectorized lookup;
+# points without a usable record are forecast as by /api/weather
+@app.post("/api/weather/batch")
+async def get_weather_batch(request: WeatherBatchRequest, weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
+    if len(request.points) > WEATHER_BATCH_MAX_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {WEATHER_BATCH_MAX_POINTS} points per request")
+    mode, k = parse_interpolation(request.mode, request.k)
+    
+    results: List[Dict[str, Any]] = [{"index": position} for position in range(len(request.points))]
+    # Encoded data of each resolved point, spliced into its result at the end
+    data: Dict[int, bytes] = {}
+    valid, latitudes, longitudes, dates = [], [], [], []
+    for position, point in enumerate(request.points):
+        try:
+            latitude, longitude, date = parse_weather_point(point)
+        except ValueError as e:
+            results[position]["error"] = str(e)
+            continue
+        valid.append(position)
+        latitudes.append(latitude)
+        longitudes.append(longitude)
+        dates.append(date)
+    
+    # Items of valid points with no record to serve
+    unresolved = list(range(len(valid)))
+    if valid and weather.index.station_count and mode == "idw":
+        values, rows, distances, weights = interpolate_idw(
+            weather.store, weather.index, latitudes, longitudes, dates, k, DATE_FALLBACK_DAYS,
+            within_range=True
         )
-        hourly_forecast = generate_hourly_forecast(date, temperature)
-        
-        closest_data = {
-            "city": "Unknown",
-            "country": "USA",
-            "latitude": latitude,
-            "longitude": longitude,
-            "address": address.dict(),
+        unresolved = []
+        for item, position in enumerate(valid):
+            if not weights[item].any():
+                unresolved.append(item)
+                continue
+            data[position] = dumps(build_interpolated_response(
+                weather.store, latitudes[item], longitudes[item], dates[item],
+                {name: float(column[item]) for name, column in values.items()},
+                rows[item], distances[item], weights[item]
+            ))
+    elif valid and weather.index.station_count:
+        rows, distances, gaps = weather.index.locate_many(
+            latitudes, longitudes, dates, DATE_FALLBACK_DAYS, within_range=True
+        )
+        unresolved = []
+        for item, (position, row, distance, gap) in enumerate(zip(valid, rows.tolist(), distances.tolist(), gaps.tolist())):
+            if row < 0:
+                unresolved.append(item)
+                continue
+            results[position]["distanceKm"] = round(distance, 3)
+            results[position]["dateGapDays"] = gap
+            data[position] = encode_weather_record(weather, row)
+    
+    model = forecast_builder.model
+    for item in unresolved:
+        data[valid[item]] = dumps(build_forecast_response(
+            weather, latitudes[item], longitudes[item], str(dates[item]), dates[item], model
+        ))
+    
+    items = [
+        embed(result, "data", data[position]) if position in data else dumps(result)
+        for position, result in enumerate(results)
+    ]
+    return JSONBytesResponse(embed(
+        {"count": len(results), "errors": sum("error" in result for result in results)},
+        "results", json_array(items)
+    ))
+
+# Parse an optional YYYY-MM-DD query parameter
+def parse_query_date(value: Optional[str], name: str):
+    if value is None:
+        return None
+    try:
+        return parse_date(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid {name}, expected YYYY-MM-DD")
+
+# Area weather endpoint: every record within a radius or bounding box
+@app.get("/api/weather/area")
+async def get_weather_area(
+    latitude: Optional[float] = Query(None, ge=-90, le=90),
+    longitude: Optional[float] = Query(None, ge=-180, le=180),
+    radiusKm: Optional[float] = Query(None, gt=0, description="Radius around latitude/longitude"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    date: Optional[str] = Query(None, description="Single date (YYYY-MM-DD)"),
+    startDate: Optional[str] = Query(None, description="First date (YYYY-MM-DD)"),
+    endDate: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)"),
+    riskLevel: Optional[str] = Query(None, description="Comma-separated risk levels"),
+    conditions: Optional[str] = Query(None, description="Comma-separated conditions"),
+    limit: int = Query(100, ge=1),
+    cursor: Optional[str] = Query(None, description="nextCursor of the previous page"),
+    weather: WeatherDataVersion = Depends(weather_manager.require_ready)
+):
+    if bbox is not None:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid bbox, expected minLon,minLat,maxLon,maxLat")
+        stations = weather.index.stations_in_bbox(min_lat, min_lon, max_lat, max_lon)
+    elif None not in (latitude, longitude, radiusKm):
+        stations = weather.index.stations_within(latitude, longitude, radiusKm)
+    else:
+        raise HTTPException(status_code=400, detail="Provide latitude, longitude and radiusKm, or bbox")
+    
+    start = parse_query_date(startDate or date, "startDate")
+    end = parse_query_date(endDate or date, "endDate")
+    filters = {
+        name: [value.strip() for value in values.split(",") if value.strip()]
+        for name, values in (("riskLevel", riskLevel), ("conditions", conditions)) if values
+    }
+    
+    try:
+        rows, next_cursor = query_area(
+            weather.store, weather.index, stations, start, end, filters,
+            cursor=cursor, limit=min(limit, WEATHER_AREA_MAX_RESULTS)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    results = [weather.store.row(row) for row in rows.tolist()]
+    if bbox is None and len(rows):
+        distances = haversine_km(
+            latitude, longitude, weather.store.floats["latitude"][rows], weather.store.floats["longitude"][rows]
+        )
+        for result, distance in zip(results, distances.tolist()):
+            result["distanceKm"] = round(distance, 3)
+    
+    return JSONBytesResponse({
+        "results": results,
+        "count": len(results),
+        "stations": len(stations),
+        "nextCursor": next_cursor
+    })
+
+# Query endpoint: records matching categorical filters and a date range,
+# ranked by a score (e.g. the riskiest days in a state next week)
+@app.get("/api/weather/query")
+async def query_weather(
+    conditions: Optional[str] = Query(None, description="Comma-separated conditions"),
+    riskLevel: Optional[str] = Query(None, description="Comma-separated risk levels"),
+    eventType: Optional[str] = Query(None, description="Comma-separated event types"),
+    country: Optional[str] = Query(None, description="Comma-separated countries"),
+    state: Optional[str] = Query(None, description="Comma-separated states (address.state)"),
+    startDate: Optional[str] = Query(None, description="First date (YYYY-MM-DD)"),
+    endDate: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)"),
+    score: str = Query("riskScore", description=f"One of {', '.join(QUERY_SCORES)}"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    limit: int = Query(20, ge=1),
+    weather: WeatherDataVersion = Depends(weather_manager.require_ready)
+):
+    if score not in QUERY_SCORES:
+        raise HTTPException(status_code=400, detail=f"Unknown score {score}, expected one of {QUERY_SCORES}")
+    start = parse_query_date(startDate, "startDate")
+    end = parse_query_date(endDate, "endDate")
+    filters = {
+        name: [value.strip() for value in values.split(",") if value.strip()]
+        for name, values in (
+            ("conditions", conditions), ("riskLevel", riskLevel), ("eventType", eventType),
+            ("country", country), ("state", state)
+        ) if values
+    }
+    
+    index = bitmap_indexer.for_version(weather)
+    rows = index.select(weather.store, filters, start, end)
+    top_rows, scores = index.top(weather.store, rows, score, min(limit, WEATHER_QUERY_MAX_RESULTS), order == "desc")
+    
+    results = [weather.store.row(row) for row in top_rows.tolist()]
+    for result, value in zip(results, scores.tolist()):
+        result["score"] = value
+    return JSONBytesResponse({
+        "results": results,
+        "count": len(results),
+        "matches": len(rows),
+        "score": score,
+        "order": order
+    })
+
+# Empirical probabilities of bad weather around a date's day of year at the
+# station nearest a point, over every year in the store (None without data)
+def weather_probabilities(weather: WeatherDataVersion, latitude: float, longitude: float, date,
+                          window_days: int = DEFAULT_WINDOW_DAYS) -> Optional[Dict[str, Any]]:
+    if not weather.index.station_count:
+        return None
+    stations, distances = weather.index.nearest(latitude, longitude)
+    station = int(stations[0])
+    key = (station, len(weather.index.rows_of_station(station)), int(day_of_year(date)), window_days)
+    result = probability_cache.get(key)
+    if result is None:
+        result = station_probabilities(weather.store, weather.index, station, date, window_days)
+        if result is None:
+            return None
+        probability_cache.put(key, result)
+    return {
+        "station": {
+            "latitude": float(weather.index.station_latitudes[station]),
+            "longitude": float(weather.index.station_longitudes[station]),
+            "distanceKm": round(float(distances[0]), 3)
+        },
+        **result
+    }
+
+# Probability endpoint: "will it rain on my date?"
+@app.get("/api/weather/probability")
+async def get_weather_probability(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    date: str = Query(..., description="Date (YYYY-MM-DD)"),
+    windowDays: int = Query(DEFAULT_WINDOW_DAYS, ge=0, le=MAX_WINDOW_DAYS, description="Days either side of the date"),
+    weather: WeatherDataVersion = Depends(weather_manager.require_ready)
+):
+    requested_date = parse_query_date(date, "date")
+    probabilities = weather_probabilities(weather, latitude, longitude, requested_date, windowDays)
+    if probabilities is None:
+        raise HTTPException(status_code=404, detail="No weather records near this time of year at the closest station")
+    return JSONBytesResponse({"date": str(requested_date), **probabilities})
+
+# Best-date finder: every day of a range ranked by the event type's
+# weighted expected severity of bad weather at the nearest station
+@app.post("/api/weather/best-dates")
+async def find_best_dates(request: BestDatesRequest, weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
+    start = parse_query_date(request.startDate, "startDate")
+    end = parse_query_date(request.endDate, "endDate")
+    if end < start:
+        raise HTTPException(status_code=400, detail="endDate must not be before startDate")
+    if (end - start).astype(int) >= WEATHER_BEST_DATES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Date range exceeds {WEATHER_BEST_DATES_MAX_DAYS} days")
+    try:
+        weights = event_weights(request.eventType, request.weights)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not weather.index.station_count:
+        raise HTTPException(status_code=404, detail="No weather records available")
+    
+    stations, distances = weather.index.nearest(request.latitude, request.longitude)
+    station = int(stations[0])
+    rows = weather.index.rows_of_station(station)
+    key = (station, len(rows), request.windowDays)
+    seasonal = severity_cache.get(key)
+    if seasonal is None:
+        seasonal = seasonal_severity(weather.store, rows, request.windowDays)
+        severity_cache.put(key, seasonal)
+    severity, bad_weather, counts = seasonal
+    
+    dates = np.arange(start, end + 1)
+    chosen, scores = rank_dates(severity, counts, dates, weights, request.topK)
+    days = day_of_year(dates[chosen])
+    events = [event for event, _, _, _ in EXCEEDANCE_EVENTS]
+    best = [
+        {
             "date": date,
-            "eventType": "outdoor",
-            "temperature": temperature,
-            "humidity": humidity,
-            "windSpeed": wind_speed,
-            "precipitation": precipitation,
-            "conditions": condition,
-            "riskLevel": risk_level,
-            "recommendations": recommendations.dict(),
-            "riskAnalysis": risk_analysis.dict(),
-            "hourlyForecast": [hour.dict() for hour in hourly_forecast]
+            "score": round(score, 3),
+            "badWeatherChance": round(chance, 4),
+            "expectedSeverity": dict(zip(events, (round(value, 3) for value in expected))),
+            "samples": samples
         }
-    
-    return closest_data
+        for date, score, chance, expected, samples in zip(
+            np.datetime_as_string(dates[chosen]).tolist(), scores[chosen].tolist(),
+            bad_weather[days].tolist(), severity[:, days].T.tolist(), counts[days].tolist()
+        )
+    ]
+    return JSONBytesResponse({
+        "station": {
+            "latitude": float(weather.index.station_latitudes[station]),
+            "longitude": float(weather.index.station_longitudes[station]),
+            "distanceKm": round(float(distances[0]), 3)
+        },
+        "eventType": request.eventType,
+        "weights": weights,
+        "windowDays": request.windowDays,
+        "candidates": len(dates),
+        "bestDates": best
+    })
 
 # AI Prediction endpoint
 @app.post("/api/weather/ai-prediction")
-async def get_ai_prediction(request: AIPredictionRequest):
+async def get_ai_prediction(request: AIPredictionRequest, weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
+    try:
+        requested_date = parse_date(request.date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    
+    # The overall risk and its confidence are the empirical odds of bad
+    # weather around this time of year at the nearest station; without
+    # records there, the current conditions are scored with no confidence
+    probabilities = weather_probabilities(weather, request.latitude, request.longitude, requested_date)
+    if probabilities is not None:
+        overall_risk, confidence = probabilities["overallRisk"], probabilities["confidence"]
+    else:
+        conditions = request.currentConditions
+        try:
+            overall_risk = scored_risk_level(
+                float(conditions["temperature"]), float(conditions["humidity"]),
+                float(conditions["windSpeed"]), float(conditions["precipitation"])
+            )
+        except (KeyError, TypeError, ValueError):
+            overall_risk = RISK_LEVELS[0]
+        confidence = 0.0
+    
     # Mock AI prediction using Z-AI SDK structure
     try:
         # In production, this would use the actual Z-AI SDK
         prediction = {
             "prediction": {
-                "overallRisk": random.choice(["Low", "Medium", "High", "Critical"]),
-                "confidence": round(random.uniform(0.7, 0.95), 2),
+                "overallRisk": overall_risk,
+                "confidence": confidence,
                 "keyFactors": [
                     f"Temperature: {request.currentConditions.get('temperature', 'N/A')}°C",
                     f"Humidity: {request.currentConditions.get('humidity', 'N/A')}%",
@@ -542,10 +1111,11 @@ async def get_ai_prediction(request: AIPredictionRequest):
                     "sports": "Monitor player safety conditions"
                 }.get(request.eventType, "Monitor conditions and plan accordingly")
             },
+            "probabilities": probabilities,
             "timestamp": datetime.now().isoformat(),
             "modelVersion": "z-ai-weather-v1.0"
         }
-        return prediction
+        return JSONBytesResponse(prediction)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI prediction error: {str(e)}")
 
@@ -576,35 +1146,57 @@ async def get_satellite_imagery(request: SatelliteImageryRequest):
             "temperatureAnomalies": round(random.uniform(-5, 5), 1)
         }
     }
-    return imagery_data
+    return JSONBytesResponse(imagery_data)
+
+# Climatology sections of a patterns response for the station nearest a
+# point, or None while no climatology covers it yet
+def describe_climatology(weather: WeatherDataVersion, latitude: float, longitude: float, date) -> Optional[Dict[str, Any]]:
+    climatology = climatology_builder.climatology
+    if not weather.index.station_count or climatology is None:
+        return None
+    stations, distances = weather.index.nearest(latitude, longitude)
+    station = int(stations[0])
+    if station >= climatology.station_count:
+        return None
+    described = climatology.describe(station, date)
+    described["station"].update({
+        "longitude": float(weather.index.station_longitudes[station]),
+        "distanceKm": round(float(distances[0]), 3)
+    })
+    return described
+
+patterns_service.climatology_source = lambda latitude, longitude, date: describe_climatology(
+    weather_manager.current, latitude, longitude, date
+)
 
 # Weather patterns endpoint
 @app.post("/api/weather/patterns")
-async def get_weather_patterns(request: WeatherPatternsRequest):
-    # Mock weather patterns analysis
+async def get_weather_patterns(request: WeatherPatternsRequest, weather: WeatherDataVersion = Depends(weather_manager.require_ready)):
+    if not weather.index.station_count:
+        raise HTTPException(status_code=404, detail="No weather stations available")
+    try:
+        requested_date = parse_date(request.date)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid date, expected YYYY-MM-DD")
+    
+    # Statistics come from the per-station climatology built in the
+    # background after each publish; until it covers the nearest station,
+    # wait for the build in progress
+    described = describe_climatology(weather, request.latitude, request.longitude, requested_date)
+    if described is None:
+        stations, _ = weather.index.nearest(request.latitude, request.longitude)
+        if await asyncio.to_thread(climatology_builder.covering, int(stations[0])) is not None:
+            described = describe_climatology(weather, request.latitude, request.longitude, requested_date)
+    if described is None:
+        raise HTTPException(status_code=503, detail="Climatology is not available yet", headers={"Retry-After": "5"})
+    
     patterns_data = {
         "patternType": request.patternType,
         "location": {"latitude": request.latitude, "longitude": request.longitude},
         "date": request.date,
-        "historicalPatterns": {
-            "temperatureTrend": random.choice(["Warming", "Cooling", "Stable"]),
-            "precipitationTrend": random.choice(["Increasing", "Decreasing", "Stable"]),
-            "windPattern": random.choice(["Cyclonic", "Anticyclonic", "Variable"])
-        },
-        "seasonalPatterns": {
-            "typicalWeather": random.choice(["Sunny and Dry", "Mixed Conditions", "Rainy Season", "Storm Season"]),
-            "extremesLikelihood": round(random.uniform(0, 100), 1),
-            "optimalPeriods": ["Spring", "Fall"] if random.random() > 0.5 else ["Summer", "Winter"]
-        },
-        "predictions": {
-            "next7Days": {
-                "temperatureChange": round(random.uniform(-10, 10), 1),
-                "precipitationProbability": round(random.uniform(0, 100), 1),
-                "dominantWeather": random.choice(["Sunny", "Cloudy", "Rainy", "Stormy"])
-            }
-        }
+        **described
     }
-    return patterns_data
+    return JSONBytesResponse(patterns_data)
 
 # User profile endpoints
 @app.get("/api/user/profile")
@@ -721,32 +1313,64 @@ async def delete_weather_alert(alert_id: str):
 # Weather history endpoint
 @app.get("/api/weather/history")
 async def get_weather_history(
-    latitude: float = Query(...),
-    longitude: float = Query(...),
-    days: int = Query(30, ge=1, le=365)
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    days: int = Query(30, ge=1, le=365),
+    startDate: Optional[str] = Query(None, description="First date (YYYY-MM-DD)"),
+    endDate: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)"),
+    rollup: Optional[str] = Query(None, pattern="^(daily|weekly|monthly)$"),
+    percentiles: Optional[str] = Query(None, description="Comma-separated rollup percentiles (default 10,50,90)"),
+    weather: WeatherDataVersion = Depends(weather_manager.require_ready)
 ):
-    # Mock weather history
-    history_data = []
-    base_date = datetime.now() - timedelta(days=days)
-    
-    for i in range(days):
-        date = (base_date + timedelta(days=i)).strftime("%Y-%m-%d")
-        temperature = random.uniform(-10, 40)
-        humidity = random.uniform(20, 100)
-        precipitation = random.uniform(0, 100)
-        wind_speed = random.uniform(0, 50)
-        condition = random.choice(["Sunny", "Cloudy", "Rainy", "Stormy", "Partly Cloudy"])
-        
-        history_data.append({
-            "date": date,
-            "temperature": temperature,
-            "humidity": humidity,
-            "precipitation": precipitation,
-            "windSpeed": wind_speed,
-            "conditions": condition
-        })
+    if not weather.index.station_count:
+        raise HTTPException(status_code=404, detail="No weather stations available")
+    
+    quantiles = DEFAULT_PERCENTILES
+    if percentiles:
+        try:
+            quantiles = tuple(float(value) for value in percentiles.split(",") if value.strip())
+        except ValueError:
+            quantiles = ()
+        if not quantiles or len(quantiles) > 10 or not all(0 <= value <= 100 for value in quantiles):
+            raise HTTPException(status_code=400, detail="Invalid percentiles, expected up to 10 values in 0-100")
     
-    return {"history": history_data}
+    # The nearest station's own series, sliced by date: either the given
+    # range or the `days` days ending at the station's latest record
+    stations, distances = weather.index.nearest(latitude, longitude)
+    station = int(stations[0])
+    station_rows = weather.index.rows_of_station(station)
+    start = parse_query_date(startDate, "startDate")
+    end = parse_query_date(endDate, "endDate")
+    if end is None:
+        end = start + (days - 1) if start is not None else weather.store.dates[station_rows[-1]]
+    if start is None:
+        start = end - (days - 1)
+    
+    if rollup is None:
+        rows = station_series(weather.index, station, start, end)
+        history = [dict(zip(HISTORY_FIELDS, values)) for values in weather.store.export_rows(rows, HISTORY_FIELDS)]
+    else:
+        # A station's record count only changes when rows are appended to it,
+        # so it retires that station's cached rollups
+        key = (station, len(station_rows), str(start), str(end), rollup, quantiles)
+        history = history_rollup_cache.get(key)
+        if history is None:
+            history = weather_rollup(weather.store, station_series(weather.index, station, start, end), rollup, quantiles)
+            history_rollup_cache.put(key, history)
+    
+    first_row = int(station_rows[0])
+    return JSONBytesResponse({
+        "station": {
+            "city": weather.store.decode("city", weather.store.codes["city"][first_row:first_row + 1])[0],
+            "latitude": float(weather.index.station_latitudes[station]),
+            "longitude": float(weather.index.station_longitudes[station]),
+            "distanceKm": round(float(distances[0]), 3)
+        },
+        "startDate": str(start),
+        "endDate": str(end),
+        "rollup": rollup,
+        "history": history
+    })
 
 # Chat endpoint
 @app.post("/api/chat")
@@ -762,41 +1386,70 @@ async def chat_with_ai(message: ChatMessage):
                 "Analyze weather patterns and risks"
             ]
         }
-        return ai_response
+        return JSONBytesResponse(ai_response)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
 # Data export endpoints
 @app.get("/api/export/weather-data")
-async def export_weather_data(format: str = Query("csv", regex="^(csv|json)$")):
-    if format == "csv":
-        # Create CSV content
-        output = io.StringIO()
-        writer = csv.writer(output)
-        
-        # Write header
-        writer.writerow([
-            "city", "country", "latitude", "longitude", "date", "eventType",
-            "temperature", "humidity", "windSpeed", "precipitation", "conditions", "riskLevel"
-        ])
-        
-        # Write data
-        for data in weather_data_store:
-            writer.writerow([
-                data["city"], data["country"], data["latitude"], data["longitude"],
-                data["date"], data["eventType"], data["temperature"], data["humidity"],
-                data["windSpeed"], data["precipitation"], data["conditions"], data["riskLevel"]
-            ])
-        
-        output.seek(0)
-        return StreamingResponse(
-            io.StringIO(output.getvalue()),
-            media_type="text/csv",
-            headers={"Content-Disposition": "attachment; filename=weather_data.csv"}
+async def export_weather_data(
+    format: str = Query("csv", pattern="^(csv|json|ndjson|arrow|parquet)$"),
+    city: Optional[str] = Query(None, description="Comma-separated cities"),
+    bbox: Optional[str] = Query(None, description="minLon,minLat,maxLon,maxLat"),
+    startDate: Optional[str] = Query(None, description="First date (YYYY-MM-DD)"),
+    endDate: Optional[str] = Query(None, description="Last date (YYYY-MM-DD)"),
+    riskLevel: Optional[str] = Query(None, description="Comma-separated risk levels"),
+    columns: Optional[str] = Query(None, description="Comma-separated columns (flat formats only)"),
+    accept_encoding: Optional[str] = Header(None),
+    weather: WeatherDataVersion = Depends(weather_manager.require_ready)
+):
+    names = EXPORT_COLUMNS
+    if columns:
+        names = [name.strip() for name in columns.split(",") if name.strip()]
+        unknown = [name for name in names if name not in EXPORTABLE_COLUMNS]
+        if unknown or not names:
+            raise HTTPException(status_code=400, detail=f"Unknown columns {unknown}, expected some of {EXPORTABLE_COLUMNS}")
+    
+    bounds = None
+    if bbox is not None:
+        try:
+            min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(","))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid bbox, expected minLon,minLat,maxLon,maxLat")
+        bounds = (min_lat, min_lon, max_lat, max_lon)
+    
+    # Filters run on the columns of the version pinned for this request, so
+    # only matching rows are ever serialized
+    indices = select_rows(
+        weather.store,
+        cities=[value.strip() for value in city.split(",") if value.strip()] if city else None,
+        bbox=bounds,
+        start=parse_query_date(startDate, "startDate"),
+        end=parse_query_date(endDate, "endDate"),
+        risk_levels=[value.strip() for value in riskLevel.split(",") if value.strip()] if riskLevel else None
+    )
+    
+    if format == "json":
+        # Nested records are built in a worker thread while reloads publish
+        # newer versions
+        rows = range(len(weather.store)) if indices is None else indices.tolist()
+        content = await asyncio.to_thread(
+            lambda: dumps({"weather_data": [build_weather_response(weather, index, cache=False) for index in rows]})
         )
-    else:
-        # Return JSON
-        return JSONResponse(content={"weather_data": weather_data_store})
+        return JSONBytesResponse(content)
+    
+    # Flat formats are rendered (and text formats gzipped if the client
+    # accepts it) chunk by chunk as the response is sent
+    try:
+        chunks = EXPORT_WRITERS[format](weather.store, indices, names)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f"attachment; filename=weather_data.{extension}", "Vary": "Accept-Encoding"}
+    if format in ("csv", "ndjson") and accepts_gzip(accept_encoding):
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type=media_type, headers=headers)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,170 @@
+import math
+import numpy as np
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from climatology import DAYS_OF_YEAR, circular_window_sum, day_of_year
+from risk_engine import EVENT_RISK_WEIGHTS, RISK_LEVELS, RISK_LEVEL_RULES, classify_risk_levels
+from spatial_index import SpatialIndex
+from weather_store import WeatherStore
+
+# Days on each side of the requested day of year that count as the same
+# time of year
+DEFAULT_WINDOW_DAYS = 7
+MAX_WINDOW_DAYS = 45
+
+# Exceedance events as (event, measurement, direction, position of the
+# limit in a RISK_LEVEL_RULES row); each event is evaluated at the limit
+# of every risk level above Low
+EXCEEDANCE_EVENTS = [
+    ("precipitation", "precipitation", "above", 1),
+    ("wind", "windSpeed", "above", 2),
+    ("heat", "temperature", "above", 3),
+    ("cold", "temperature", "below", 4),
+]
+EXCEEDANCE_THRESHOLDS = {
+    event: {rule[0]: rule[position] for rule in reversed(RISK_LEVEL_RULES)}
+    for event, _, _, position in EXCEEDANCE_EVENTS
+}
+
+# Risk level from which a record counts as bad weather when ranking dates
+BAD_WEATHER_LEVEL = RISK_LEVELS.index("High")
+
+# z-score of the Wilson interval whose lower bound is reported as the
+# confidence, so estimates from few records count for less
+CONFIDENCE_Z = 1.96
+
+
+def window_rows(index: SpatialIndex, store: WeatherStore, station: int, day: int,
+                window_days: int = DEFAULT_WINDOW_DAYS) -> np.ndarray:
+    """Rows of a station's records within ``window_days`` of a day of year,
+    in any year (the window wraps around the year end)"""
+    rows = index.rows_of_station(station)
+    gaps = np.abs(day_of_year(store.dates[rows]) - day)
+    return rows[np.minimum(gaps, DAYS_OF_YEAR - gaps) <= window_days]
+
+
+def wilson_lower_bound(probability: float, samples: int, z: float = CONFIDENCE_Z) -> float:
+    """Lower bound of the Wilson score interval of a proportion"""
+    if samples == 0:
+        return 0.0
+    spread = z * math.sqrt(probability * (1 - probability) / samples + z * z / (4 * samples * samples))
+    return (probability + z * z / (2 * samples) - spread) / (1 + z * z / samples)
+
+
+def exceedance_probabilities(store: WeatherStore, rows: np.ndarray) -> Dict[str, Any]:
+    """Exceedance and risk level probabilities of a set of records.
+
+    Every event is compared against all of its thresholds at once, and the
+    risk level of every record is classified in one pass. The overall risk
+    is the median risk level (the highest level at least half the records
+    reach); its confidence is the Wilson lower bound of the share of records
+    at exactly that level.
+    """
+    samples = len(rows)
+    values = {name: store.floats[name][rows] for name in ("temperature", "precipitation", "windSpeed")}
+
+    probabilities = {}
+    for event, measurement, direction, _ in EXCEEDANCE_EVENTS:
+        thresholds = EXCEEDANCE_THRESHOLDS[event]
+        limits = np.fromiter(thresholds.values(), dtype=np.float64)
+        column = values[measurement][:, np.newaxis]
+        exceeded = column > limits if direction == "above" else column < limits
+        shares = exceeded.mean(axis=0) if samples else np.zeros(len(limits))
+        probabilities[event] = {level: round(float(share), 4) for level, share in zip(thresholds, shares)}
+
+    levels = classify_risk_levels(values["temperature"], values["precipitation"], values["windSpeed"])
+    distribution = np.bincount(levels, minlength=len(RISK_LEVELS)) / samples if samples else np.zeros(len(RISK_LEVELS))
+    at_least = np.cumsum(distribution[::-1])[::-1]
+    median = int(np.flatnonzero(at_least >= 0.5).max()) if samples else 0
+    return {
+        "samples": samples,
+        "years": int(len(np.unique(store.dates[rows].astype("datetime64[Y]")))),
+        "thresholds": EXCEEDANCE_THRESHOLDS,
+        "exceedance": probabilities,
+        "riskLevels": {level: round(float(share), 4) for level, share in zip(RISK_LEVELS, distribution)},
+        "atLeast": {level: round(float(share), 4) for level, share in zip(RISK_LEVELS, at_least)},
+        "overallRisk": RISK_LEVELS[median],
+        "confidence": round(wilson_lower_bound(float(distribution[median]), samples), 2),
+    }
+
+
+def station_probabilities(store: WeatherStore, index: SpatialIndex, station: int, date,
+                          window_days: int = DEFAULT_WINDOW_DAYS) -> Optional[Dict[str, Any]]:
+    """Probabilities for a station around a date's day of year across all
+    years in the store, or None when it has no records in the window"""
+    day = int(day_of_year(np.datetime64(date, "D")))
+    rows = window_rows(index, store, station, day, window_days)
+    if not len(rows):
+        return None
+    result = exceedance_probabilities(store, rows)
+    result.update({"dayOfYear": day + 1, "windowDays": window_days})
+    return result
+
+
+def seasonal_severity(store: WeatherStore, rows: np.ndarray,
+                      window_days: int = DEFAULT_WINDOW_DAYS) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Expected severity of every exceedance event on every day of year.
+
+    The severity of an event in one record is the number of risk level
+    limits it exceeds (0 to 3), so its mean over the records within
+    ``window_days`` of a day weighs rare extremes above common nuisances.
+    Returns ``(events x DAYS_OF_YEAR)`` mean severities, the share of
+    records at ``BAD_WEATHER_LEVEL`` or worse and the record count of each
+    day's window, all from one pass over the rows.
+    """
+    days = day_of_year(store.dates[rows])
+    totals = np.empty((len(EXCEEDANCE_EVENTS) + 2, DAYS_OF_YEAR))
+    for position, (event, measurement, direction, _) in enumerate(EXCEEDANCE_EVENTS):
+        limits = np.fromiter(EXCEEDANCE_THRESHOLDS[event].values(), dtype=np.float64)
+        column = store.floats[measurement][rows][:, np.newaxis]
+        exceeded = (column > limits) if direction == "above" else (column < limits)
+        totals[position] = np.bincount(days, weights=exceeded.sum(axis=1), minlength=DAYS_OF_YEAR)
+    levels = classify_risk_levels(store.floats["temperature"][rows], store.floats["precipitation"][rows],
+                                  store.floats["windSpeed"][rows])
+    totals[-2] = np.bincount(days, weights=levels >= BAD_WEATHER_LEVEL, minlength=DAYS_OF_YEAR)
+    totals[-1] = np.bincount(days, minlength=DAYS_OF_YEAR)
+    if window_days:
+        totals = circular_window_sum(totals, window_days)
+    counts = totals[-1]
+    shares = totals[:-1] / np.maximum(counts, 1)
+    return shares[:-1], shares[-1], counts.astype(np.int64)
+
+
+def rank_dates(severity: np.ndarray, counts: np.ndarray, dates: np.ndarray,
+               weights: Mapping[str, float], top_k: int):
+    """Score every candidate date at once and keep the ``top_k`` lowest.
+
+    A date's score is the weighted sum of the expected severities of its
+    day of year; dates whose window has no records are never ranked.
+    Returns the chosen positions into ``dates`` (best first) and the
+    scores of all dates.
+    """
+    days = day_of_year(dates)
+    vector = np.array([weights.get(event, 0.0) for event, _, _, _ in EXCEEDANCE_EVENTS])
+    scores = vector @ severity[:, days]
+    candidates = np.flatnonzero(counts[days] > 0)
+    if len(candidates) > top_k:
+        # Keep every date scoring at most the k-th best, so dates tying at
+        # the boundary are all ranked rather than an arbitrary subset
+        cutoff = scores[candidates][np.argpartition(scores[candidates], top_k - 1)[top_k - 1]]
+        candidates = candidates[scores[candidates] <= cutoff]
+    # Ties go to the earlier date
+    return candidates[np.lexsort((candidates, scores[candidates]))][:top_k], scores
+
+
+def event_weights(event_type: str, overrides: Optional[Mapping[str, float]] = None) -> Dict[str, float]:
+    """Exceedance event weights of an event type, with per-event overrides.
+
+    Raises ValueError for an unknown event type or event name, or a
+    negative weight.
+    """
+    if event_type not in EVENT_RISK_WEIGHTS:
+        raise ValueError(f"Unknown event type {event_type}, expected one of {list(EVENT_RISK_WEIGHTS)}")
+    weights = dict(EVENT_RISK_WEIGHTS[event_type])
+    for event, weight in (overrides or {}).items():
+        if event not in weights:
+            raise ValueError(f"Unknown weight {event}, expected some of {list(weights)}")
+        if weight < 0:
+            raise ValueError(f"Weight {event} must not be negative")
+        weights[event] = float(weight)
+    return weights
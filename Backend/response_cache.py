@@ -0,0 +1,258 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from lru_cache import LRUCache
+
+GEOHASH_ALPHABET = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+# Expired and surplus disk entries are purged once every this many writes
+DISK_TRIM_INTERVAL = 256
+
+
+def encode_geohash(latitude: float, longitude: float, precision: int) -> Tuple[str, Tuple[float, float, float, float]]:
+    """Geohash of a point and its cell as (min lat, min lon, max lat, max lon)"""
+    latitude_range = [-90.0, 90.0]
+    longitude_range = [-180.0, 180.0]
+    characters = []
+    bits = 0
+    value = 0
+    even = True
+    while len(characters) < precision:
+        bounds, coordinate = (longitude_range, longitude) if even else (latitude_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            characters.append(GEOHASH_ALPHABET[value])
+            bits = value = 0
+    return "".join(characters), (latitude_range[0], longitude_range[0], latitude_range[1], longitude_range[1])
+
+
+def geohash_cell(latitude: float, longitude: float, precision: int) -> Tuple[str, float, float]:
+    """Geohash of a point and the centre of its cell, which every point of
+    the cell is answered for"""
+    geohash, (min_latitude, min_longitude, max_latitude, max_longitude) = encode_geohash(latitude, longitude, precision)
+    return geohash, (min_latitude + max_latitude) / 2, (min_longitude + max_longitude) / 2
+
+
+class LatencyStats:
+    """Running count, mean and maximum of a timed operation"""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.maximum = max(self.maximum, seconds)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "meanMs": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "maxMs": round(self.maximum * 1000, 3),
+        }
+
+
+class SQLiteCache:
+    """Key/value tier in a SQLite file, so cached responses survive restarts.
+
+    Entries expire ``ttl_seconds`` after they are written (wall-clock time,
+    since the file outlives the process). When there are more than
+    ``max_entries``, the ones closest to expiry are evicted.
+    """
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int = 100_000):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_expires ON responses (expires)")
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[1] <= time.time():
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.expirations += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, value: Any):
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, time.time() + self.ttl_seconds)
+            )
+            self._writes += 1
+            if self._writes % DISK_TRIM_INTERVAL == 0:
+                self._trim()
+
+    def _trim(self):
+        self.expirations += self._connection.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+        surplus = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+        if surplus > 0:
+            self.evictions += self._connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY expires LIMIT ?)", (surplus,)
+            ).rowcount
+
+    def clear(self):
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "path": self.path,
+            "size": len(self),
+            "maxsize": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hitRatio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class ResponseCache:
+    """Two-tier cache of computed responses with miss coalescing.
+
+    Lookups try the in-process LRU first, then the optional SQLite tier
+    (read on a worker thread), and only then compute the value. Concurrent
+    misses for the same key wait for the first one instead of computing it
+    again. Values reach the disk tier through ``encode``/``decode``; a value
+    that cannot be encoded is only kept in memory.
+    """
+
+    def __init__(self, memory: LRUCache, disk: Optional[SQLiteCache] = None,
+                 encode: Callable[[Any], Any] = json.dumps, decode: Callable[[Any], Any] = json.loads):
+        self.memory = memory
+        self.disk = disk
+        self.encode = encode
+        self.decode = decode
+        self._pending: Dict[str, "asyncio.Future"] = {}
+        self.requests = 0
+        self.coalesced = 0
+        self.computed = 0
+        self.disk_errors = 0
+        self.latency = {"memory": LatencyStats(), "disk": LatencyStats(), "compute": LatencyStats()}
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Any]) -> Any:
+        self.requests += 1
+        start = time.perf_counter()
+        value = self.memory.get(key)
+        self.latency["memory"].record(time.perf_counter() - start)
+        if value is not None:
+            return value
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        computed = False
+        try:
+            if self.disk is not None:
+                value = await self._read_disk(key)
+            if value is None:
+                start = time.perf_counter()
+                value = compute()
+                self.latency["compute"].record(time.perf_counter() - start)
+                self.computed += 1
+                computed = True
+            self.memory.put(key, value)
+            future.set_result(value)
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()  # Waiters re-raise it; nothing else needs to see it
+            raise
+        finally:
+            del self._pending[key]
+            if not future.done():
+                future.cancel()
+
+        if computed and self.disk is not None:
+            await self._write_disk(key, value)
+        return value
+
+    async def _read_disk(self, key: str) -> Optional[Any]:
+        start = time.perf_counter()
+        try:
+            encoded = await asyncio.to_thread(self.disk.get, key)
+            return None if encoded is None else self.decode(encoded)
+        except (sqlite3.Error, TypeError, ValueError):
+            self.disk_errors += 1
+            return None
+        finally:
+            self.latency["disk"].record(time.perf_counter() - start)
+
+    async def _write_disk(self, key: str, value: Any):
+        try:
+            encoded = self.encode(value)
+        except (TypeError, ValueError):
+            return
+        try:
+            await asyncio.to_thread(self.disk.put, key, encoded)
+        except sqlite3.Error:
+            self.disk_errors += 1
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def close(self):
+        if self.disk is not None:
+            self.disk.close()
+
+    def stats(self) -> Dict[str, Any]:
+        memory = self.memory.stats()
+        disk = self.disk.stats() if self.disk is not None else None
+        hits = memory["hits"] + (disk["hits"] if disk else 0)
+        return {
+            "requests": self.requests,
+            "hitRatio": round(hits / self.requests, 4) if self.requests else 0.0,
+            "coalesced": self.coalesced,
+            "computed": self.computed,
+            "diskErrors": self.disk_errors,
+            "memory": memory,
+            "disk": disk,
+            "latency": {tier: stats.stats() for tier, stats in self.latency.items()},
+        }
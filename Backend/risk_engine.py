@@ -0,0 +1,219 @@
+import hashlib
+import numpy as np
+from typing import Dict, List, Optional, Sequence, Tuple
+
+# Every risk threshold used by the API lives in the rule tables below. A rule
+# test is ("above", x), ("below", x), ("between", low, high) (inclusive),
+# ("outside", low, high) or None, which matches anything; the first matching
+# rule wins.
+
+RISK_LEVELS = ["Low", "Medium", "High", "Critical"]
+
+# Overall risk level of a record: the first level any of whose limits is
+# exceeded, as (level, precipitation above, wind above, temperature above,
+# temperature below)
+RISK_LEVEL_RULES = [
+    ("Critical", 70, 30, 35, -5),
+    ("High", 50, 20, 30, 0),
+    ("Medium", 30, 15, 25, 5),
+]
+
+# Point-scored overall risk used for AI predictions: each factor scores the
+# points of its first matching band, as (points, test)
+RISK_SCORE_BANDS = {
+    "temperature": [(3, ("outside", 0, 35)), (2, ("outside", 5, 30)), (1, ("outside", 10, 25))],
+    "humidity": [(2, ("outside", 20, 80)), (1, ("outside", 30, 70))],
+    "windSpeed": [(3, ("above", 30)), (2, ("above", 20)), (1, ("above", 15))],
+    "precipitation": [(3, ("above", 70)), (2, ("above", 50)), (1, ("above", 30))],
+}
+# Minimum total score of each level above Low
+RISK_SCORE_LEVELS = [(8, "Critical"), (6, "High"), (3, "Medium")]
+
+# Weight of each exceedance event (see probability.EXCEEDANCE_EVENTS) when
+# ranking dates for an event type, following the concerns in the event
+# advice: guests and photography at weddings, stages and equipment at
+# concerts, crowds in the heat at parades, players in temperature extremes
+EVENT_RISK_WEIGHTS = {
+    "wedding": {"precipitation": 2.0, "wind": 1.0, "heat": 1.0, "cold": 1.0},
+    "outdoor": {"precipitation": 1.0, "wind": 1.0, "heat": 1.0, "cold": 1.0},
+    "concert": {"precipitation": 1.5, "wind": 2.0, "heat": 0.5, "cold": 1.0},
+    "parade": {"precipitation": 1.5, "wind": 1.0, "heat": 1.5, "cold": 1.0},
+    "sports": {"precipitation": 1.5, "wind": 1.0, "heat": 2.0, "cold": 1.5},
+}
+
+# Risk analysis tiers as (level, description, test); tier codes index these lists
+PRECIPITATION_TIERS = [
+    ("High", "Heavy precipitation likely, significant impact on activities", ("above", 70)),
+    ("Medium", "Moderate precipitation expected, some impact on activities", ("above", 40)),
+    ("Low", "Minimal precipitation expected, low impact on activities", None),
+]
+WIND_TIERS = [
+    ("High", "Strong winds expected, high impact on outdoor activities", ("above", 30)),
+    ("Medium", "Moderate winds, some impact on activities", ("above", 15)),
+    ("Low", "Light winds, minimal impact on activities", None),
+]
+TEMPERATURE_TIERS = [
+    ("High", "Very hot conditions, heat stress risk", ("above", 30)),
+    ("High", "Very cold conditions, hypothermia risk", ("below", 5)),
+    ("Low", "Comfortable temperature range", ("between", 18, 25)),
+    ("Medium", "Moderate temperature, some discomfort possible", None),
+]
+
+# Finer tiers with an Extreme level, used by the data enhancer's exports
+EXTENDED_PRECIPITATION_TIERS = [
+    ("Extreme", "Very heavy precipitation expected, severe impact on all outdoor activities", ("above", 80)),
+    ("High", "Heavy precipitation likely, significant impact on activities", ("above", 60)),
+    ("Medium", "Moderate precipitation expected, some impact on activities", ("above", 30)),
+    ("Low", "Minimal precipitation expected, low impact on activities", None),
+]
+EXTENDED_WIND_TIERS = [
+    ("Extreme", "Dangerous winds expected, high risk of damage and safety hazards", ("above", 40)),
+    ("High", "Strong winds expected, high impact on outdoor activities", ("above", 25)),
+    ("Medium", "Moderate winds, some impact on activities and equipment", ("above", 15)),
+    ("Low", "Light winds, minimal impact on activities", None),
+]
+EXTENDED_TEMPERATURE_TIERS = [
+    ("Extreme", "Extreme heat - high risk of heat exhaustion and dehydration", ("above", 35)),
+    ("Extreme", "Extreme cold - high risk of hypothermia and frostbite", ("below", -10)),
+    ("High", "Very hot conditions, heat stress risk for prolonged exposure", ("above", 30)),
+    ("High", "Freezing conditions, risk of hypothermia and ice hazards", ("below", 0)),
+    ("Low", "Comfortable temperature range for most activities", ("between", 18, 25)),
+    ("Medium", "Moderate temperature, some discomfort possible for extended periods", None),
+]
+
+# Risk analysis profiles as (factor, measurement, tiers)
+RISK_ANALYSIS_FACTORS = [
+    ("precipitationRisk", "precipitation", PRECIPITATION_TIERS),
+    ("windImpact", "windSpeed", WIND_TIERS),
+    ("temperatureComfort", "temperature", TEMPERATURE_TIERS),
+]
+EXTENDED_RISK_ANALYSIS_FACTORS = [
+    ("precipitationRisk", "precipitation", EXTENDED_PRECIPITATION_TIERS),
+    ("windImpact", "windSpeed", EXTENDED_WIND_TIERS),
+    ("temperatureComfort", "temperature", EXTENDED_TEMPERATURE_TIERS),
+]
+
+
+def _matches(test: Optional[tuple], value: float) -> bool:
+    if test is None:
+        return True
+    kind = test[0]
+    if kind == "above":
+        return value > test[1]
+    if kind == "below":
+        return value < test[1]
+    if kind == "between":
+        return test[1] <= value <= test[2]
+    return value < test[1] or value > test[2]  # "outside"
+
+
+def _mask(test: Optional[tuple], values: np.ndarray) -> np.ndarray:
+    if test is None:
+        return np.ones(values.shape, dtype=bool)
+    kind = test[0]
+    if kind == "above":
+        return values > test[1]
+    if kind == "below":
+        return values < test[1]
+    if kind == "between":
+        return (values >= test[1]) & (values <= test[2])
+    return (values < test[1]) | (values > test[2])  # "outside"
+
+
+def _as_array(values) -> np.ndarray:
+    return np.atleast_1d(np.asarray(values, dtype=np.float64))
+
+
+def tier_of(tiers: Sequence[tuple], value: float) -> int:
+    """Code of the first matching tier for a value"""
+    for code, tier in enumerate(tiers):
+        if _matches(tier[2], value):
+            return code
+    return len(tiers) - 1
+
+
+# Risk analysis
+def describe_risk_analysis(tiers: Sequence[int],
+                           factors: Sequence[tuple] = RISK_ANALYSIS_FACTORS) -> Dict[str, Dict[str, str]]:
+    """Build the riskAnalysis dict from one row of tier codes"""
+    analysis = {}
+    for (factor, _, table), tier in zip(factors, tiers):
+        level, description, _ = table[tier]
+        analysis[factor] = {"level": level, "description": description}
+    return analysis
+
+
+def analyze_risk(temperature: float, precipitation: float, wind_speed: float,
+                 factors: Sequence[tuple] = RISK_ANALYSIS_FACTORS) -> Dict[str, Dict[str, str]]:
+    """Scalar fast path: the riskAnalysis dict of one set of conditions"""
+    measurements = {"temperature": temperature, "precipitation": precipitation, "windSpeed": wind_speed}
+    return describe_risk_analysis(
+        [tier_of(tiers, measurements[measurement]) for _, measurement, tiers in factors], factors
+    )
+
+
+# Overall risk level
+def classify_risk_levels(temperature, precipitation, wind_speed) -> np.ndarray:
+    """Codes into ``RISK_LEVELS`` for whole arrays"""
+    temperature = _as_array(temperature)
+    precipitation = _as_array(precipitation)
+    wind_speed = _as_array(wind_speed)
+    conditions = [
+        (precipitation > rain) | (wind_speed > wind) | (temperature > hot) | (temperature < cold)
+        for _, rain, wind, hot, cold in RISK_LEVEL_RULES
+    ]
+    codes = [RISK_LEVELS.index(rule[0]) for rule in RISK_LEVEL_RULES]
+    return np.select(conditions, codes, 0).astype(np.int8)
+
+
+def risk_level_of(temperature: float, precipitation: float, wind_speed: float) -> str:
+    """Scalar fast path of ``classify_risk_levels``"""
+    for level, rain, wind, hot, cold in RISK_LEVEL_RULES:
+        if precipitation > rain or wind_speed > wind or temperature > hot or temperature < cold:
+            return level
+    return RISK_LEVELS[0]
+
+
+# Point-scored risk level
+def risk_scores(temperature, humidity, wind_speed, precipitation) -> np.ndarray:
+    """Total risk points for whole arrays"""
+    measurements = {
+        "temperature": _as_array(temperature), "humidity": _as_array(humidity),
+        "windSpeed": _as_array(wind_speed), "precipitation": _as_array(precipitation),
+    }
+    total = np.zeros(len(measurements["temperature"]), dtype=np.int16)
+    for name, bands in RISK_SCORE_BANDS.items():
+        values = measurements[name]
+        total += np.select([_mask(test, values) for _, test in bands], [points for points, _ in bands], 0).astype(np.int16)
+    return total
+
+
+def scored_risk_level(temperature: float, humidity: float, wind_speed: float, precipitation: float) -> str:
+    """Scalar fast path: the point-scored risk level of one set of conditions"""
+    measurements = {"temperature": temperature, "humidity": humidity, "windSpeed": wind_speed, "precipitation": precipitation}
+    score = 0
+    for name, bands in RISK_SCORE_BANDS.items():
+        for points, test in bands:
+            if _matches(test, measurements[name]):
+                score += points
+                break
+    for minimum, level in RISK_SCORE_LEVELS:
+        if score >= minimum:
+            return level
+    return RISK_LEVELS[0]
+
+
+def risk_rules_digest() -> str:
+    """Short digest of the overall risk level rules, identifying which
+    rules a reclassified store applied"""
+    return hashlib.sha256(repr((RISK_LEVELS, RISK_LEVEL_RULES)).encode()).hexdigest()[:16]
+
+
+def reclassify_risk_levels(floats: Dict[str, np.ndarray]) -> Tuple[np.ndarray, List[str]]:
+    """Recompute the overall risk level of every row of a columnar store.
+
+    Returns codes and the category list they index, ready to replace a
+    store's ``riskLevel`` column after the rule tables change.
+    """
+    codes = classify_risk_levels(floats["temperature"], floats["precipitation"], floats["windSpeed"])
+    return codes.astype(np.int32), list(RISK_LEVELS)
@@ -0,0 +1,44 @@
+import numpy as np
+import orjson
+from fastapi.responses import Response
+from pydantic import BaseModel
+from typing import Any, Dict, Iterable
+
+# numpy arrays and scalars are encoded natively, and dict keys may be ints
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+def _default(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value: Any) -> bytes:
+    """Encode a response body with orjson"""
+    return orjson.dumps(value, default=_default, option=ORJSON_OPTIONS)
+
+
+def json_array(items: Iterable[bytes]) -> bytes:
+    """Join already-encoded JSON values into an array without re-encoding them"""
+    return b"[" + b",".join(items) + b"]"
+
+
+def embed(value: Dict[str, Any], name: str, encoded: bytes) -> bytes:
+    """Encode a dict plus one more key whose value is already-encoded JSON"""
+    head = dumps(value)[:-1]
+    return head + (b"," if len(head) > 1 else b"") + dumps(name) + b":" + encoded + b"}"
+
+
+class JSONBytesResponse(Response):
+    """JSON response that sends pre-encoded bytes as they are and encodes
+    anything else with orjson, skipping FastAPI's ``jsonable_encoder`` pass"""
+
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, (bytes, bytearray, memoryview)):
+            return bytes(content)
+        return dumps(content)
@@ -0,0 +1,249 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, Dict, Optional
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from lru_cache import LRUCache
+from spatial_index import EARTH_RADIUS_KM, SpatialIndex, to_unit_vectors
+from weather_snapshot import replace_directory
+
+# Bump when the on-disk layout changes so stale grids are ignored
+GRID_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+
+# Degrees of padding around the stations' bounding box
+GRID_MARGIN_DEGREES = 1.0
+
+# Refuse grids larger than this many cells (about 400 MB)
+GRID_MAX_CELLS = 50_000_000
+
+# Cells whose nearest station is computed per KD-tree query
+GRID_BLOCK_CELLS = 1 << 20
+
+
+def _station_digest(index: SpatialIndex, count: int) -> str:
+    digest = hashlib.sha256()
+    digest.update(np.ascontiguousarray(index.station_latitudes[:count]).tobytes())
+    digest.update(np.ascontiguousarray(index.station_longitudes[:count]).tobytes())
+    return digest.hexdigest()
+
+
+class StationGrid:
+    """Raster of the nearest station to every cell of a lat/lon grid.
+
+    A point lookup is an array index into the grid followed by an index
+    into that date's station-to-row array, instead of a KD-tree query and a
+    binary search. The grid stores one station id per cell rather than one
+    row per cell and date: rows for a date are a small per-station array
+    (cached for popular dates), so the raster does not grow with the number
+    of dates. Answers are exact for the cell centre, so a point can resolve
+    to a station up to one cell diagonal further than its true nearest.
+
+    Points outside the grid return None so callers fall back to the index.
+    """
+
+    def __init__(self, index: SpatialIndex, resolution: float, min_latitude: float, min_longitude: float,
+                 stations: np.ndarray, chords: np.ndarray, station_count: int,
+                 date_cache_size: int = 64, source: str = "built", build_seconds: float = 0.0):
+        self.index = index
+        self.resolution = resolution
+        self.min_latitude = min_latitude
+        self.min_longitude = min_longitude
+        self.stations = stations
+        self.chords = chords
+        self.station_count = station_count
+        self.source = source
+        self.build_seconds = build_seconds
+        self.date_rows = LRUCache(date_cache_size)
+
+    @property
+    def shape(self):
+        return self.stations.shape
+
+    # Building
+    @classmethod
+    def build(cls, index: SpatialIndex, resolution: float, date_cache_size: int = 64) -> "StationGrid":
+        """Rasterize the nearest station of every cell over the stations'
+        bounding box (plus a margin)"""
+        start = time.perf_counter()
+        min_latitude = max(-90.0, np.floor((index.station_latitudes.min() - GRID_MARGIN_DEGREES) / resolution) * resolution)
+        max_latitude = min(90.0, index.station_latitudes.max() + GRID_MARGIN_DEGREES)
+        min_longitude = max(-180.0, np.floor((index.station_longitudes.min() - GRID_MARGIN_DEGREES) / resolution) * resolution)
+        max_longitude = min(180.0, index.station_longitudes.max() + GRID_MARGIN_DEGREES)
+        shape = (
+            int(np.ceil((max_latitude - min_latitude) / resolution)) + 1,
+            int(np.ceil((max_longitude - min_longitude) / resolution)) + 1,
+        )
+        if shape[0] * shape[1] > GRID_MAX_CELLS:
+            raise ValueError(f"A {resolution} degree grid over the data needs {shape[0] * shape[1]} cells")
+
+        grid = cls(
+            index, resolution, float(min_latitude), float(min_longitude),
+            np.full(shape, -1, dtype=np.int32), np.full(shape, np.inf, dtype=np.float32),
+            index.station_count, date_cache_size
+        )
+        grid._rasterize(index.tree, 0, index.station_latitudes)
+        grid.build_seconds = round(time.perf_counter() - start, 3)
+        return grid
+
+    def _rasterize(self, tree: cKDTree, first_station: int, station_latitudes: np.ndarray):
+        """Assign every cell whose centre is closer to a station of ``tree``
+        (ids offset by ``first_station``) than to its current station"""
+        rows, columns = self.shape
+        block_rows = max(1, GRID_BLOCK_CELLS // columns)
+        longitudes = self.min_longitude + (np.arange(columns) + 0.5) * self.resolution
+        for first in range(0, rows, block_rows):
+            latitudes = self.min_latitude + (np.arange(first, min(rows, first + block_rows)) + 0.5) * self.resolution
+            current = self.chords[first:first + len(latitudes)].reshape(-1)
+            bound = float(current.max()) if np.isfinite(current).all() else np.inf
+
+            # No station can be nearer to a cell of this band than its
+            # latitude difference, so bands already closer are skipped
+            gaps = np.clip(station_latitudes, latitudes[0], latitudes[-1]) - station_latitudes
+            if 2.0 * np.sin(np.radians(np.abs(gaps).min()) / 2.0) > bound:
+                continue
+
+            points = to_unit_vectors(*np.meshgrid(latitudes, longitudes, indexing="ij")).reshape(-1, 3)
+            chords, stations = tree.query(points, k=1, distance_upper_bound=bound * 1.0001)
+            closer = chords < current
+            current[closer] = chords[closer]
+            self.stations[first:first + len(latitudes)].reshape(-1)[closer] = stations[closer] + first_station
+
+    def updated(self, index: SpatialIndex) -> "StationGrid":
+        """Return a grid for a newer index of the same store lineage.
+
+        Only stations added since this grid was built are rasterized, and
+        only cells they are closer to change; the arrays are copied first so
+        this grid stays valid for its readers. A new station outside the
+        grid's extent triggers a full rebuild.
+        """
+        start = time.perf_counter()
+        new_latitudes = index.station_latitudes[self.station_count:]
+        new_longitudes = index.station_longitudes[self.station_count:]
+        rows, columns = self.shape
+        inside = (
+            (new_latitudes >= self.min_latitude) & (new_latitudes < self.min_latitude + rows * self.resolution)
+            & (new_longitudes >= self.min_longitude) & (new_longitudes < self.min_longitude + columns * self.resolution)
+        )
+        if not inside.all():
+            return StationGrid.build(index, self.resolution, self.date_rows.maxsize)
+
+        grid = StationGrid(
+            index, self.resolution, self.min_latitude, self.min_longitude,
+            self.stations, self.chords, index.station_count, self.date_rows.maxsize, self.source, self.build_seconds
+        )
+        if len(new_latitudes):
+            grid.stations, grid.chords = np.array(self.stations), np.array(self.chords)
+            grid._rasterize(cKDTree(to_unit_vectors(new_latitudes, new_longitudes)), self.station_count, new_latitudes)
+            grid.source = "updated"
+            grid.build_seconds = round(time.perf_counter() - start, 3)
+        return grid
+
+    # Persistence
+    def save(self, directory: str):
+        """Write the raster as .npy files plus a manifest, replacing any
+        previous grid atomically"""
+        temporary = f"{directory}.tmp-{os.getpid()}"
+        shutil.rmtree(temporary, ignore_errors=True)
+        os.makedirs(temporary)
+        np.save(os.path.join(temporary, "stations.npy"), self.stations)
+        np.save(os.path.join(temporary, "chords.npy"), self.chords)
+        manifest = {
+            "formatVersion": GRID_FORMAT_VERSION,
+            "resolution": self.resolution,
+            "minLatitude": self.min_latitude,
+            "minLongitude": self.min_longitude,
+            "stationCount": self.station_count,
+            "stationDigest": _station_digest(self.index, self.station_count),
+        }
+        with open(os.path.join(temporary, MANIFEST_FILE), "w") as f:
+            json.dump(manifest, f)
+        replace_directory(temporary, directory)
+
+    @classmethod
+    def open(cls, directory: str, index: SpatialIndex, resolution: float,
+             date_cache_size: int = 64) -> Optional["StationGrid"]:
+        """Memory-map a saved grid built for this resolution from a prefix of
+        the index's stations (any newer stations are then added), or return
+        None. Pages are mapped copy-on-write, so updates never touch the file."""
+        try:
+            with open(os.path.join(directory, MANIFEST_FILE)) as f:
+                manifest = json.load(f)
+            if (manifest.get("formatVersion") != GRID_FORMAT_VERSION or manifest["resolution"] != resolution
+                    or manifest["stationCount"] > index.station_count
+                    or manifest["stationDigest"] != _station_digest(index, manifest["stationCount"])):
+                return None
+            stations = np.load(os.path.join(directory, "stations.npy"), mmap_mode="c")
+            chords = np.load(os.path.join(directory, "chords.npy"), mmap_mode="c")
+        except (FileNotFoundError, KeyError, ValueError):
+            return None
+
+        grid = cls(
+            index, resolution, manifest["minLatitude"], manifest["minLongitude"],
+            stations, chords, manifest["stationCount"], date_cache_size, source="mapped"
+        )
+        return grid.updated(index) if grid.station_count < index.station_count else grid
+
+    @classmethod
+    def load_or_build(cls, directory: Optional[str], index: SpatialIndex, resolution: float,
+                      date_cache_size: int = 64) -> "StationGrid":
+        """Open the grid saved in ``directory`` if it still matches, else
+        build it (and save it when a directory is given)"""
+        grid = cls.open(directory, index, resolution, date_cache_size) if directory else None
+        if grid is None:
+            grid = cls.build(index, resolution, date_cache_size)
+        if directory and grid.source != "mapped":
+            grid.save(directory)
+        return grid
+
+    # Lookups
+    def station_at(self, latitude: float, longitude: float) -> Optional[int]:
+        """Nearest station of the cell containing a point (None outside the grid)"""
+        row = int((latitude - self.min_latitude) // self.resolution)
+        column = int((longitude - self.min_longitude) // self.resolution)
+        if not (0 <= row < self.shape[0] and 0 <= column < self.shape[1]):
+            return None
+        return int(self.stations[row, column])
+
+    def rows_on(self, date, max_gap_days: Optional[int] = None, within_range: bool = False) -> np.ndarray:
+        """Row of every station for a date (cached per date)"""
+        key = (int(np.datetime64(date, "D").astype(np.int64)), max_gap_days, within_range)
+        rows = self.date_rows.get(key)
+        if rows is None:
+            rows, _ = self.index.lookup_dates(np.arange(self.station_count), key[0], max_gap_days, within_range)
+            rows = rows.astype(np.int64)
+            self.date_rows.put(key, rows)
+        return rows
+
+    def locate(self, latitude: float, longitude: float, date, max_gap_days: Optional[int] = None,
+               within_range: bool = False) -> Optional[int]:
+        """Row of the record for ``date`` at the point's grid station: -1 if
+        there is none, None if the point is outside the grid"""
+        station = self.station_at(latitude, longitude)
+        if station is None:
+            return None
+        return int(self.rows_on(date, max_gap_days, within_range)[station])
+
+    def stats(self) -> Dict[str, Any]:
+        """Resolution and memory footprint for /metrics"""
+        date_bytes = len(self.date_rows) * self.station_count * 8
+        return {
+            "resolution": self.resolution,
+            "shape": list(self.shape),
+            "bounds": [
+                self.min_longitude, self.min_latitude,
+                self.min_longitude + self.shape[1] * self.resolution,
+                self.min_latitude + self.shape[0] * self.resolution,
+            ],
+            "stations": self.station_count,
+            "source": self.source,
+            "buildSeconds": self.build_seconds,
+            "memoryMb": round((self.stations.nbytes + self.chords.nbytes + date_bytes) / (1024 * 1024), 2),
+            "maxExtraDistanceKm": round(float(np.radians(self.resolution) * np.sqrt(2) * EARTH_RADIUS_KM), 3),
+            "dateCache": self.date_rows.stats(),
+        }
@@ -0,0 +1,242 @@
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+from typing import Optional, Tuple
+
+# Mean Earth radius used for great-circle distances
+EARTH_RADIUS_KM = 6371.0088
+
+# Composite (station, day) keys pack the station id above a biased day number
+_DAY_BITS = 32
+_DAY_BIAS = 1 << 31
+
+
+def to_unit_vectors(latitudes, longitudes) -> np.ndarray:
+    """Convert lat/lon degrees to 3-D unit vectors on the sphere"""
+    lat = np.radians(np.asarray(latitudes, dtype=np.float64))
+    lon = np.radians(np.asarray(longitudes, dtype=np.float64))
+    cos_lat = np.cos(lat)
+    return np.stack([cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def chord_to_km(chord) -> np.ndarray:
+    """Convert a chord length between unit vectors to a great-circle distance"""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.clip(np.asarray(chord) / 2.0, 0.0, 1.0))
+
+
+def km_to_chord(distance_km) -> np.ndarray:
+    """Convert a great-circle distance to a chord length between unit vectors"""
+    angle = np.minimum(np.asarray(distance_km, dtype=np.float64) / EARTH_RADIUS_KM, np.pi)
+    return 2.0 * np.sin(angle / 2.0)
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance between points given in degrees"""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=np.float64)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+class SpatialIndex:
+    """Great-circle nearest-station index over the weather store.
+
+    Rows sharing a coordinate pair are grouped into one station. Stations are
+    indexed by a KD-tree over 3-D unit vectors, where the straight-line (chord)
+    distance is monotonic in great-circle distance, so nearest-neighbour
+    queries are O(log N) and correct across the poles and the antimeridian.
+
+    Within a station, rows are sorted by date and addressed through one sorted
+    array of composite (station, day) keys, so the record for a given date at
+    a given station is found by binary search.
+    """
+
+    def __init__(self, latitudes: np.ndarray, longitudes: np.ndarray, dates: Optional[np.ndarray] = None):
+        latitudes = np.asarray(latitudes, dtype=np.float64)
+        longitudes = np.asarray(longitudes, dtype=np.float64)
+
+        # Hash-based grouping of coordinate pairs (packed as complex numbers)
+        station_of_row, stations = pd.factorize(latitudes + 1j * longitudes)
+        self.station_latitudes = np.ascontiguousarray(stations.real, dtype=np.float64)
+        self.station_longitudes = np.ascontiguousarray(stations.imag, dtype=np.float64)
+        self.station_of_row = station_of_row.reshape(-1).astype(np.int32)
+
+        if dates is None:
+            dates = np.zeros(len(self.station_of_row), dtype="datetime64[D]")
+        days = np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+        # Rows grouped by station and sorted by date (CSR layout): rows of
+        # station s are station_rows[station_offsets[s]:station_offsets[s + 1]]
+        self.station_rows = np.lexsort((days, self.station_of_row)).astype(np.int32)
+        self.sorted_days = days[self.station_rows]
+        self.sorted_keys = self._keys(self.station_of_row[self.station_rows], self.sorted_days)
+        counts = np.bincount(self.station_of_row, minlength=len(stations))
+        self.station_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        self.tree = cKDTree(to_unit_vectors(self.station_latitudes, self.station_longitudes)) if len(stations) else None
+
+    @classmethod
+    def from_store(cls, store) -> "SpatialIndex":
+        return cls(store.floats["latitude"], store.floats["longitude"], store.dates)
+
+    def extended(self, store) -> "SpatialIndex":
+        """Index of ``store``, which holds this index's rows followed by
+        appended ones, equal to ``from_store(store)``.
+
+        Only the new rows are grouped: they are matched to known stations
+        (new coordinates get the next ids), sorted by station and date and
+        merged into the composite key order. The k-d tree is shared unless
+        new stations appeared.
+        """
+        base = len(self.station_of_row)
+        latitudes = np.asarray(store.floats["latitude"][base:], dtype=np.float64)
+        longitudes = np.asarray(store.floats["longitude"][base:], dtype=np.float64)
+        days = np.asarray(store.dates[base:], dtype="datetime64[D]").astype(np.int64)
+
+        coordinates = latitudes + 1j * longitudes
+        stations = pd.Index(self.station_latitudes + 1j * self.station_longitudes).get_indexer(coordinates)
+        unknown = stations < 0
+        added, new_stations = pd.factorize(coordinates[unknown])
+        stations[unknown] = self.station_count + added.reshape(-1)
+
+        index = SpatialIndex.__new__(SpatialIndex)
+        index.station_latitudes = np.concatenate([self.station_latitudes, new_stations.real])
+        index.station_longitudes = np.concatenate([self.station_longitudes, new_stations.imag])
+        index.station_of_row = np.concatenate([self.station_of_row, stations.astype(np.int32)])
+
+        # New rows come after every known row with the same key, as in the
+        # row-stable lexsort of a full build
+        order = np.lexsort((days, stations))
+        keys = self._keys(stations[order], days[order])
+        positions = np.searchsorted(self.sorted_keys, keys, side="right")
+        index.station_rows = np.insert(self.station_rows, positions, (base + order).astype(np.int32))
+        index.sorted_days = np.insert(self.sorted_days, positions, days[order])
+        index.sorted_keys = np.insert(self.sorted_keys, positions, keys)
+        counts = np.bincount(index.station_of_row, minlength=index.station_count)
+        index.station_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+        index.tree = self.tree
+        if len(new_stations):
+            index.tree = cKDTree(to_unit_vectors(index.station_latitudes, index.station_longitudes))
+        return index
+
+    @staticmethod
+    def _keys(stations, days) -> np.ndarray:
+        return (np.asarray(stations, dtype=np.int64) << _DAY_BITS) + (np.asarray(days, dtype=np.int64) + _DAY_BIAS)
+
+    @property
+    def station_count(self) -> int:
+        return len(self.station_latitudes)
+
+    def nearest(self, latitude, longitude, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (station ids, distances in km) of the k nearest stations.
+
+        Scalar coordinates give arrays of shape ``(k,)``; arrays of N query
+        points give arrays of shape ``(N, k)``.
+        """
+        if self.tree is None:
+            raise LookupError("Spatial index is empty")
+
+        k = max(1, min(int(k), self.station_count))
+        points = to_unit_vectors(latitude, longitude)
+        chords, stations = self.tree.query(points, k=k)
+        chords, stations = np.asarray(chords), np.asarray(stations)
+        if k == 1:
+            chords, stations = chords[..., np.newaxis], stations[..., np.newaxis]
+        return stations.astype(np.int64), chord_to_km(chords)
+
+    def rows_of_station(self, station: int) -> np.ndarray:
+        """Row indices of every record at a station"""
+        return self.station_rows[self.station_offsets[station]:self.station_offsets[station + 1]]
+
+    def nearest_row(self, latitude: float, longitude: float) -> Tuple[int, float]:
+        """Return (row index, distance in km) of a record at the nearest station"""
+        stations, distances = self.nearest(latitude, longitude, k=1)
+        return int(self.rows_of_station(int(stations[0]))[0]), float(distances[0])
+
+    def lookup_dates(self, stations, dates, max_gap_days: Optional[int] = None,
+                     within_range: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+        """Find the record closest in time to each (station, date) pair.
+
+        Returns (row indices, gaps in days). An exact date match has gap 0;
+        otherwise the nearest earlier or later record of the same station is
+        used. Rows are -1 where the nearest date is more than ``max_gap_days``
+        away (``None`` accepts any gap) and, with ``within_range``, where a
+        date without a record lies before the station's first record or
+        after its last.
+        """
+        stations = np.atleast_1d(np.asarray(stations, dtype=np.int64))
+        days = np.atleast_1d(np.asarray(dates, dtype="datetime64[D]").astype(np.int64))
+        stations, days = np.broadcast_arrays(stations, days)
+
+        positions = np.searchsorted(self.sorted_keys, self._keys(stations, days))
+        starts, ends = self.station_offsets[stations], self.station_offsets[stations + 1]
+
+        after = np.minimum(positions, ends - 1)
+        before = np.maximum(positions - 1, starts)
+        gap_after = np.where(positions < ends, self.sorted_days[after] - days, np.iinfo(np.int64).max)
+        gap_before = np.where(positions > starts, days - self.sorted_days[before], np.iinfo(np.int64).max)
+
+        use_before = gap_before < gap_after
+        best = np.where(use_before, before, after)
+        gaps = np.where(use_before, gap_before, gap_after)
+
+        rows = self.station_rows[best].astype(np.int64)
+        if max_gap_days is not None:
+            rows = np.where(gaps <= max_gap_days, rows, -1)
+        if within_range:
+            rows = np.where((gaps > 0) & ((positions == starts) | (positions == ends)), -1, rows)
+        return rows, gaps
+
+    def stations_within(self, latitude: float, longitude: float, radius_km: float) -> np.ndarray:
+        """Ids (ascending) of the stations within ``radius_km`` of a point"""
+        if self.tree is None:
+            return np.empty(0, dtype=np.int64)
+        stations = self.tree.query_ball_point(to_unit_vectors(latitude, longitude), float(km_to_chord(radius_km)))
+        return np.sort(np.asarray(stations, dtype=np.int64))
+
+    def stations_in_bbox(self, min_latitude: float, min_longitude: float,
+                         max_latitude: float, max_longitude: float) -> np.ndarray:
+        """Ids (ascending) of the stations inside a lat/lon box; a box whose
+        min longitude exceeds its max crosses the antimeridian"""
+        inside = (self.station_latitudes >= min_latitude) & (self.station_latitudes <= max_latitude)
+        if min_longitude <= max_longitude:
+            inside &= (self.station_longitudes >= min_longitude) & (self.station_longitudes <= max_longitude)
+        else:
+            inside &= (self.station_longitudes >= min_longitude) | (self.station_longitudes <= max_longitude)
+        return np.flatnonzero(inside).astype(np.int64)
+
+    def positions_in_range(self, stations, start=None, end=None) -> np.ndarray:
+        """Positions into ``station_rows`` of the given stations' records
+        dated within ``[start, end]`` (either may be None for unbounded),
+        ordered by station, then date, then row"""
+        stations = np.asarray(stations, dtype=np.int64)
+        lows = self.station_offsets[stations]
+        highs = self.station_offsets[stations + 1]
+        if start is not None:
+            start_day = np.datetime64(start, "D").astype(np.int64)
+            lows = np.searchsorted(self.sorted_keys, self._keys(stations, start_day))
+        if end is not None:
+            end_day = np.datetime64(end, "D").astype(np.int64)
+            highs = np.searchsorted(self.sorted_keys, self._keys(stations, end_day), side="right")
+
+        lengths = np.maximum(highs - lows, 0)
+        firsts = np.cumsum(lengths) - lengths
+        return np.arange(lengths.sum(), dtype=np.int64) + np.repeat(lows - firsts, lengths)
+
+    def locate(self, latitude: float, longitude: float, date, max_gap_days: Optional[int] = None,
+               within_range: bool = False) -> Tuple[int, float, int]:
+        """Return (row index, distance in km, gap in days) for the record of
+        ``date`` at the station nearest to the given point (row -1 if none)"""
+        rows, distances, gaps = self.locate_many([latitude], [longitude], [date], max_gap_days, within_range)
+        return int(rows[0]), float(distances[0]), int(gaps[0])
+
+    def locate_many(self, latitudes, longitudes, dates,
+                    max_gap_days: Optional[int] = None,
+                    within_range: bool = False) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Vectorized ``locate`` for N points: one k-NN query and one date
+        search for the whole batch. Returns arrays of rows, km and gaps."""
+        stations, distances = self.nearest(
+            np.asarray(latitudes, dtype=np.float64), np.asarray(longitudes, dtype=np.float64), k=1
+        )
+        rows, gaps = self.lookup_dates(stations[:, 0], dates, max_gap_days, within_range)
+        return rows, distances[:, 0], gaps
@@ -0,0 +1,241 @@
+import csv
+import io
+import zlib
+import numpy as np
+from typing import Any, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from serialization import dumps
+from weather_store import WeatherStore, EXPORT_COLUMNS, FLOAT_COLUMNS, CATEGORICAL_COLUMNS
+
+# Rows rendered per streamed chunk (about 0.5 MB of CSV)
+EXPORT_CHUNK_ROWS = 8192
+
+# Rows per Parquet row group (and per Arrow record batch)
+EXPORT_BATCH_ROWS = 1 << 17
+
+# Columns a flat export can select
+EXPORTABLE_COLUMNS = EXPORT_COLUMNS + [
+    name for name in FLOAT_COLUMNS + CATEGORICAL_COLUMNS if name not in EXPORT_COLUMNS
+]
+
+# Media type and file extension of each streamed export format
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+# zlib level of gzip-encoded exports
+EXPORT_GZIP_LEVEL = 6
+
+
+def select_rows(store: WeatherStore, cities: Optional[Sequence[str]] = None,
+                bbox: Optional[Tuple[float, float, float, float]] = None, start=None, end=None,
+                risk_levels: Optional[Sequence[str]] = None) -> Optional[np.ndarray]:
+    """Rows matching every given filter, evaluated on the store's columns.
+
+    ``bbox`` is (min lat, min lon, max lat, max lon) and may cross the
+    antimeridian (min lon > max lon); dates are inclusive. Returns None
+    when no filter is given, meaning every row.
+    """
+    conditions: List[np.ndarray] = []
+    for name, values in (("city", cities), ("riskLevel", risk_levels)):
+        if values:
+            codes = [store.code_of(name, value) for value in values]
+            conditions.append(np.isin(store.codes[name], codes))
+    if bbox is not None:
+        min_latitude, min_longitude, max_latitude, max_longitude = bbox
+        latitudes, longitudes = store.floats["latitude"], store.floats["longitude"]
+        conditions.append((latitudes >= min_latitude) & (latitudes <= max_latitude))
+        if min_longitude <= max_longitude:
+            conditions.append((longitudes >= min_longitude) & (longitudes <= max_longitude))
+        else:
+            conditions.append((longitudes >= min_longitude) | (longitudes <= max_longitude))
+    if start is not None:
+        conditions.append(store.dates >= np.datetime64(start, "D"))
+    if end is not None:
+        conditions.append(store.dates <= np.datetime64(end, "D"))
+    if not conditions:
+        return None
+    return np.flatnonzero(np.logical_and.reduce(conditions))
+
+
+def _chunks(store: WeatherStore, indices: Optional[np.ndarray], chunk_rows: int) -> Iterator[np.ndarray]:
+    total = len(store) if indices is None else len(indices)
+    for start in range(0, total, chunk_rows):
+        yield np.arange(start, min(total, start + chunk_rows)) if indices is None else indices[start:start + chunk_rows]
+
+
+def iter_weather_csv(store: WeatherStore, indices: Optional[np.ndarray] = None,
+                     names: Sequence[str] = EXPORT_COLUMNS, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield a CSV export of the store (or of ``indices``) chunk by chunk.
+
+    Only one chunk of rows is decoded and rendered at a time, so memory
+    stays flat however large the store is. The store is an immutable
+    version, so the export is consistent while newer versions are published.
+    """
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow(names)
+    for chunk in _chunks(store, indices, chunk_rows):
+        writer.writerows(store.export_rows(chunk, names))
+        yield output.getvalue().encode("utf-8")
+        output.seek(0)
+        output.truncate()
+    if output.tell():
+        yield output.getvalue().encode("utf-8")
+
+
+def iter_weather_ndjson(store: WeatherStore, indices: Optional[np.ndarray] = None,
+                        names: Sequence[str] = EXPORT_COLUMNS, chunk_rows: int = EXPORT_CHUNK_ROWS) -> Iterator[bytes]:
+    """Yield one JSON object per row, newline-delimited, chunk by chunk"""
+    for chunk in _chunks(store, indices, chunk_rows):
+        yield b"".join(dumps(dict(zip(names, values))) + b"\n" for values in store.export_rows(chunk, names))
+
+
+class _ByteSink:
+    """Write-only file that hands what was written so far to a generator"""
+
+    def __init__(self):
+        self.parts: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        self.parts.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self) -> bytes:
+        data = b"".join(self.parts)
+        self.parts = []
+        return data
+
+
+def _import_pyarrow():
+    """pyarrow is optional: only the Arrow and Parquet exports need it"""
+    try:
+        import pyarrow
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("The arrow and parquet export formats require pyarrow")
+    return pyarrow
+
+
+def _arrow_batches(pa, store: WeatherStore, indices: Optional[np.ndarray], names: Sequence[str],
+                   chunk_rows: int) -> Tuple[Any, Iterator[Any]]:
+    """Arrow schema and record batches of the selected rows and columns.
+
+    Categorical columns become dictionary arrays over the store's codes,
+    so strings are never materialized per row.
+    """
+    dictionaries = {name: pa.array(store.categories[name], pa.string()) for name in names if name in store.codes}
+    fields = []
+    for name in names:
+        if name in store.floats:
+            fields.append(pa.field(name, pa.float64()))
+        elif name in store.codes:
+            fields.append(pa.field(name, pa.dictionary(pa.int32(), pa.string())))
+        else:
+            fields.append(pa.field(name, pa.date32()))
+    schema = pa.schema(fields)
+
+    def batches() -> Iterator[Any]:
+        for chunk in _chunks(store, indices, chunk_rows):
+            arrays = []
+            for name in names:
+                if name in store.floats:
+                    arrays.append(pa.array(store.floats[name][chunk]))
+                elif name in store.codes:
+                    arrays.append(pa.DictionaryArray.from_arrays(store.codes[name][chunk], dictionaries[name]))
+                else:
+                    arrays.append(pa.array(store.dates[chunk], pa.date32()))
+            yield pa.record_batch(arrays, schema=schema)
+
+    return schema, batches()
+
+
+def iter_weather_arrow(store: WeatherStore, indices: Optional[np.ndarray] = None,
+                       names: Sequence[str] = EXPORT_COLUMNS, chunk_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """Arrow IPC stream of the selected rows, one record batch per chunk.
+
+    Raises RuntimeError up front when pyarrow is not installed.
+    """
+    pa = _import_pyarrow()
+    schema, batches = _arrow_batches(pa, store, indices, names, chunk_rows)
+
+    def stream() -> Iterator[bytes]:
+        sink = _ByteSink()
+        with pa.ipc.new_stream(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+
+    return stream()
+
+
+def iter_weather_parquet(store: WeatherStore, indices: Optional[np.ndarray] = None,
+                         names: Sequence[str] = EXPORT_COLUMNS, chunk_rows: int = EXPORT_BATCH_ROWS) -> Iterator[bytes]:
+    """Parquet file of the selected rows, one row group per chunk, streamed
+    as each row group is written.
+
+    Raises RuntimeError up front when pyarrow is not installed.
+    """
+    pa = _import_pyarrow()
+    schema, batches = _arrow_batches(pa, store, indices, names, chunk_rows)
+
+    def stream() -> Iterator[bytes]:
+        sink = _ByteSink()
+        with pa.parquet.ParquetWriter(sink, schema) as writer:
+            for batch in batches:
+                writer.write_batch(batch)
+                yield sink.drain()
+        yield sink.drain()
+
+    return stream()
+
+
+EXPORT_WRITERS = {
+    "csv": iter_weather_csv,
+    "ndjson": iter_weather_ndjson,
+    "arrow": iter_weather_arrow,
+    "parquet": iter_weather_parquet,
+}
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    """Compress a byte stream into a gzip stream as it is produced"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """Whether an Accept-Encoding header allows a gzip response"""
+    for coding in (accept_encoding or "").split(","):
+        name, _, parameters = coding.partition(";")
+        if name.strip().lower() not in ("gzip", "*"):
+            continue
+        quality = parameters.strip()
+        if quality.startswith("q="):
+            try:
+                return float(quality[2:]) > 0
+            except ValueError:
+                return False
+        return True
+    return False
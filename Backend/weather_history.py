@@ -0,0 +1,99 @@
+import numpy as np
+from typing import Any, Dict, List, Sequence
+
+from weather_store import WeatherStore
+from spatial_index import SpatialIndex
+
+# Measurements aggregated by rollups
+HISTORY_COLUMNS = ["temperature", "humidity", "precipitation", "windSpeed"]
+
+# Fields of each raw history entry
+HISTORY_FIELDS = ["date"] + HISTORY_COLUMNS + ["conditions", "riskLevel"]
+
+ROLLUP_PERIODS = ("daily", "weekly", "monthly")
+DEFAULT_PERCENTILES = (10.0, 50.0, 90.0)
+
+
+def station_series(index: SpatialIndex, station: int, start=None, end=None) -> np.ndarray:
+    """Rows of a station's records dated within ``[start, end]``, by date"""
+    positions = index.positions_in_range([station], start, end)
+    return index.station_rows[positions].astype(np.int64)
+
+
+def period_starts(dates: np.ndarray, period: str) -> np.ndarray:
+    """First day of the period (day, Monday-based week or month) of each date"""
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    if period == "daily":
+        return dates
+    if period == "weekly":
+        days = dates.astype(np.int64)
+        return (days - (days + 3) % 7).astype("datetime64[D]")  # 1970-01-01 was a Thursday
+    if period == "monthly":
+        return dates.astype("datetime64[M]").astype("datetime64[D]")
+    raise ValueError(f"Unknown rollup period {period}, expected one of {ROLLUP_PERIODS}")
+
+
+def grouped_percentiles(values: np.ndarray, starts: np.ndarray, counts: np.ndarray,
+                        percentiles: Sequence[float]) -> np.ndarray:
+    """Linearly interpolated percentiles of contiguous groups, in one pass.
+
+    ``values`` must be sorted within each group. Returns a
+    ``(groups x len(percentiles))`` array.
+    """
+    positions = starts[:, np.newaxis] + (counts[:, np.newaxis] - 1) * (np.asarray(percentiles) / 100.0)
+    lower = np.floor(positions).astype(np.int64)
+    upper = np.ceil(positions).astype(np.int64)
+    return values[lower] + (values[upper] - values[lower]) * (positions - lower)
+
+
+def rollup(store: WeatherStore, rows: np.ndarray, period: str,
+           percentiles: Sequence[float] = DEFAULT_PERCENTILES) -> List[Dict[str, Any]]:
+    """Aggregate date-ordered rows per period.
+
+    Each period reports its first and last record dates, the record count
+    and the mean, min, max and percentiles of every measurement. Groups
+    are contiguous because the rows are ordered by date, so every
+    statistic is one ``reduceat`` or gather over all groups.
+    """
+    if not len(rows):
+        return []
+    dates = store.dates[rows]
+    keys = period_starts(dates, period)
+    starts = np.flatnonzero(np.concatenate([[True], keys[1:] != keys[:-1]]))
+    counts = np.diff(np.append(starts, len(rows)))
+    groups = np.repeat(np.arange(len(starts)), counts)
+
+    statistics = {}
+    for name in HISTORY_COLUMNS:
+        values = store.floats[name][rows]
+        ordered = values[np.lexsort((values, groups))]
+        statistics[name] = {
+            "mean": np.add.reduceat(values, starts) / counts,
+            "min": np.minimum.reduceat(values, starts),
+            "max": np.maximum.reduceat(values, starts),
+            **{
+                f"p{percentile:g}": column
+                for percentile, column in zip(percentiles, grouped_percentiles(ordered, starts, counts, percentiles).T)
+            },
+        }
+
+    statistics = {
+        name: {statistic: np.round(column, 2).tolist() for statistic, column in columns.items()}
+        for name, columns in statistics.items()
+    }
+    periods = np.datetime_as_string(keys[starts]).tolist()
+    first_dates = np.datetime_as_string(dates[starts]).tolist()
+    last_dates = np.datetime_as_string(dates[starts + counts - 1]).tolist()
+    return [
+        {
+            "period": periods[group],
+            "startDate": first_dates[group],
+            "endDate": last_dates[group],
+            "count": count,
+            **{
+                name: {statistic: column[group] for statistic, column in columns.items()}
+                for name, columns in statistics.items()
+            },
+        }
+        for group, count in enumerate(counts.tolist())
+    ]
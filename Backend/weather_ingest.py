@@ -0,0 +1,250 @@
+import csv
+import io
+import os
+import time
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Callable, Iterator, Optional, Sequence, Tuple
+
+from weather_store import WeatherStore, FLOAT_COLUMNS, CATEGORICAL_COLUMNS
+
+# Defaults for optional CSV columns
+COLUMN_DEFAULTS = {"state": "", "country": "USA", "countryCode": "US"}
+
+# Explicit dtypes for the weather CSV so chunks never need type inference
+WEATHER_CSV_DTYPES = {
+    **{name: "float64" for name in FLOAT_COLUMNS},
+    **{name: str for name in ["city", "state", "country", "countryCode", "date", "conditions", "riskLevel"]},
+}
+
+# Parsed chunks need roughly this multiple of their final size while
+# pandas tokenizes and converts them
+PARSER_OVERHEAD = 3
+
+# Memory budget for the CSV parser working set
+INGEST_MEMORY_BUDGET_MB = int(os.getenv("WEATHER_INGEST_MEMORY_MB", "256"))
+
+
+def frame_to_columns(df: pd.DataFrame, event_types: Sequence[str], rng: Optional[np.random.Generator] = None) -> Dict[str, Any]:
+    """Turn a weather CSV frame into store columns with whole-column operations"""
+    rng = rng or np.random.default_rng()
+    count = len(df)
+
+    columns: Dict[str, Any] = {name: df[name].to_numpy(dtype=np.float64) for name in FLOAT_COLUMNS}
+    for name in ("city", "conditions", "riskLevel"):
+        columns[name] = df[name].to_numpy(dtype=object)
+    for name, default in COLUMN_DEFAULTS.items():
+        columns[name] = df[name].to_numpy(dtype=object) if name in df.columns else np.full(count, default, dtype=object)
+    columns["date"] = pd.to_datetime(df["date"]).to_numpy().astype("datetime64[D]")
+
+    # Event types are drawn for every row in one batch; the other
+    # website-only fields are derived lazily when a record is served
+    columns["eventType"] = np.asarray(event_types, dtype=object)[rng.integers(0, len(event_types), count)]
+
+    return columns
+
+
+class BoundedReader(io.RawIOBase):
+    """Read-only view of the next ``limit`` bytes of a binary file"""
+
+    def __init__(self, f, limit: int):
+        self._file = f
+        self._remaining = limit
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        if self._remaining <= 0:
+            return 0
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._remaining)])
+        self._remaining -= count
+        return count
+
+
+def complete_size(path: str, block_size: int = 1 << 16) -> int:
+    """Size of the file up to and including its last newline.
+
+    A writer may be in the middle of appending a line; bytes after the last
+    newline are left for the next read.
+    """
+    with open(path, "rb") as f:
+        end = f.seek(0, os.SEEK_END)
+        position = end
+        while position > 0:
+            start = max(0, position - block_size)
+            f.seek(start)
+            newline = f.read(position - start).rfind(b"\n")
+            if newline >= 0:
+                return start + newline + 1
+            position = start
+    return 0
+
+
+def csv_header(path: str) -> list:
+    """Column names from the first line of a CSV file"""
+    with open(path, newline="") as f:
+        return next(csv.reader(f), [])
+
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def chunk_rows_for_budget(path: str, memory_budget_mb: int, usecols=None, dtype=None, sample_rows: int = 2000) -> int:
+    """Pick a chunk size whose parsed frames stay within the memory budget"""
+    sample = pd.read_csv(path, nrows=sample_rows, usecols=usecols, dtype=dtype)
+    return _chunk_rows(sample, memory_budget_mb, sample_rows)
+
+
+def _chunk_rows(sample: pd.DataFrame, memory_budget_mb: int, default: int) -> int:
+    if sample.empty:
+        return default
+    bytes_per_row = sample.memory_usage(deep=True).sum() / len(sample)
+    return max(1000, int(memory_budget_mb * 1024 * 1024 / (bytes_per_row * PARSER_OVERHEAD)))
+
+
+def read_csv_chunks(path: str, memory_budget_mb: int = INGEST_MEMORY_BUDGET_MB, usecols=None, dtype=None,
+                    start: int = 0, end: Optional[int] = None) -> Iterator[pd.DataFrame]:
+    """Stream a CSV as DataFrames sized to the memory budget.
+
+    With ``start``/``end`` only that byte range is parsed; a range that does
+    not begin at 0 has no header line and takes its column names from the
+    file's first line.
+    """
+    chunk_rows = chunk_rows_for_budget(path, memory_budget_mb, usecols, dtype)
+    if start == 0 and end is None:
+        with pd.read_csv(path, chunksize=chunk_rows, usecols=usecols, dtype=dtype) as reader:
+            yield from reader
+        return
+
+    if end is None:
+        end = complete_size(path)
+    names = None if start == 0 else csv_header(path)
+    if end <= start:
+        return
+
+    with open(path, "rb") as f:
+        f.seek(start)
+        source = io.BufferedReader(BoundedReader(f, end - start))
+        with pd.read_csv(source, chunksize=chunk_rows, usecols=usecols, dtype=dtype,
+                         header=0 if names is None else None, names=names) as reader:
+            yield from reader
+
+
+class ColumnarBuilder:
+    """Appends column chunks into preallocated arrays, doubling capacity as
+    needed, so building a large store copies each value O(1) times"""
+
+    def __init__(self, capacity: int = 1 << 16):
+        self.registry = WeatherStore()  # Holds the category lists while building
+        self.size = 0
+        self.capacity = capacity
+        self.floats = {name: np.empty(capacity, dtype=np.float64) for name in FLOAT_COLUMNS}
+        self.codes = {name: np.empty(capacity, dtype=np.int32) for name in CATEGORICAL_COLUMNS}
+        self.dates = np.empty(capacity, dtype="datetime64[D]")
+
+    def _reserve(self, count: int):
+        if self.size + count <= self.capacity:
+            return
+        while self.capacity < self.size + count:
+            self.capacity *= 2
+        for columns in (self.floats, self.codes):
+            for name, values in columns.items():
+                grown = np.empty(self.capacity, dtype=values.dtype)
+                grown[:self.size] = values[:self.size]
+                columns[name] = grown
+        grown = np.empty(self.capacity, dtype=self.dates.dtype)
+        grown[:self.size] = self.dates[:self.size]
+        self.dates = grown
+
+    def append(self, columns: Dict[str, Any]):
+        count = len(columns["latitude"])
+        self._reserve(count)
+        end = self.size + count
+        for name in FLOAT_COLUMNS:
+            self.floats[name][self.size:end] = columns[name]
+        for name in CATEGORICAL_COLUMNS:
+            self.codes[name][self.size:end] = self.registry.encode(name, columns[name])
+        self.dates[self.size:end] = columns["date"]
+        self.size = end
+
+    def finish(self) -> WeatherStore:
+        """Trim the arrays to size and wrap them in a store"""
+        return WeatherStore.from_arrays(
+            {name: values[:self.size].copy() for name, values in self.floats.items()},
+            {name: values[:self.size].copy() for name, values in self.codes.items()},
+            self.registry.categories,
+            self.dates[:self.size].copy()
+        )
+
+
+def load_weather_csv(path: str, event_types: Sequence[str], rng: Optional[np.random.Generator] = None,
+                     memory_budget_mb: int = INGEST_MEMORY_BUDGET_MB,
+                     progress: Optional[Callable[[int], None]] = None,
+                     end: Optional[int] = None) -> Tuple[WeatherStore, Dict[str, Any]]:
+    """Stream a weather CSV into a new columnar store.
+
+    The file is read in chunks sized so that parsing stays within
+    ``memory_budget_mb``; only the compact store columns grow with the file.
+    Only complete lines up to byte ``end`` are read (default: all of them).
+    Returns the store and ingest statistics (throughput and peak RSS).
+    """
+    rng = rng or np.random.default_rng()
+    usecols = lambda column: column in WEATHER_CSV_DTYPES
+    builder = ColumnarBuilder()
+    start = time.perf_counter()
+    peak_rss = current_rss_bytes()
+    chunks = 0
+    chunk_rows = 0
+
+    for chunk in read_csv_chunks(path, memory_budget_mb, usecols=usecols, dtype=WEATHER_CSV_DTYPES, end=end):
+        builder.append(frame_to_columns(chunk, event_types, rng))
+        chunks += 1
+        chunk_rows = max(chunk_rows, len(chunk))
+        peak_rss = max(peak_rss, current_rss_bytes())
+        if progress is not None:
+            progress(builder.size)
+
+    store = builder.finish()
+    seconds = time.perf_counter() - start
+    stats = {
+        "rows": len(store),
+        "chunks": chunks,
+        "chunkRows": chunk_rows,
+        "seconds": round(seconds, 3),
+        "rowsPerSecond": round(len(store) / seconds) if seconds > 0 else None,
+        "peakRssMb": round(max(peak_rss, current_rss_bytes()) / (1024 * 1024), 1),
+        "memoryBudgetMb": memory_budget_mb,
+    }
+    return store, stats
+
+
+def read_appended_rows(path: str, offset: int, event_types: Sequence[str],
+                       rng: Optional[np.random.Generator] = None) -> Tuple[Optional[Dict[str, Any]], int]:
+    """Parse only the complete lines appended after byte ``offset``.
+
+    Returns the new rows as store columns (None if nothing was appended) and
+    the offset to resume from next time.
+    """
+    rng = rng or np.random.default_rng()
+    end = complete_size(path)
+    if end <= offset:
+        return None, offset
+
+    usecols = lambda column: column in WEATHER_CSV_DTYPES
+    chunks = [
+        frame_to_columns(chunk, event_types, rng)
+        for chunk in read_csv_chunks(path, usecols=usecols, dtype=WEATHER_CSV_DTYPES, start=offset, end=end)
+    ]
+    chunks = [chunk for chunk in chunks if len(chunk["latitude"])]
+    if not chunks:
+        return None, end
+    columns = {name: np.concatenate([chunk[name] for chunk in chunks]) for name in chunks[0]}
+    return columns, end
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from datetime import datetime
+from typing import Optional, Tuple
+
+import numpy as np
+
+from weather_store import WeatherStore, FLOAT_COLUMNS, CATEGORICAL_COLUMNS
+
+# Bump when the on-disk layout changes so stale snapshots are ignored
+SNAPSHOT_FORMAT_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+
+
+def file_digest(path: str, limit: Optional[int] = None, chunk_size: int = 1 << 20) -> str:
+    """SHA-256 of a file (or of its first ``limit`` bytes), read in chunks"""
+    digest = hashlib.sha256()
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            if remaining is not None:
+                remaining -= len(chunk)
+    return digest.hexdigest()
+
+
+def write_snapshot(store: WeatherStore, directory: str, source_path: str, source_offset: int):
+    """Write every store column as a .npy file plus a JSON manifest.
+
+    The manifest records how many bytes of the source CSV the store was
+    built from and their digest, so rows appended to the CSV later can be
+    ingested on top of the snapshot.
+
+    The snapshot is assembled in a temporary directory and renamed into
+    place, so a concurrent reader sees either the old or the new snapshot.
+    Processes that already mapped the old files keep them until they exit.
+    """
+    temporary = f"{directory}.tmp-{os.getpid()}"
+    shutil.rmtree(temporary, ignore_errors=True)
+    os.makedirs(temporary)
+
+    for name in FLOAT_COLUMNS:
+        np.save(os.path.join(temporary, f"{name}.npy"), np.ascontiguousarray(store.floats[name]))
+    for name in CATEGORICAL_COLUMNS:
+        np.save(os.path.join(temporary, f"{name}.codes.npy"), np.ascontiguousarray(store.codes[name]))
+    np.save(os.path.join(temporary, "date.npy"), np.ascontiguousarray(store.dates))
+
+    manifest = {
+        "formatVersion": SNAPSHOT_FORMAT_VERSION,
+        "sourceOffset": source_offset,
+        "sourceDigest": file_digest(source_path, source_offset),
+        "rows": len(store),
+        "categories": store.categories,
+        "createdAt": datetime.now().isoformat(),
+    }
+    with open(os.path.join(temporary, MANIFEST_FILE), "w") as f:
+        json.dump(manifest, f)
+
+    replace_directory(temporary, directory)
+
+
+def replace_directory(temporary: str, directory: str):
+    """Move a fully written directory into place, retiring any previous one"""
+    if os.path.exists(directory):
+        retired = f"{directory}.old-{os.getpid()}-{int(time.time())}"
+        os.rename(directory, retired)
+        os.rename(temporary, directory)
+        shutil.rmtree(retired, ignore_errors=True)
+    else:
+        os.rename(temporary, directory)
+
+
+def open_snapshot(directory: str, source_path: str) -> Optional[Tuple[WeatherStore, int]]:
+    """Memory-map a snapshot if it was written from a prefix of the source file.
+
+    Returns the store and the source byte offset it covers, or None when
+    there is no snapshot or the source was rewritten since. The mapped pages
+    live in the OS page cache, so every worker on the host shares them.
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+    if manifest.get("formatVersion") != SNAPSHOT_FORMAT_VERSION:
+        return None
+    source_offset = manifest["sourceOffset"]
+    if os.path.getsize(source_path) < source_offset or file_digest(source_path, source_offset) != manifest["sourceDigest"]:
+        return None
+
+    try:
+        floats = {name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r") for name in FLOAT_COLUMNS}
+        codes = {name: np.load(os.path.join(directory, f"{name}.codes.npy"), mmap_mode="r") for name in CATEGORICAL_COLUMNS}
+        dates = np.load(os.path.join(directory, "date.npy"), mmap_mode="r")
+    except (FileNotFoundError, ValueError) as e:
+        print(f"Ignoring unreadable weather snapshot in {directory}: {e}")
+        return None
+
+    if len(dates) != manifest["rows"]:
+        return None
+    return WeatherStore.from_arrays(floats, codes, manifest["categories"], dates), source_offset
@@ -0,0 +1,300 @@
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Any, Iterable, Iterator, Optional, Sequence
+
+from risk_engine import analyze_risk
+
+# Numeric columns kept as contiguous float arrays
+FLOAT_COLUMNS = ["latitude", "longitude", "temperature", "humidity", "windSpeed", "precipitation"]
+
+# Low-cardinality string columns kept as integer codes into a category list
+CATEGORICAL_COLUMNS = ["city", "state", "country", "countryCode", "conditions", "riskLevel", "eventType"]
+
+# Hourly forecast slots (every 3 hours)
+HOURLY_TIMES = [f"{hour:02d}:00" for hour in range(0, 24, 3)]
+HOURLY_SLOTS = len(HOURLY_TIMES)
+
+# Conditions that can appear in an hourly forecast entry
+HOURLY_CONDITIONS = ["Clear", "Cloudy", "Partly Cloudy", "Light Rain", "Overcast"]
+
+# Spare rows reserved when a store is appended to, as a fraction of its size
+APPEND_HEADROOM_DIVISOR = 8
+
+# Column order used by the flat CSV export
+EXPORT_COLUMNS = [
+    "city", "country", "latitude", "longitude", "date", "eventType",
+    "temperature", "humidity", "windSpeed", "precipitation", "conditions", "riskLevel"
+]
+
+
+def derive_hourly_forecast(latitude: float, longitude: float, date: np.datetime64, base_temp: float) -> List[Dict[str, Any]]:
+    """Generate the hourly forecast of a record.
+
+    The generator is seeded from the record's coordinates and date, so a
+    forecast that is evicted from the view cache is rebuilt identically.
+    """
+    seed = [
+        int(np.asarray(date, dtype="datetime64[D]").astype(np.int64)) & 0xFFFFFFFF,
+        int(round((latitude + 90.0) * 1e4)),
+        int(round((longitude + 180.0) * 1e4)),
+    ]
+    rng = np.random.default_rng(seed)
+    temperatures = base_temp + rng.uniform(-5, 5, HOURLY_SLOTS)
+    precipitations = rng.uniform(0, 100, HOURLY_SLOTS)
+    conditions = rng.integers(0, len(HOURLY_CONDITIONS), HOURLY_SLOTS)
+    return [
+        {
+            "time": HOURLY_TIMES[slot],
+            "temperature": round(float(temperatures[slot]), 1),
+            "precipitation": round(float(precipitations[slot]), 1),
+            "conditions": HOURLY_CONDITIONS[conditions[slot]],
+        }
+        for slot in range(HOURLY_SLOTS)
+    ]
+
+
+class AppendBuffers:
+    """Backing arrays shared by successive versions of an append-only store.
+
+    Each version views the first ``size`` rows; only rows at or beyond
+    ``length`` (the newest version's size) are ever written, so the rows an
+    older version can see never change under it.
+    """
+
+    __slots__ = ("floats", "codes", "dates", "length")
+
+    def __init__(self, store: "WeatherStore", capacity: int):
+        size = len(store)
+        self.floats = {name: np.empty(capacity, dtype=np.float64) for name in FLOAT_COLUMNS}
+        self.codes = {name: np.empty(capacity, dtype=np.int32) for name in CATEGORICAL_COLUMNS}
+        self.dates = np.empty(capacity, dtype="datetime64[D]")
+        for name in FLOAT_COLUMNS:
+            self.floats[name][:size] = store.floats[name]
+        for name in CATEGORICAL_COLUMNS:
+            self.codes[name][:size] = store.codes[name]
+        self.dates[:size] = store.dates
+        self.length = size
+
+    @property
+    def capacity(self) -> int:
+        return len(self.dates)
+
+
+def _read_only(values: np.ndarray) -> np.ndarray:
+    view = values.view()
+    view.flags.writeable = False
+    return view
+
+
+class WeatherStore:
+    """Columnar in-memory weather store.
+
+    Every record is one row across a set of NumPy arrays: float arrays for the
+    measurements, a ``datetime64[D]`` array for the date and integer codes for
+    the categorical columns. Only observed values are stored; the risk
+    analysis and hourly forecast are derived from them by ``risk_analysis``
+    and ``hourly_forecast`` when a record is first served.
+
+    Once published a store is treated as immutable: new rows go into a new
+    version made by ``appended``, which shares the unchanged rows.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.floats: Dict[str, np.ndarray] = {name: np.empty(0, dtype=np.float64) for name in FLOAT_COLUMNS}
+        self.codes: Dict[str, np.ndarray] = {name: np.empty(0, dtype=np.int32) for name in CATEGORICAL_COLUMNS}
+        self.categories: Dict[str, List[str]] = {name: [] for name in CATEGORICAL_COLUMNS}
+        self._category_lookup: Dict[str, Dict[str, int]] = {name: {} for name in CATEGORICAL_COLUMNS}
+        self.dates = np.empty(0, dtype="datetime64[D]")
+        self._buffers: Optional[AppendBuffers] = None
+
+    @classmethod
+    def from_arrays(cls, floats: Dict[str, np.ndarray], codes: Dict[str, np.ndarray],
+                    categories: Dict[str, List[str]], dates: np.ndarray) -> "WeatherStore":
+        """Wrap existing column arrays (e.g. memory-mapped ones) without copying"""
+        store = cls()
+        store.floats.update(floats)
+        store.codes.update(codes)
+        for name, values in categories.items():
+            store.categories[name] = list(values)
+            store._category_lookup[name] = {value: code for code, value in enumerate(values)}
+        store.dates = dates
+        store.size = len(dates)
+        return store
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __bool__(self) -> bool:
+        return self.size > 0
+
+    # Categorical helpers
+    def encode(self, name: str, values: Iterable[Any]) -> np.ndarray:
+        """Map string values to category codes, registering unseen categories"""
+        categories = self.categories[name]
+        lookup = self._category_lookup[name]
+        codes, uniques = pd.factorize(np.asarray(values, dtype=object))
+        values = [str(value) for value in uniques]
+        if (codes < 0).any():
+            values.append("")  # Missing values (code -1) map to the empty category
+
+        mapping = np.empty(len(values), dtype=np.int32)
+        for position, value in enumerate(values):
+            code = lookup.get(value)
+            if code is None:
+                code = len(categories)
+                categories.append(value)
+                lookup[value] = code
+            mapping[position] = code
+        return mapping[codes]
+
+    def code_of(self, name: str, value: str) -> int:
+        """Return the code of a category, or -1 if it has never been seen"""
+        return self._category_lookup[name].get(value, -1)
+
+    def decode(self, name: str, codes: Optional[np.ndarray] = None) -> np.ndarray:
+        """Return the string values of a categorical column (or of the given codes)"""
+        if codes is None:
+            codes = self.codes[name]
+        categories = np.asarray(self.categories[name], dtype=object)
+        return categories[codes] if len(categories) else np.empty(len(codes), dtype=object)
+
+    # Ingestion
+    def append_columns(self, columns: Dict[str, Any]):
+        """Append a batch of rows given as column arrays (in place, so only
+        while the store is being built)"""
+        count = len(columns["latitude"])
+        if count == 0:
+            return
+
+        for name in FLOAT_COLUMNS:
+            values = np.asarray(columns[name], dtype=np.float64)
+            self.floats[name] = np.concatenate([self.floats[name], values])
+
+        for name in CATEGORICAL_COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                values = [""] * count
+            self.codes[name] = np.concatenate([self.codes[name], self.encode(name, values)])
+
+        dates = np.asarray(columns["date"], dtype="datetime64[D]")
+        self.dates = np.concatenate([self.dates, dates])
+
+        self.size += count
+        self._buffers = None
+
+    def appended(self, columns: Dict[str, Any]) -> "WeatherStore":
+        """Return a new version holding this store's rows followed by ``columns``.
+
+        The rows are written into spare capacity after this store's rows in
+        buffers shared with the new version, so appending costs time in the
+        number of new rows rather than the store size. Buffers are only
+        reallocated (with headroom) when they are full or this store is not
+        the newest version. Neither this store's rows nor its category lists
+        change, so readers still holding it keep a consistent view.
+        """
+        count = len(columns["latitude"])
+        if count == 0:
+            return self
+
+        end = self.size + count
+        buffers = self._buffers
+        if buffers is None or buffers.length != self.size or buffers.capacity < end:
+            buffers = AppendBuffers(self, end + max(count, self.size // APPEND_HEADROOM_DIVISOR))
+
+        store = WeatherStore()
+        for name in CATEGORICAL_COLUMNS:
+            store.categories[name] = list(self.categories[name])
+            store._category_lookup[name] = dict(self._category_lookup[name])
+
+        for name in FLOAT_COLUMNS:
+            buffers.floats[name][self.size:end] = np.asarray(columns[name], dtype=np.float64)
+        for name in CATEGORICAL_COLUMNS:
+            values = columns.get(name)
+            if values is None:
+                values = [""] * count
+            buffers.codes[name][self.size:end] = store.encode(name, values)
+        buffers.dates[self.size:end] = np.asarray(columns["date"], dtype="datetime64[D]")
+        buffers.length = end
+
+        store.floats = {name: _read_only(buffers.floats[name][:end]) for name in FLOAT_COLUMNS}
+        store.codes = {name: _read_only(buffers.codes[name][:end]) for name in CATEGORICAL_COLUMNS}
+        store.dates = _read_only(buffers.dates[:end])
+        store.size = end
+        store._buffers = buffers
+        return store
+
+    def with_categorical(self, name: str, codes: np.ndarray, categories: Sequence[str]) -> "WeatherStore":
+        """Return a new version with one categorical column replaced (e.g.
+        reclassified risk levels); every other column is shared"""
+        store = WeatherStore.from_arrays(self.floats, self.codes, self.categories, self.dates)
+        store.codes[name] = _read_only(np.asarray(codes, dtype=np.int32))
+        store.categories[name] = list(categories)
+        store._category_lookup[name] = {value: code for code, value in enumerate(categories)}
+        return store
+
+    def extend(self, records: Sequence[Dict[str, Any]]):
+        """Append flat records to the store"""
+        if not records:
+            return
+
+        columns: Dict[str, Any] = {name: [record[name] for record in records] for name in FLOAT_COLUMNS}
+        for name in CATEGORICAL_COLUMNS:
+            columns[name] = [record.get(name, "") for record in records]
+        columns["date"] = [record["date"] for record in records]
+        self.append_columns(columns)
+
+    # Serving
+    def row(self, index: int) -> Dict[str, Any]:
+        """Build the flat fields of one record (without derived advice)"""
+        return {
+            "city": self.categories["city"][self.codes["city"][index]],
+            "country": self.categories["country"][self.codes["country"][index]],
+            "latitude": float(self.floats["latitude"][index]),
+            "longitude": float(self.floats["longitude"][index]),
+            "address": {
+                "city": self.categories["city"][self.codes["city"][index]],
+                "state": self.categories["state"][self.codes["state"][index]],
+                "country": self.categories["country"][self.codes["country"][index]],
+                "countryCode": self.categories["countryCode"][self.codes["countryCode"][index]],
+            },
+            "date": str(self.dates[index]),
+            "eventType": self.categories["eventType"][self.codes["eventType"][index]],
+            "temperature": float(self.floats["temperature"][index]),
+            "humidity": float(self.floats["humidity"][index]),
+            "windSpeed": float(self.floats["windSpeed"][index]),
+            "precipitation": float(self.floats["precipitation"][index]),
+            "conditions": self.categories["conditions"][self.codes["conditions"][index]],
+            "riskLevel": self.categories["riskLevel"][self.codes["riskLevel"][index]],
+        }
+
+    def risk_analysis(self, index: int) -> Dict[str, Dict[str, str]]:
+        """Derive the riskAnalysis dict of one record"""
+        return analyze_risk(
+            float(self.floats["temperature"][index]), float(self.floats["precipitation"][index]),
+            float(self.floats["windSpeed"][index])
+        )
+
+    def hourly_forecast(self, index: int) -> List[Dict[str, Any]]:
+        """Derive the hourly forecast entries of one record"""
+        return derive_hourly_forecast(
+            float(self.floats["latitude"][index]), float(self.floats["longitude"][index]),
+            self.dates[index], float(self.floats["temperature"][index])
+        )
+
+    def export_rows(self, indices: Optional[np.ndarray] = None,
+                    names: Sequence[str] = EXPORT_COLUMNS) -> Iterator[List[Any]]:
+        """Yield flat rows of the ``names`` columns, decoding each column once"""
+        if indices is None:
+            indices = np.arange(self.size)
+
+        columns = []
+        for name in names:
+            if name in self.floats:
+                columns.append(self.floats[name][indices].tolist())
+            elif name in self.codes:
+                columns.append(self.decode(name, self.codes[name][indices]).tolist())
+            else:
+                columns.append(np.datetime_as_string(self.dates[indices], unit="D").tolist())
+
+        return (list(values) for values in zip(*columns))
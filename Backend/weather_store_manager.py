@@ -0,0 +1,351 @@
+import asyncio
+import os
+import threading
+import time
+import uuid
+import weakref
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import HTTPException
+
+from weather_store import WeatherStore
+from spatial_index import SpatialIndex
+from weather_ingest import read_appended_rows
+from risk_engine import reclassify_risk_levels, risk_rules_digest
+from spatial_grid import StationGrid
+from weather_snapshot import file_digest
+
+# Seconds a client is asked to wait before retrying during warm-up
+WARMUP_RETRY_AFTER_SECONDS = 5
+
+# Leading bytes of the source CSV fingerprinted to detect a rewritten file
+SOURCE_FINGERPRINT_BYTES = 1 << 16
+
+
+class WeatherDataVersion:
+    """An immutable, epoch-numbered store together with the index built over it.
+
+    Readers take the manager's current version once per request (a single
+    attribute read, no lock) and use only that, so lookups and long exports
+    never see a torn store or a new store paired with an old index. A
+    version is reclaimed once the manager has moved on and its last reader
+    drops it. ``base_rows`` is how many leading rows are shared unchanged
+    with the previous version (0 after a full rebuild). ``grid`` is the
+    optional nearest-station raster over ``index``. ``source`` identifies
+    the data the store's rows were derived from (see
+    ``WeatherStoreManager.track_source``, suffixed with the risk rules of a
+    reclassification); it changes whenever row contents may, but not on
+    appends, so it keys caches of per-row views.
+    """
+
+    __slots__ = ("epoch", "store", "index", "grid", "base_rows", "source", "published_at", "__weakref__")
+
+    def __init__(self, epoch: int, store: WeatherStore, index: SpatialIndex, base_rows: int = 0,
+                 grid: Optional[StationGrid] = None, source: Optional[str] = None):
+        self.epoch = epoch
+        self.store = store
+        self.index = index
+        self.grid = grid
+        self.base_rows = base_rows
+        self.source = source
+        self.published_at = datetime.now()
+
+
+class WeatherStoreManager:
+    """Owns the loaded weather store and its index and tracks warm-up.
+
+    The store is built off the event loop by ``warm_up``; until it is
+    published, ``require_ready`` rejects readers with a fast 503 instead of
+    exposing a half-built store. ``watch_source`` then polls the source CSV
+    and merges appended rows into a new version.
+    """
+
+    def __init__(self):
+        self.status = "idle"
+        self.stage: Optional[str] = None
+        self.rows_loaded = 0
+        self.source: Optional[str] = None
+        self.ingest_stats: Optional[Dict[str, Any]] = None
+        self.started_at: Optional[datetime] = None
+        self.duration_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+        self.current = WeatherDataVersion(0, WeatherStore(), None)
+        # Published versions some reader still holds, by epoch
+        self.live_versions: "weakref.WeakValueDictionary[int, WeatherDataVersion]" = weakref.WeakValueDictionary()
+        self._write_lock = threading.Lock()
+        # Serializes updates derived from the current version (appends and
+        # risk reclassification) and rebuilds, so none publishes over
+        # another's rows
+        self._update_lock = threading.Lock()
+        # Optional nearest-station raster (resolution in degrees, None disables)
+        self.grid_resolution: Optional[float] = None
+        self.grid_directory: Optional[str] = None
+        self.grid_error: Optional[str] = None
+        self.subscribers: List[Callable[[WeatherDataVersion], None]] = []
+
+        # Source CSV being followed and how far into it has been ingested
+        self.source_path: Optional[str] = None
+        self.source_offset = 0
+        self.source_fingerprint: Optional[str] = None
+        self.source_identity: Optional[str] = None
+        self.reload_stats: Dict[str, Any] = {
+            "reloads": 0,
+            "rebuilds": 0,
+            "rowsAppended": 0,
+            "lastReloadRows": 0,
+            "lastReloadSeconds": None,
+            "lastReloadAt": None,
+            "ingestLagSeconds": None,
+            "error": None,
+        }
+
+    @property
+    def ready(self) -> bool:
+        return self.status == "ready"
+
+    @property
+    def store(self) -> WeatherStore:
+        return self.current.store
+
+    @property
+    def index(self) -> Optional[SpatialIndex]:
+        return self.current.index
+
+    def subscribe(self, callback: Callable[[WeatherDataVersion], None]):
+        """Call ``callback`` with every newly published version"""
+        self.subscribers.append(callback)
+
+    def track_source(self, path: str, offset: int):
+        """Record the CSV a store was built from and the bytes it covers.
+
+        Versions published from it carry its identity (fingerprinted head,
+        size covered and modification time), which stays the same across
+        restarts only while the file does.
+        """
+        self.source_path = path
+        self.source_offset = offset
+        self.source_fingerprint = file_digest(path, min(offset, SOURCE_FINGERPRINT_BYTES))
+        self.source_identity = f"{self.source_fingerprint[:16]}-{offset}-{os.stat(path).st_mtime_ns}"
+
+    def track_generated(self):
+        """Record that a store was generated rather than read: its identity
+        is unique to this process"""
+        self.source_path = None
+        self.source_identity = f"generated-{uuid.uuid4().hex}"
+
+    def report_progress(self, stage: str, rows_loaded: Optional[int] = None):
+        """Record the current warm-up stage (called from the loader thread)"""
+        self.stage = stage
+        if rows_loaded is not None:
+            self.rows_loaded = rows_loaded
+
+    def publish(self, store: WeatherStore, index: SpatialIndex, base_rows: int = 0,
+                source: Optional[str] = None) -> WeatherDataVersion:
+        """Make a fully built store and index visible to readers.
+
+        The swap is a single attribute assignment, so a reader sees either
+        the previous version or this one. Writers are serialized. Appends
+        keep the previous version's source; other versions default to the
+        tracked source.
+        """
+        with self._write_lock:
+            if source is None:
+                source = self.current.source if base_rows else self.source_identity
+            grid = self._station_grid(index, base_rows)
+            version = WeatherDataVersion(self.current.epoch + 1, store, index, base_rows, grid, source)
+            self.live_versions[version.epoch] = version
+            self.current = version
+            self.rows_loaded = len(store)
+            self.status = "ready"
+        for callback in self.subscribers:
+            callback(version)
+        return version
+
+    def _station_grid(self, index: SpatialIndex, base_rows: int) -> Optional[StationGrid]:
+        """Raster for a version about to be published: the previous one
+        extended with new stations after an append, otherwise mapped from
+        disk or rebuilt. Failures leave the version without a grid."""
+        if not self.grid_resolution or index is None or not index.station_count:
+            return None
+        previous = self.current.grid
+        if previous is not None and previous.index is index:
+            return previous
+        try:
+            if base_rows and previous is not None:
+                grid = previous.updated(index)
+                if self.grid_directory and grid.stations is not previous.stations:
+                    grid.save(self.grid_directory)
+                return grid
+            return StationGrid.load_or_build(self.grid_directory, index, self.grid_resolution)
+        except (OSError, ValueError) as e:
+            self.grid_error = str(e)
+            print(f"Weather grid unavailable: {e}")
+            return None
+
+    async def warm_up(self, build: Callable[[], Tuple[WeatherStore, SpatialIndex]]):
+        """Run the blocking ``build`` in a worker thread and publish its result.
+
+        When a version is already being served (a rebuild after the source
+        was rewritten) it stays available until the new one is published.
+        """
+        rebuilding = self.ready
+        if not rebuilding:
+            self.status = "warming"
+        self.error = None
+        self.started_at = datetime.now()
+        start = time.perf_counter()
+        try:
+            store, index = await asyncio.to_thread(build)
+            self.report_progress("building grid" if self.grid_resolution else "publishing", len(store))
+            await asyncio.to_thread(self.publish_rebuild, store, index)
+            self.stage = "done"
+        except Exception as e:
+            if not rebuilding:
+                self.status = "failed"
+            self.error = str(e)
+            print(f"Weather data warm-up failed: {e}")
+        finally:
+            self.duration_seconds = round(time.perf_counter() - start, 3)
+
+    def publish_rebuild(self, store: WeatherStore, index: SpatialIndex) -> WeatherDataVersion:
+        """Publish a store built from scratch once no update derived from the
+        current version is in flight"""
+        with self._update_lock:
+            return self.publish(store, index)
+
+    def source_rewritten(self) -> bool:
+        """Whether the source CSV shrank or its head changed since it was read"""
+        try:
+            if os.path.getsize(self.source_path) < self.source_offset:
+                return True
+            head = file_digest(self.source_path, min(self.source_offset, SOURCE_FINGERPRINT_BYTES))
+        except FileNotFoundError:
+            return False
+        return head != self.source_fingerprint
+
+    def reload_appended(self, event_types: Sequence[str]) -> int:
+        """Merge rows appended to the source CSV into a new version.
+
+        Only the bytes after ``source_offset`` are parsed. The new store
+        version shares the old one's rows (which are not modified) and the
+        index is extended with the new rows before both are published
+        together.
+        Returns the number of rows added. Runs in a worker thread.
+        """
+        start = time.perf_counter()
+        try:
+            modified = os.path.getmtime(self.source_path)
+            columns, offset = read_appended_rows(self.source_path, self.source_offset, event_types)
+        except FileNotFoundError:
+            return 0
+        if columns is None:
+            self.source_offset = offset
+            return 0
+
+        with self._update_lock:
+            previous = self.current
+            store = previous.store.appended(columns)
+            index = previous.index.extended(store)
+            self.publish(store, index, base_rows=len(previous.store))
+            self.source_offset = offset
+
+        rows = len(store) - len(previous.store)
+        stats = self.reload_stats
+        stats["reloads"] += 1
+        stats["rowsAppended"] += rows
+        stats["lastReloadRows"] = rows
+        stats["lastReloadSeconds"] = round(time.perf_counter() - start, 3)
+        stats["lastReloadAt"] = datetime.now().isoformat()
+        stats["ingestLagSeconds"] = round(max(0.0, time.time() - modified), 3)
+        return rows
+
+    def reclassify_risk(self) -> Tuple[WeatherDataVersion, int]:
+        """Recompute every row's riskLevel from the current rule tables in one
+        vectorized pass and publish the result as a new version.
+
+        Returns the version and how many rows changed level. Its source is
+        the previous version's, tagged with the rules applied. Runs in a
+        worker thread.
+        """
+        with self._update_lock:
+            previous = self.current
+            codes, levels = reclassify_risk_levels(previous.store.floats)
+            stored = np.asarray(previous.store.categories["riskLevel"], dtype=object)[previous.store.codes["riskLevel"]]
+            changed = int(np.count_nonzero(stored != np.asarray(levels, dtype=object)[codes]))
+            source = f"{str(previous.source).split(':risk-')[0]}:risk-{risk_rules_digest()}"
+            version = self.publish(previous.store.with_categorical("riskLevel", codes, levels), previous.index,
+                                   source=source)
+        return version, changed
+
+    async def watch_source(self, build: Callable[[], Tuple[WeatherStore, SpatialIndex]],
+                           event_types: Sequence[str], interval_seconds: float):
+        """Poll the source CSV, ingesting appended rows as they arrive.
+
+        A source that was truncated or replaced cannot be merged and triggers
+        a full rebuild through ``build``; the current version keeps serving
+        until it finishes.
+        """
+        while True:
+            await asyncio.sleep(interval_seconds)
+            if not self.ready or self.source_path is None:
+                continue
+            try:
+                if await asyncio.to_thread(self.source_rewritten):
+                    self.reload_stats["rebuilds"] += 1
+                    await self.warm_up(build)
+                else:
+                    await asyncio.to_thread(self.reload_appended, event_types)
+                self.reload_stats["error"] = None
+            except Exception as e:
+                self.reload_stats["error"] = str(e)
+                print(f"Weather data reload failed: {e}")
+
+    def require_ready(self) -> WeatherDataVersion:
+        """Return the current version, or raise a 503 with Retry-After while
+        the store is not ready"""
+        if not self.ready:
+            raise HTTPException(
+                status_code=503,
+                detail=f"Weather data is {self.status}, please retry shortly",
+                headers={"Retry-After": str(WARMUP_RETRY_AFTER_SECONDS)}
+            )
+        return self.current
+
+    def health(self) -> Dict[str, Any]:
+        """Readiness details for the /health endpoint"""
+        elapsed = self.duration_seconds
+        if elapsed is None and self.started_at is not None:
+            elapsed = round((datetime.now() - self.started_at).total_seconds(), 3)
+        return {
+            "status": self.status,
+            "stage": self.stage,
+            "rowsLoaded": self.rows_loaded,
+            "source": self.source,
+            "stations": self.index.station_count if self.index is not None else 0,
+            "startedAt": self.started_at.isoformat() if self.started_at else None,
+            "durationSeconds": elapsed,
+            "version": self.current.epoch,
+            "ingest": self.ingest_stats,
+            "error": self.error,
+        }
+
+    def metrics(self) -> Dict[str, Any]:
+        """Hot-reload counters for the /metrics endpoint"""
+        live = sorted(self.live_versions.keys())
+        return {
+            "version": self.current.epoch,
+            "liveVersions": len(live),
+            "oldestLiveVersion": live[0] if live else None,
+            "rows": len(self.store),
+            "sourceOffset": self.source_offset,
+            **self.reload_stats,
+        }
+
+    def grid_metrics(self) -> Optional[Dict[str, Any]]:
+        """Raster resolution and footprint for the /metrics endpoint"""
+        if not self.grid_resolution:
+            return None
+        grid = self.current.grid
+        return grid.stats() if grid is not None else {"resolution": self.grid_resolution, "error": self.grid_error}